@@ -3,17 +3,30 @@ import os
 
 import aws_cdk as cdk
 
-from workshop_deployment.workshop_deployment_stack import WorkshopDeploymentStack
+from workshop_deployment.workshop_deployment_stack import WorkshopDeploymentStack, read_package_manifest
 
 
 app = cdk.App()
 
+# Optional requirements-style manifest of packages to install in every JupyterLab app
+packages_file = app.node.try_get_context("packages_file") or "workshop-packages.txt"
+packages = read_package_manifest(packages_file) if os.path.exists(packages_file) else None
+
+# Template mode synthesizes one reusable template per storage mode, deployed with CloudFormation create_stack
+if app.node.try_get_context("template_mode"):
+    for stack_name, shared_storage in (("WorkshopTemplate", False), ("WorkshopTemplateShared", True)):
+        stack = WorkshopDeploymentStack(app, stack_name, shared_storage=shared_storage, packages=packages)
+        cdk.Tags.of(stack).add("project", "cmt-workshop")
+    app.synth()
+    exit(0)
+
 workshop_name = app.node.try_get_context("workshop_name")
 if not workshop_name:
     print("Error: workshop_name context parameter is required")
     exit(1)
 
-stack = WorkshopDeploymentStack(app, f"{workshop_name}-WorkshopDeploymentStack", workshop_name=workshop_name)
+stack = WorkshopDeploymentStack(app, f"{workshop_name}-WorkshopDeploymentStack", workshop_name=workshop_name,
+                                shared_bucket_name=app.node.try_get_context("shared_bucket_name"), packages=packages)
 cdk.Tags.of(stack).add("project", "cmt-workshop")
 
 app.synth()
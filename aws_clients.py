@@ -0,0 +1,102 @@
+import boto3
+import logging
+import threading
+import time
+from botocore.config import Config
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MAX_CONCURRENCY = 16
+# No botocore retries: even standard mode retries throttles, which would reach
+# throttling.call's concurrency budgets one round late. The controller retries them.
+MAX_ATTEMPTS = 1
+
+class ClientMetrics:
+    """Thread-safe call, retry, error and latency counters per (service, operation)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+
+    def record(self, service_name, operation, latency, retries, error):
+        with self.lock:
+            counter = self.counters.setdefault((service_name, operation),
+                                               {'calls': 0, 'retries': 0, 'errors': 0, 'latency': 0.0})
+            counter['calls'] += 1
+            counter['retries'] += retries
+            counter['errors'] += 1 if error else 0
+            counter['latency'] += latency
+
+    def snapshot(self):
+        with self.lock:
+            return {key: dict(counter) for key, counter in self.counters.items()}
+
+    def log_summary(self):
+        for (service_name, operation), counter in sorted(self.snapshot().items()):
+            logging.info(f"{service_name}.{operation}: {counter['calls']} calls, {counter['retries']} retries, "
+                         f"{counter['errors']} errors, {counter['latency'] / counter['calls'] * 1000:.0f} ms avg")
+
+class ClientFactory:
+    """
+    One boto3 session whose clients are created once and reused by every stage.
+
+    Connection pools are sized to the configured concurrency, botocore's
+    standard retry mode makes MAX_ATTEMPTS attempts, leaving retries to
+    throttling.call, and every call is counted in `metrics`.
+    """
+
+    def __init__(self, region=None, max_concurrency=DEFAULT_MAX_CONCURRENCY, session=None):
+        self.session = session or boto3.Session(region_name=region)
+        self.region = region or self.session.region_name
+        self.max_concurrency = max_concurrency
+        self.config = Config(
+            max_pool_connections=max_concurrency,
+            retries={'mode': 'standard', 'total_max_attempts': MAX_ATTEMPTS}
+        )
+        self.metrics = ClientMetrics()
+        self.clients = {}
+        self.lock = threading.Lock()
+
+    def client(self, service_name, region=None):
+        key = (service_name, region or self.region)
+        with self.lock:
+            if key not in self.clients:
+                client = self.session.client(service_name, region_name=key[1], config=self.config)
+                self.instrument(client)
+                self.clients[key] = client
+            return self.clients[key]
+
+    def instrument(self, client):
+        service_name = client.meta.service_model.service_name
+
+        def before_call(context, **kwargs):
+            context['metrics_start_time'] = time.monotonic()
+
+        def after_call(model, context, parsed=None, exception=None, **kwargs):
+            latency = time.monotonic() - context.get('metrics_start_time', time.monotonic())
+            retries = (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+            error = exception is not None or 'Error' in (parsed or {})
+            self.metrics.record(service_name, model.name, latency, retries, error)
+
+        client.meta.events.register('before-call.*.*', before_call)
+        client.meta.events.register('after-call.*.*', after_call)
+        client.meta.events.register('after-call-error.*.*', after_call)
+
+_factories = {}
+_factories_lock = threading.Lock()
+
+def get_factory(region=None, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+    """
+    Return the process-wide client factory for a region, creating it on first use.
+
+    The first caller for a region decides its connection pool size.
+    """
+    with _factories_lock:
+        if region not in _factories:
+            _factories[region] = ClientFactory(region, max_concurrency)
+        return _factories[region]
+
+def get_client(service_name, region=None):
+    """Return the shared, instrumented client for a service and region."""
+    return get_factory(region).client(service_name)
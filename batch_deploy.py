@@ -0,0 +1,244 @@
+import csv
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import state_store
+import template_deploy
+from workshop_builder import build_workshop, is_valid_workshop_name, vpc_endpoint_parameters
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Concurrent AWS calls shared by every workshop in the batch
+DEFAULT_MAX_CONCURRENCY = 64
+DEFAULT_MAX_PARALLEL = 4
+REQUIRED_KEYS = ('name', 'users', 'vpc_id', 'subnet_ids')
+# Each region of a multi-region workshop numbers its users from the next block,
+# so usernames stay unique across the workshop's user pools
+REGION_USER_BLOCK = 1000
+REPORT_FIELDS = ['workshop', 'region', 'status', 'stack_name', 'deploy_method', 'requested_users', 'users', 'spares',
+                 'seconds', 'log']
+
+def load_manifest(path):
+    """Load a batch manifest from JSON, or from YAML when PyYAML is installed."""
+    with open(path, 'r') as f:
+        if path.endswith(('.yaml', '.yml')):
+            if yaml is None:
+                raise ValueError("YAML manifests need PyYAML (pip install pyyaml); use a JSON manifest instead")
+            return yaml.safe_load(f)
+        return json.load(f)
+
+def region_specs(workshop):
+    """
+    Split a workshop with `regions` ({region: settings such as users, vpc_id
+    and subnet_ids}) into one workshop per region, named <name>-<region>.
+    """
+    regions = workshop.pop('regions')
+    specs = []
+    for index, (region, settings) in enumerate(regions.items()):
+        spec = {**workshop, **settings, 'name': f"{workshop['name']}-{region}", 'region': region,
+                'group': workshop['name'], 'first_user_number': index * REGION_USER_BLOCK + 1}
+        if int(spec.get('users', 0)) + int(spec.get('spares', 0)) >= REGION_USER_BLOCK:
+            raise ValueError(f"{spec['name']} has more than {REGION_USER_BLOCK - 1} users and spares")
+        specs.append(spec)
+    return specs
+
+def share_vpc_endpoints(specs):
+    """
+    Leave `vpc_endpoints` on only the first workshop that asks for them in
+    each VPC. Private DNS names can exist once per VPC, so a second stack
+    creating the same interface endpoints would fail; the other workshops
+    use the first one's endpoints.
+    """
+    owners = {}
+    for spec in specs:
+        if not spec.get('vpc_endpoints'):
+            continue
+        vpc = (spec['region'], spec['vpc_id'])
+        if vpc in owners:
+            logging.info(f"{spec['name']} uses the VPC endpoints created by {owners[vpc]} in {spec['vpc_id']}")
+            spec['vpc_endpoints'] = False
+        else:
+            owners[vpc] = spec['name']
+    return specs
+
+def workshop_specs(manifest):
+    """
+    Return one spec per workshop, with the manifest's `defaults` filled in and
+    multi-region workshops split per region (see region_specs). VPC endpoints
+    are created by one workshop per VPC (see share_vpc_endpoints).
+    Raises ValueError for missing keys, and for invalid or duplicate names.
+    """
+    defaults = dict(manifest.get('defaults', {}))
+    defaults.setdefault('region', manifest.get('region'))
+    workshops = []
+    for workshop in manifest.get('workshops', []):
+        workshop = {**defaults, **workshop}
+        workshops.extend(region_specs(workshop) if 'regions' in workshop else [workshop])
+    specs = []
+    for spec in workshops:
+        missing = [key for key in REQUIRED_KEYS if key not in spec]
+        if missing or not spec.get('region'):
+            raise ValueError(f"Workshop {spec.get('name', len(specs) + 1)} is missing {', '.join(missing or ['region'])}")
+        if not is_valid_workshop_name(f"{spec['name']}-WorkshopDeploymentStack"):
+            raise ValueError(f"Invalid workshop name: {spec['name']}")
+        specs.append(spec)
+    names = [spec['name'] for spec in specs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate workshop names: {', '.join(duplicates)}")
+    return share_vpc_endpoints(specs)
+
+def existing_workshops(specs):
+    """Return the names in `specs` that the state store already has a workshop for."""
+    store = state_store.get_store()
+    return [spec['name'] for spec in specs if store.get_workshop(spec['name'])]
+
+def worker_budget(max_concurrency, parallel):
+    """Split the global concurrency budget between the workshops that run at the same time."""
+    return max(1, max_concurrency // max(parallel, 1))
+
+def stack_parameters(spec):
+    subnet_ids = spec['subnet_ids']
+    parameters = {
+        'AWSRegion': spec['region'],
+        'VPCID': spec['vpc_id'],
+        'SubnetIDs': subnet_ids.split(',') if isinstance(subnet_ids, str) else list(subnet_ids),
+    }
+    if spec.get('vpc_endpoints'):
+        parameters.update(vpc_endpoint_parameters(parameters))
+    return parameters
+
+def run_workshop(spec, max_workers):
+    """Create one workshop from its spec. Runs in its own process (see launch)."""
+    deploy_method = spec.get('deploy_method', 'template')
+    return build_workshop(stack_parameters(spec), spec['name'], int(spec['users']), int(spec.get('spares', 0)),
+                          spec.get('storage', 'bucket'), spec.get('seed_source'), spec.get('cache_source'),
+                          deploy_method, bool(spec.get('lazy', False)), max_workers,
+                          output_dir=f"cdk.out.{spec['name']}" if deploy_method == 'cdk' else None,
+                          first_user_number=int(spec.get('first_user_number', 1)),
+                          encryption=bool(spec.get('bucket_encryption', False)),
+                          expiration_days=int(spec['expiration_days']) if spec.get('expiration_days') else None)
+
+def report_file(workshop_name):
+    return f"{workshop_name}-batch-report.json"
+
+def launch(manifest_path, spec, max_workers):
+    """
+    Create a workshop in a child process, logging to <workshop>-batch.log,
+    and return its report. Each workshop gets its own process because the
+    failure queue and checkpoint are per process.
+    """
+    log_file = f"{spec['name']}-batch.log"
+    start_time = time.monotonic()
+    print(f"Starting {spec['name']} in {spec['region']} ({spec['users']} users), logging to {log_file}")
+    with open(log_file, 'w') as log:
+        subprocess.run([sys.executable, os.path.abspath(__file__), manifest_path, spec['name'], str(max_workers)],
+                       stdout=log, stderr=subprocess.STDOUT)
+    try:
+        with open(report_file(spec['name']), 'r') as f:
+            report = json.load(f)
+        os.remove(report_file(spec['name']))
+    except FileNotFoundError:
+        report = {'workshop': spec['name'], 'region': spec['region'], 'status': 'crashed',
+                  'requested_users': spec['users'], 'users': 0, 'spares': 0}
+    report.update(seconds=round(time.monotonic() - start_time), log=log_file)
+    print(f"{spec['name']}: {report['status']} ({report['users']} of {report['requested_users']} users)")
+    return report
+
+def publish_once(specs):
+    """Publish the workshop templates for each region up front, so concurrent workshops do not race to do it."""
+    regions = sorted({spec['region'] for spec in specs if spec.get('deploy_method', 'template') in ('template', 'pool')})
+    return all(template_deploy.publish_templates(region) for region in regions)
+
+def write_report(reports, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(reports)
+
+def write_roster(group, specs):
+    """
+    Write <group>-roster.csv with every handed-out user of a multi-region
+    workshop and the region they were placed in. Returns the number of users.
+    """
+    store = state_store.get_store()
+    rows = []
+    for spec in specs:
+        workshop = store.get_workshop(spec['name'])
+        if not workshop:
+            continue
+        rows.extend([user['username'], user['password'], spec['region'], workshop['hosted_uri']]
+                    for user in store.users(spec['name'], cognito_status='created'))
+    path = f"{group}-roster.csv"
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Username', 'Password', 'Region', 'Sign-in URL'])
+        writer.writerows(sorted(rows))
+    return len(rows)
+
+def run_batch(manifest_path):
+    """
+    Create every workshop in a manifest, at most `max_parallel` at a time,
+    sharing `max_concurrency` concurrent AWS calls between them. Writes a
+    consolidated <manifest>-report.csv and returns the reports.
+    """
+    manifest = load_manifest(manifest_path)
+    specs = workshop_specs(manifest)
+    if not specs:
+        logging.error(f"{manifest_path} lists no workshops.")
+        return []
+    existing = existing_workshops(specs)
+    if existing:
+        logging.error(f"Workshops already exist: {', '.join(existing)}")
+        return []
+    parallel = min(int(manifest.get('max_parallel', DEFAULT_MAX_PARALLEL)), len(specs))
+    max_workers = worker_budget(int(manifest.get('max_concurrency', DEFAULT_MAX_CONCURRENCY)), parallel)
+    if not publish_once(specs):
+        logging.error("Failed to publish the workshop templates.")
+        return []
+
+    print(f"Creating {len(specs)} workshops, {parallel} at a time with {max_workers} workers each")
+    with ThreadPoolExecutor(max_workers=parallel) as executor:
+        reports = list(executor.map(lambda spec: launch(manifest_path, spec, max_workers), specs))
+
+    for group in sorted({spec['group'] for spec in specs if 'group' in spec}):
+        count = write_roster(group, [spec for spec in specs if spec.get('group') == group])
+        print(f"{group}: {count} users across regions in {group}-roster.csv")
+
+    report_path = f"{os.path.splitext(manifest_path)[0]}-report.csv"
+    write_report(reports, report_path)
+    ready = sum(1 for report in reports if report['status'] == 'ready')
+    print(f"{ready} of {len(reports)} workshops ready, "
+          f"{sum(report['users'] for report in reports)} users created. Report: {report_path}")
+    return reports
+
+def main(manifest_path, workshop_name=None, max_workers=None):
+    if workshop_name is None:
+        reports = run_batch(manifest_path)
+        if not reports or any(report['status'] != 'ready' for report in reports):
+            sys.exit(1)
+        return
+    spec = next(spec for spec in workshop_specs(load_manifest(manifest_path)) if spec['name'] == workshop_name)
+    report = run_workshop(spec, max_workers)
+    with open(report_file(workshop_name), 'w') as f:
+        json.dump(report, f)
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 4):
+        print("Usage: python batch_deploy.py <manifest.json | manifest.yaml>")
+        sys.exit(1)
+
+    if len(sys.argv) == 4:
+        main(sys.argv[1], sys.argv[2], int(sys.argv[3]))
+    else:
+        main(sys.argv[1])
@@ -0,0 +1,76 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+STAGING_BUCKET = os.environ['STAGING_BUCKET']
+CACHE_MOUNT_PATH = os.environ.get('CACHE_MOUNT_PATH', '/mnt/cache')
+CACHE_MARKER = os.environ.get('CACHE_MARKER', '.workshop-cache')
+MAX_WORKERS = 16
+# Stop starting new copies this long before the Lambda times out; the caller invokes again
+STOP_MARGIN_MS = 120 * 1000
+
+s3 = boto3.client('s3')
+
+def cache_path(relative_key):
+    """Map a staged object to its path in the cache, refusing keys that escape the cache directory."""
+    path = os.path.normpath(os.path.join(CACHE_MOUNT_PATH, relative_key))
+    if not path.startswith(CACHE_MOUNT_PATH + os.sep):
+        raise ValueError(f"Invalid cache key: {relative_key}")
+    return path
+
+def is_cached(path, size):
+    return os.path.isfile(path) and os.path.getsize(path) == size
+
+def copy_to_cache(key, path):
+    """Download one staged object into the cache as a read-only file."""
+    os.makedirs(os.path.dirname(path), mode=0o755, exist_ok=True)
+    partial = f"{path}.partial"
+    s3.download_file(STAGING_BUCKET, key, partial)
+    os.chmod(partial, 0o444)
+    # Readers never see a half-written file
+    os.replace(partial, path)
+
+def lambda_handler(event, context):
+    """
+    Copy everything staged under event['prefix'] into the shared cache,
+    skipping files that are already there.
+
+    Returns {'copied', 'skipped', 'failed', 'remaining'}; objects left when
+    the invocation runs out of time are counted as remaining.
+    """
+    prefix = event.get('prefix', '')
+    objects = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=STAGING_BUCKET, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if not obj['Key'].endswith('/'):
+                objects.append((obj['Key'], obj['Size']))
+
+    def fill(obj):
+        key, size = obj
+        try:
+            path = cache_path(key[len(prefix):])
+            if is_cached(path, size):
+                return 'skipped'
+            if context.get_remaining_time_in_millis() < STOP_MARGIN_MS:
+                return 'remaining'
+            copy_to_cache(key, path)
+            return 'copied'
+        except Exception as e:
+            logger.error("Failed to cache %s: %s", key, e)
+            return 'failed'
+
+    summary = {'copied': 0, 'skipped': 0, 'failed': 0, 'remaining': 0}
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        for result in executor.map(fill, objects):
+            summary[result] += 1
+
+    if not summary['remaining'] and not summary['failed']:
+        # Lifecycle scripts look for the marker, so a partly filled cache is never used
+        with open(os.path.join(CACHE_MOUNT_PATH, CACHE_MARKER), 'w') as f:
+            f.write(f"{len(objects)} files\n")
+    logger.info("Cache fill: %s", summary)
+    return summary
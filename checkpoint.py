@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def checkpoint_file(workshop_name):
+    return f"{workshop_name}-checkpoint.jsonl"
+
+class Checkpoint:
+    """
+    Append-only record of a workshop create, stored as `<workshop>-checkpoint.jsonl`.
+
+    The first lines hold the workshop settings and the planned users (with
+    their passwords and bucket names), then one line is appended each time a
+    stage finishes for a user. Reloading the file tells a resumed run exactly
+    which work is left.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.settings = None
+        self.users = []
+        self.done = set()
+        self.lock = threading.Lock()
+        self.resumed = os.path.exists(path)
+        if self.resumed:
+            self.load()
+        # Only the owner can read the planned passwords
+        self.file = os.fdopen(os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600), 'a')
+
+    def load(self):
+        with open(self.path, 'r') as f:
+            content = f.read()
+        # Drop a line torn by a crash mid-write so new entries start on a fresh line
+        if content and not content.endswith('\n'):
+            content = content[:content.rfind('\n') + 1]
+            with open(self.path, 'w') as f:
+                f.write(content)
+
+        for line in content.splitlines():
+            entry = json.loads(line)
+            if entry['type'] == 'workshop':
+                self.settings = entry['settings']
+            elif entry['type'] == 'user':
+                self.users.append(entry['user'])
+            elif entry['type'] == 'done':
+                self.done.add((entry['stage'], entry['username']))
+
+    def append(self, entry):
+        with self.lock:
+            self.file.write(json.dumps(entry) + '\n')
+            self.file.flush()
+
+    def start(self, settings, users):
+        """Record the workshop settings and planned users for a new create."""
+        self.settings = settings
+        self.users = users
+        self.append({'type': 'workshop', 'settings': settings})
+        for user in users:
+            self.append({'type': 'user', 'user': user})
+
+    def mark(self, stage, username):
+        with self.lock:
+            self.done.add((stage, username))
+        self.append({'type': 'done', 'stage': stage, 'username': username})
+
+    def is_done(self, stage, username):
+        with self.lock:
+            return (stage, username) in self.done
+
+    def remove(self):
+        """Delete the checkpoint once the create has run to the end."""
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,13 +1,43 @@
-import boto3
 import csv
+import io
 import random
 import string
 import logging
 import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+import throttling
+import failure_queue
+import aws_clients
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+DEFAULT_MAX_WORKERS = 8
+# Each user costs one AdminCreateUser and one AdminSetUserPassword call. Both
+# count against account-wide Cognito admin quotas, so stay well below them.
+DEFAULT_USERS_PER_SECOND = 10
+IMPORT_POLL_SECONDS = 5
+IMPORT_JOB_DONE_STATUSES = ('Succeeded', 'Failed', 'Stopped', 'Expired')
+
+class RateLimiter:
+    """Space out calls so that at most `rate` of them start per second across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        with self.lock:
+            slot = max(self.next_slot, time.monotonic())
+            self.next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
 def generate_safe_password():
     """Generate a password that works reliably with Cognito."""
     # Use a more limited set of special characters that are less likely to cause issues
@@ -29,9 +59,16 @@ def generate_safe_password():
     random.shuffle(password)
     return ''.join(password)
 
-def create_cognito_user(client, username, temporary_password, user_pool_id):
+def create_cognito_user(client, username, temporary_password, user_pool_id, existing_ok=False):
+    """
+    Create a user with a permanent password.
+
+    With existing_ok, a user left over from an interrupted run keeps its
+    account and is given `temporary_password` as its password.
+    """
     try:
-        response = client.admin_create_user(
+        response = throttling.call(
+            client, 'admin_create_user',
             UserPoolId=user_pool_id,
             Username=username,
             TemporaryPassword=temporary_password,
@@ -39,51 +76,206 @@ def create_cognito_user(client, username, temporary_password, user_pool_id):
         )
         logging.info(f"Created user: {username}")
     except client.exceptions.UsernameExistsException:
-        logging.warning(f"User {username} already exists.")
-        return None
+        if not existing_ok:
+            logging.warning(f"User {username} already exists.")
+            return None
+        logging.info(f"User {username} already exists, resetting its password.")
+        response = {'User': {'Username': username}}
     except Exception as e:
         logging.error(f"Failed to create user {username}: {str(e)}")
+        failure_queue.record('create_cognito_user',
+                             {'user_pool_id': user_pool_id, 'username': username, 'password': temporary_password}, e)
         return None
 
+    if not set_user_password(client, username, temporary_password, user_pool_id):
+        return None
+
+    return response
+
+def set_user_password(client, username, password, user_pool_id):
     try:
-        client.admin_set_user_password(
+        throttling.call(
+            client, 'admin_set_user_password',
             UserPoolId=user_pool_id,
             Username=username,
-            Password=temporary_password,
+            Password=password,
             Permanent=True
         )
         logging.info(f"Set permanent password for user: {username}")
+        return True
     except Exception as e:
         logging.error(f"Failed to set permanent password for user {username}: {str(e)}")
+        failure_queue.record('set_user_password',
+                             {'user_pool_id': user_pool_id, 'username': username, 'password': password}, e)
+        return False
+
+def run_in_order(func, users, user_pool_id, max_workers, users_per_second):
+    """
+    Call func(username, password, user_pool_id) concurrently for every user pair.
+
+    Yields the pairs whose call succeeded, in the same order as `users`, as soon as
+    every user before them has finished. Failed users are skipped.
+    """
+    limiter = RateLimiter(users_per_second)
+
+    def call(user):
+        limiter.wait()
+        username, password = user
+        return func(username, password, user_pool_id)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(call, user) for user in users]
+        for user, future in zip(users, futures):
+            if future.result():
+                yield user
+            else:
+                failure_queue.hold_user(*user)
+
+def create_cognito_users(client, users, user_pool_id, max_workers=DEFAULT_MAX_WORKERS, users_per_second=DEFAULT_USERS_PER_SECOND):
+    """Create (username, password) pairs concurrently with a shared client, yielding them in order."""
+    def create(username, password, user_pool_id):
+        return create_cognito_user(client, username, password, user_pool_id)
+
+    return run_in_order(create, users, user_pool_id, max_workers, users_per_second)
+
+def build_import_csv(client, usernames, user_pool_id):
+    """Build a user import CSV using the column layout the user pool expects."""
+    header = client.get_csv_header(UserPoolId=user_pool_id)['CSVHeader']
+    defaults = {
+        'cognito:mfa_enabled': 'false',
+        'email_verified': 'false',
+        'phone_number_verified': 'false',
+    }
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for username in usernames:
+        writer.writerow([username if column == 'cognito:username' else defaults.get(column, '')
+                         for column in header])
+    return buffer.getvalue()
+
+def import_cognito_users(client, usernames, user_pool_id, import_role_arn, job_name):
+    """
+    Create all users with a single Cognito user import job and wait for it to finish.
+
+    Returns the final job description, or None if the job could not be run.
+    """
+    try:
+        job = client.create_user_import_job(
+            JobName=job_name,
+            UserPoolId=user_pool_id,
+            CloudWatchLogsRoleArn=import_role_arn
+        )['UserImportJob']
+
+        request = urllib.request.Request(
+            job['PreSignedUrl'],
+            data=build_import_csv(client, usernames, user_pool_id).encode('utf-8'),
+            headers={'x-amz-server-side-encryption': 'aws:kms'},
+            method='PUT'
+        )
+        urllib.request.urlopen(request).close()
+
+        client.start_user_import_job(UserPoolId=user_pool_id, JobId=job['JobId'])
+        logging.info(f"Started user import job {job['JobId']} for {len(usernames)} users")
+
+        while job['Status'] not in IMPORT_JOB_DONE_STATUSES:
+            time.sleep(IMPORT_POLL_SECONDS)
+            job = client.describe_user_import_job(UserPoolId=user_pool_id, JobId=job['JobId'])['UserImportJob']
+
+        logging.info(f"User import job {job['JobId']} {job['Status']}: "
+                     f"{job.get('ImportedUsers', 0)} imported, {job.get('SkippedUsers', 0)} skipped, "
+                     f"{job.get('FailedUsers', 0)} failed")
+        return job
+    except Exception as e:
+        logging.error(f"User import job failed: {str(e)}")
         return None
 
-    return response
+def list_users_needing_password(client, user_pool_id):
+    """Return the usernames that still have no usable password (e.g. freshly imported users)."""
+    usernames = set()
+    paginator = client.get_paginator('list_users')
+    for page in paginator.paginate(UserPoolId=user_pool_id, Filter='cognito:user_status = "RESET_REQUIRED"'):
+        usernames.update(user['Username'] for user in page['Users'])
+    return usernames
 
-def main(num_users, user_pool_id, sagemaker_domain_id, hosted_uri, region, workshop_name):
-    client = boto3.client('cognito-idp', region_name=region)
+def bulk_create_cognito_users(client, users, user_pool_id, import_role_arn, job_name,
+                              max_workers=DEFAULT_MAX_WORKERS, users_per_second=DEFAULT_USERS_PER_SECOND):
+    """
+    Create users through an import job, then set passwords only for users that need one.
 
-    # Write user pool id, sagemaker domain id, and hosted URI at the top of CSV
+    Yields the (username, password) pairs that are ready to log in, in input order.
+    Users that already had a password before the import are left untouched and skipped.
+    """
+    job = import_cognito_users(client, [username for username, _ in users], user_pool_id, import_role_arn, job_name)
+    if not job or job['Status'] != 'Succeeded':
+        return
+
+    needing_password = list_users_needing_password(client, user_pool_id)
+    pending = [user for user in users if user[0] in needing_password]
+
+    def set_password(username, password, user_pool_id):
+        return set_user_password(client, username, password, user_pool_id)
+
+    yield from run_in_order(set_password, pending, user_pool_id, max_workers, users_per_second)
+
+def write_users_csv(workshop_name, hosted_uri, user_pool_id, sagemaker_domain_id, users):
+    """Write the workshop header rows and (username, password) pairs to <workshop_name>-users.csv."""
     with open(f"{workshop_name}-users.csv", mode='w', newline='') as file:
         writer = csv.writer(file)
         writer.writerow(["Hosted URI", hosted_uri])
         writer.writerow(["User Pool ID", user_pool_id])
         writer.writerow(["Sagemaker Domain ID", sagemaker_domain_id])
         writer.writerow(["Username", "Password"])
+        writer.writerows(users)
 
-        for i in range(1, num_users + 1):
-            username = f"workshop-{i:03}"
-            temporary_password = generate_safe_password()
+def provision_users(client, num_users, user_pool_id, sagemaker_domain_id, hosted_uri, workshop_name,
+                    max_workers=DEFAULT_MAX_WORKERS, import_role_arn=None, users=None):
+    """
+    Create the workshop's users and write their sign-in details to <workshop_name>-users.csv.
 
-            response = create_cognito_user(client, username, temporary_password, user_pool_id)
+    `users` are (username, password) pairs planned ahead, e.g. from a checkpoint;
+    without them `num_users` new ones are generated.
+    Returns the (username, password) pairs that were created.
+    """
+    users = users or [(f"workshop-{i:03}", generate_safe_password()) for i in range(1, num_users + 1)]
+    created = []
+    start_time = time.monotonic()
 
-            if response:
-                writer.writerow([username, temporary_password])
+    # Write user pool id, sagemaker domain id, and hosted URI at the top of CSV
+    with open(f"{workshop_name}-users.csv", mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Hosted URI", hosted_uri])
+        writer.writerow(["User Pool ID", user_pool_id])
+        writer.writerow(["Sagemaker Domain ID", sagemaker_domain_id])
+        writer.writerow(["Username", "Password"])
+
+        if import_role_arn:
+            created_users = bulk_create_cognito_users(client, users, user_pool_id, import_role_arn,
+                                                      f"{workshop_name}-import", max_workers)
+        else:
+            created_users = create_cognito_users(client, users, user_pool_id, max_workers)
 
+        for username, temporary_password in created_users:
+            writer.writerow([username, temporary_password])
+            file.flush()
+            created.append((username, temporary_password))
+
+    elapsed = time.monotonic() - start_time
+    logging.info(f"Created {len(created)} of {num_users} users in {elapsed:.1f}s "
+                 f"({len(created) / elapsed if elapsed else 0:.1f} users/s with {max_workers} workers)")
     logging.info(f"Users created and details saved to {workshop_name}-users.csv")
+    return created
+
+def main(num_users, user_pool_id, sagemaker_domain_id, hosted_uri, region, workshop_name, max_workers=DEFAULT_MAX_WORKERS,
+         import_role_arn=None):
+    client = aws_clients.get_factory(region, max(max_workers * 2, 10)).client('cognito-idp')
+    return provision_users(client, num_users, user_pool_id, sagemaker_domain_id, hosted_uri, workshop_name,
+                           max_workers, import_role_arn)
 
 if __name__ == "__main__":
-    if len(sys.argv) != 7:
-        print("Usage: python create_cognito_users.py <num_users> <user_pool_id> <sagemaker_domain_id> <hosted_uri> <region> <workshop_name>")
+    if len(sys.argv) not in (7, 8, 9):
+        print("Usage: python create_cognito_users.py <num_users> <user_pool_id> <sagemaker_domain_id> <hosted_uri> <region> <workshop_name> [max_workers] [import_role_arn]")
         sys.exit(1)
     
     num_users = int(sys.argv[1])
@@ -92,5 +284,7 @@ if __name__ == "__main__":
     hosted_uri = sys.argv[4]
     region = sys.argv[5]
     workshop_name = sys.argv[6]
+    max_workers = int(sys.argv[7]) if len(sys.argv) >= 8 else DEFAULT_MAX_WORKERS
+    import_role_arn = sys.argv[8] if len(sys.argv) == 9 else None
 
-    main(num_users, user_pool_id, sagemaker_domain_id, hosted_uri, region, workshop_name)
+    main(num_users, user_pool_id, sagemaker_domain_id, hosted_uri, region, workshop_name, max_workers, import_role_arn)
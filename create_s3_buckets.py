@@ -1,37 +1,87 @@
-import boto3
 import logging
 import sys
 import uuid
 import random
 import string
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import throttling
+import failure_queue
+import aws_clients
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+DEFAULT_MAX_WORKERS = 8
+
 def generate_random_string(length=6):
     """
     Generate a random string of lowercase letters and numbers.
     """
     return ''.join(random.choices(string.ascii_lowercase + string.digits, k=length))
 
-def create_bucket(bucket_name, project_tag, region):
+def generate_bucket_prefix(bucket_prefix):
+    """
+    Generate the unique prefix of a workshop's bucket names, leaving room for a -NNNN user number.
+    """
+    # Generate a random suffix to make bucket names more unique
+    # Using both a UUID part and a timestamp to reduce collision probability
+    timestamp = datetime.now().strftime("%m%d%H%M")
+    random_suffix = generate_random_string(6)
+    suffix = f"-{timestamp}-{random_suffix}"
+    # Ensure bucket names don't exceed 63 characters by truncating the prefix if needed
+    return f"{bucket_prefix[:63 - len(suffix) - len('-0000')]}{suffix}"
+
+def user_bucket_name(bucket_prefix, user_number):
+    """The bucket of user `user_number`; the login Lambda derives lazily created buckets the same way."""
+    return f"{bucket_prefix}-{user_number:03}"
+
+def generate_bucket_names(bucket_prefix, num_buckets):
+    """
+    Generate unique, valid bucket names for a workshop.
+    """
+    prefix = generate_bucket_prefix(bucket_prefix)
+    return [user_bucket_name(prefix, i) for i in range(1, num_buckets + 1)]
+
+def generate_shared_bucket_name(bucket_prefix):
+    """
+    Generate a unique, valid name for a workshop's shared bucket.
+    """
+    suffix = f"-{datetime.now().strftime('%m%d%H%M')}-{generate_random_string(6)}-shared"
+    return f"{bucket_prefix[:63 - len(suffix)]}{suffix}"
+
+def user_prefix(username):
+    """
+    Return the key prefix a user owns in a shared workshop bucket.
+    """
+    return f"{username}/"
+
+def create_bucket(bucket_name, project_tag, region, s3=None, encryption=False, expiration_days=None):
     """
     Create an S3 bucket with the specified name and region.
+
+    Pass a shared `s3` client when creating many buckets. Default encryption
+    (SSE-S3) and an object expiration rule are applied when requested.
     """
-    s3 = boto3.client('s3', region_name=region)
+    s3 = s3 or aws_clients.get_client('s3', region)
     try:
         location = {'LocationConstraint': region}
-        s3.create_bucket(
-            Bucket=bucket_name,
-            CreateBucketConfiguration=location if region != 'us-east-1' else {}
-        )
-        logging.info(f"Bucket '{bucket_name}' created successfully in region '{region}'.")
+        try:
+            throttling.call(
+                s3, 'create_bucket',
+                Bucket=bucket_name,
+                CreateBucketConfiguration=location if region != 'us-east-1' else {}
+            )
+            logging.info(f"Bucket '{bucket_name}' created successfully in region '{region}'.")
+        except s3.exceptions.BucketAlreadyOwnedByYou:
+            # A retry after a partial failure only needs the configuration re-applied
+            logging.info(f"Bucket '{bucket_name}' already exists, applying its configuration.")
         
         # Get the current time
         creation_date = datetime.now().strftime("%Y-%m-%d")
         
-        s3.put_bucket_tagging(
+        throttling.call(
+            s3, 'put_bucket_tagging',
             Bucket=bucket_name,
             Tagging={
                 'TagSet': [
@@ -42,14 +92,65 @@ def create_bucket(bucket_name, project_tag, region):
             }
         )
         logging.info(f"Tag added to bucket '{bucket_name}': Project={project_tag}.")
+
+        if encryption:
+            throttling.call(
+                s3, 'put_bucket_encryption',
+                Bucket=bucket_name,
+                ServerSideEncryptionConfiguration={
+                    'Rules': [{'ApplyServerSideEncryptionByDefault': {'SSEAlgorithm': 'AES256'}}]
+                }
+            )
+
+        if expiration_days:
+            throttling.call(
+                s3, 'put_bucket_lifecycle_configuration',
+                Bucket=bucket_name,
+                LifecycleConfiguration={
+                    'Rules': [{
+                        'ID': 'workshop-expiration',
+                        'Filter': {'Prefix': ''},
+                        'Status': 'Enabled',
+                        'Expiration': {'Days': expiration_days},
+                        'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 1}
+                    }]
+                }
+            )
         return True
     except Exception as e:
         logging.error(f"Error creating bucket '{bucket_name}': {e}")
+        failure_queue.record('create_bucket', {'bucket_name': bucket_name, 'project_tag': project_tag,
+                                               'encryption': encryption, 'expiration_days': expiration_days}, e)
         return False
 
+def create_buckets(bucket_names, project_tag, region, max_workers=DEFAULT_MAX_WORKERS, encryption=False, expiration_days=None,
+                   s3=None):
+    """
+    Create and configure buckets concurrently through one pooled client.
+
+    Returns the names of the buckets that were created, in input order.
+    """
+    s3 = s3 or aws_clients.get_client('s3', region)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(
+            lambda bucket_name: create_bucket(bucket_name, project_tag, region, s3, encryption, expiration_days),
+            bucket_names))
+    return [bucket_name for bucket_name, created in zip(bucket_names, results) if created]
+
+def create_shared_bucket(bucket_name, project_tag, region, encryption=False, expiration_days=None, s3=None):
+    """
+    Create the single bucket used in shared storage mode.
+
+    Users get a prefix each (see user_prefix); prefixes need no API calls, and
+    the stack's execution role only allows a user into their own prefix.
+    """
+    if create_bucket(bucket_name, project_tag, region, s3, encryption, expiration_days):
+        return [bucket_name]
+    return []
+
 def main():
-    if len(sys.argv) != 4:
-        logging.error("Usage: python create_buckets.py <region> <bucket_name_prefix> <number_of_buckets>")
+    if len(sys.argv) not in (4, 5, 6):
+        logging.error("Usage: python create_buckets.py <region> <bucket_name_prefix> <number_of_buckets> [max_workers] [shared_bucket_name]")
         sys.exit(1)
     
     region = sys.argv[1]
@@ -57,30 +158,21 @@ def main():
     project_tag = original_prefix  # Keep original for tagging
     bucket_prefix = original_prefix.lower()  # Convert to lowercase for bucket names
     num_buckets = int(sys.argv[3])  # Convert to integer
-    
-    # Generate a random suffix to make bucket names more unique
-    # Using both a UUID part and a timestamp to reduce collision probability
-    timestamp = datetime.now().strftime("%m%d%H%M")
-    random_suffix = generate_random_string(6)
-    
-    successful_buckets = []
-    for i in range(1, num_buckets + 1):
-        # Create bucket name with randomization
-        bucket_name = f"{bucket_prefix}-{timestamp}-{random_suffix}-{i:03}"
-        
-        # Ensure bucket name doesn't exceed 63 characters
-        if len(bucket_name) > 63:
-            # Truncate the prefix if needed
-            max_prefix_length = 63 - len(f"-{timestamp}-{random_suffix}-{i:03}")
-            bucket_name = f"{bucket_prefix[:max_prefix_length]}-{timestamp}-{random_suffix}-{i:03}"
-        
-        if create_bucket(bucket_name, project_tag, region):
-            successful_buckets.append(bucket_name)
+    max_workers = int(sys.argv[4]) if len(sys.argv) >= 5 else DEFAULT_MAX_WORKERS
+    shared_bucket_name = sys.argv[5] if len(sys.argv) == 6 else None
+
+    if shared_bucket_name:
+        successful_buckets = create_shared_bucket(shared_bucket_name, project_tag, region)
+        logging.info(f"Shared bucket for {num_buckets} users: s3://{shared_bucket_name}/<username>/")
+        return successful_buckets
+
+    successful_buckets = create_buckets(generate_bucket_names(bucket_prefix, num_buckets), project_tag, region, max_workers)
     
     # Print summary
     logging.info(f"Successfully created {len(successful_buckets)} out of {num_buckets} buckets")
     for bucket in successful_buckets:
         logging.info(f"Created: {bucket}")
+    return successful_buckets
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,24 +1,98 @@
-import boto3
 import csv
 import logging
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+import throttling
+import failure_queue
+import aws_clients
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def create_user_profile(sm_client, region, domain_id, username):
+DEFAULT_MAX_WORKERS = 8
+READY_POLL_SECONDS = 10
+READY_TIMEOUT_SECONDS = 900
+
+def create_user_profile(sm_client, region, domain_id, username, existing_ok=False):
+    """Create a user profile. With existing_ok, an existing profile of the same name counts as created."""
     try:
-        response = sm_client.create_user_profile(
+        # Throttled calls are retried by the shared concurrency controller
+        response = throttling.call(
+            sm_client, 'create_user_profile',
             DomainId=domain_id,
             UserProfileName=username
         )
         logging.info(f"User profile '{username}' created successfully in region {region}.")
         return response
     except Exception as e:
+        if existing_ok and throttling.error_code(e) == 'ResourceInUse':
+            logging.info(f"User profile '{username}' already exists in region {region}.")
+            return {'DomainId': domain_id, 'UserProfileName': username}
         logging.error(f"Failed to create user profile '{username}' in region {region}: {e}")
+        failure_queue.record('create_user_profile', {'domain_id': domain_id, 'username': username}, e)
         return None
 
-def main(region, workshop_name):
+def create_user_profiles(sm_client, region, domain_id, usernames, max_workers=DEFAULT_MAX_WORKERS):
+    """Create user profiles concurrently and return the usernames that were created."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        responses = list(executor.map(
+            lambda username: create_user_profile(sm_client, region, domain_id, username), usernames))
+    return [username for username, response in zip(usernames, responses) if response]
+
+def get_profile_statuses(sm_client, domain_id):
+    """Return a {user profile name: status} map for the whole domain."""
+    statuses = {}
+    paginator = sm_client.get_paginator('list_user_profiles')
+    for page in paginator.paginate(DomainIdEquals=domain_id):
+        for profile in page['UserProfiles']:
+            statuses[profile['UserProfileName']] = profile['Status']
+    return statuses
+
+def wait_for_profiles_in_service(sm_client, domain_id, usernames, timeout=READY_TIMEOUT_SECONDS):
+    """
+    Poll the domain's profile list until every profile in `usernames` is InService.
+
+    A single paginated listing covers all profiles per poll. Returns the last
+    {username: status} seen for the requested profiles.
+    """
+    deadline = time.monotonic() + timeout
+    pending = set(usernames)
+    statuses = {}
+
+    while True:
+        try:
+            domain_statuses = get_profile_statuses(sm_client, domain_id)
+        except Exception as e:
+            logging.warning(f"Failed to list user profiles: {e}")
+            domain_statuses = {}
+
+        for username in list(pending):
+            status = domain_statuses.get(username)
+            if status:
+                statuses[username] = status
+            if status in ('InService', 'Failed'):
+                pending.discard(username)
+
+        logging.info(f"{len(usernames) - len(pending)} of {len(usernames)} user profiles settled")
+        if not pending or time.monotonic() >= deadline:
+            break
+        time.sleep(READY_POLL_SECONDS)
+
+    failed = sorted(username for username, status in statuses.items() if status == 'Failed')
+    if failed:
+        logging.error(f"User profiles failed to create: {', '.join(failed)}")
+    if pending:
+        logging.error(f"User profiles not InService after {timeout}s: {', '.join(sorted(pending))}")
+    return {username: statuses.get(username) for username in usernames}
+
+def provision_profiles(sm_client, region, domain_id, usernames, max_workers=DEFAULT_MAX_WORKERS):
+    """Create profiles for `usernames` and wait until they are InService, returning their statuses."""
+    created = create_user_profiles(sm_client, region, domain_id, usernames, max_workers)
+    logging.info(f"Created {len(created)} of {len(usernames)} user profiles, waiting for them to be InService")
+    return wait_for_profiles_in_service(sm_client, domain_id, created)
+
+def main(region, workshop_name, max_workers=DEFAULT_MAX_WORKERS):
     sagemaker_domain_id = None
 
     try:
@@ -39,9 +113,9 @@ def main(region, workshop_name):
         logging.error(f"Failed to read CSV file: {e}")
         sys.exit(1)
 
-    session = boto3.Session(region_name=region)
-    sm_client = session.client('sagemaker')
+    sm_client = aws_clients.get_factory(region, max(max_workers * 2, 10)).client('sagemaker')
 
+    usernames = []
     try:
         with open(f"{workshop_name}-users.csv", mode='r') as file:
             reader = csv.DictReader(file, fieldnames=["Username", "Password"])
@@ -53,18 +127,21 @@ def main(region, workshop_name):
                 password = row.get('Password', '')
 
                 if username and password:
-                    create_user_profile(sm_client, region, sagemaker_domain_id, username)
+                    usernames.append(username)
                 else:
                     logging.warning(f"Skipping invalid row: {row}")
     except Exception as e:
         logging.error(f"Failed to process CSV file: {e}")
 
+    return provision_profiles(sm_client, region, sagemaker_domain_id, usernames, max_workers)
+
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python create_sagemaker_profiles.py <region> <workshop_name>")
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python create_sagemaker_profiles.py <region> <workshop_name> [max_workers]")
         sys.exit(1)
 
     region = sys.argv[1]
     workshop_name = sys.argv[2]
+    max_workers = int(sys.argv[3]) if len(sys.argv) == 4 else DEFAULT_MAX_WORKERS
 
-    main(region, workshop_name)
+    main(region, workshop_name, max_workers)
@@ -1,13 +1,19 @@
-import boto3
 import csv
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
+import throttling
+import failure_queue
+import aws_clients
 
-def delete_cognito_user(user_pool_id, username, region):
-    client = boto3.client('cognito-idp', region_name=region)
+DEFAULT_MAX_WORKERS = 8
+
+def delete_cognito_user(user_pool_id, username, region, client=None):
+    client = client or aws_clients.get_client('cognito-idp', region)
 
     try:
-        client.admin_delete_user(
+        throttling.call(
+            client, 'admin_delete_user',
             UserPoolId=user_pool_id,
             Username=username
         )
@@ -16,6 +22,12 @@ def delete_cognito_user(user_pool_id, username, region):
         logging.warning(f"User {username} not found, skipping deletion.")
     except Exception as e:
         logging.error(f"Failed to delete user {username}: {str(e)}")
+        failure_queue.record('delete_cognito_user', {'user_pool_id': user_pool_id, 'username': username}, e)
+
+def delete_cognito_users(client, user_pool_id, usernames, region=None, max_workers=DEFAULT_MAX_WORKERS):
+    """Delete the given users concurrently with a shared client."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda username: delete_cognito_user(user_pool_id, username, region, client), usernames))
 
 def main(csv_file, region):
     try:
@@ -35,10 +47,9 @@ def main(csv_file, region):
                 return
 
             # Process usernames for deletion
-            for row in rows:
-                if row[0].startswith("workshop-"):
-                    username = row[0]
-                    delete_cognito_user(user_pool_id, username, region)
+            usernames = [row[0] for row in rows if row[0].startswith("workshop-")]
+            client = aws_clients.get_client('cognito-idp', region)
+            delete_cognito_users(client, user_pool_id, usernames, region)
     except FileNotFoundError:
         logging.error(f"CSV file '{csv_file}' not found.")
     except Exception as e:
@@ -1,52 +1,70 @@
-import boto3
 import logging
 import sys
 import os
 import json
 import csv
+from concurrent.futures import ThreadPoolExecutor
+import throttling
+import state_store
+import failure_queue
+import aws_clients
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def empty_bucket(bucket_name, region):
+DEFAULT_MAX_WORKERS = 8
+
+def empty_bucket(bucket_name, region, s3=None):
     """
     Empty an S3 bucket by deleting all objects inside.
+
+    Objects are removed with batched DeleteObjects calls (up to 1000 keys each).
+    Listing versions also covers unversioned buckets, whose objects have the
+    version ID "null".
     """
-    s3 = boto3.resource('s3', region_name=region)
-    bucket = s3.Bucket(bucket_name)
+    s3 = s3 or aws_clients.get_client('s3', region)
     
     try:
-        # Delete objects
-        bucket.objects.all().delete()
-        logging.info(f"All objects deleted from bucket '{bucket_name}'.")
-        
-        # Delete object versions if bucket has versioning enabled
-        bucket.object_versions.all().delete()
-        logging.info(f"All object versions deleted from bucket '{bucket_name}'.")
+        paginator = s3.get_paginator('list_object_versions')
+        for page in paginator.paginate(Bucket=bucket_name):
+            objects = [{'Key': version['Key'], 'VersionId': version['VersionId']}
+                       for version in page.get('Versions', []) + page.get('DeleteMarkers', [])]
+            if objects:
+                throttling.call(s3, 'delete_objects', Bucket=bucket_name, Delete={'Objects': objects, 'Quiet': True})
+        logging.info(f"All objects and object versions deleted from bucket '{bucket_name}'.")
     except Exception as e:
+        if throttling.error_code(e) == 'NoSuchBucket':
+            logging.info(f"Bucket '{bucket_name}' does not exist, nothing to empty.")
+            return True
         logging.error(f"Error deleting objects from bucket '{bucket_name}': {e}")
+        # The bucket itself is still in place, so retrying means emptying and deleting it again
+        failure_queue.record('delete_bucket', {'bucket_name': bucket_name}, e)
         return False
     return True
 
-def delete_bucket(bucket_name, region):
+def delete_bucket(bucket_name, region, s3=None):
     """
     Delete an S3 bucket with the specified name.
     """
-    s3 = boto3.client('s3', region_name=region)
+    s3 = s3 or aws_clients.get_client('s3', region)
     try:
-        if empty_bucket(bucket_name, region):  # Empty the bucket first
-            s3.delete_bucket(Bucket=bucket_name)
+        if empty_bucket(bucket_name, region, s3):  # Empty the bucket first
+            throttling.call(s3, 'delete_bucket', Bucket=bucket_name)
             logging.info(f"Bucket '{bucket_name}' deleted successfully.")
             return True
     except Exception as e:
+        if throttling.error_code(e) == 'NoSuchBucket':
+            logging.info(f"Bucket '{bucket_name}' was already deleted.")
+            return True
         logging.error(f"Error deleting bucket '{bucket_name}': {e}")
+        failure_queue.record('delete_bucket', {'bucket_name': bucket_name}, e)
     return False
 
-def list_matching_buckets(region, bucket_prefix):
+def list_matching_buckets(region, bucket_prefix, s3=None):
     """
     List all buckets that start with the given prefix.
     """
-    s3 = boto3.client('s3', region_name=region)
+    s3 = s3 or aws_clients.get_client('s3', region)
     try:
         response = s3.list_buckets()
         bucket_prefix_lower = bucket_prefix.lower()
@@ -81,16 +99,17 @@ def get_bucket_list_from_csv(csv_file, workshop_name, region):
     
     return bucket_names
 
-def main():
-    if len(sys.argv) != 3:
-        logging.error("Usage: python delete_s3_buckets.py <csv_file> <region>")
-        sys.exit(1)
-    
-    csv_file = sys.argv[1]
-    region = sys.argv[2]
-    
+def find_workshop_buckets(csv_file, region):
+    """
+    Work out which buckets belong to the workshop described by a users CSV.
+    """
     # Extract workshop name from CSV filename
     workshop_name = csv_file.split('-users.csv')[0]
+
+    # Buckets recorded when the workshop was created need no account-wide scan
+    recorded = state_store.get_store().bucket_names(workshop_name)
+    if recorded:
+        return recorded
     
     # Count users in CSV to determine number of buckets
     num_buckets = 0
@@ -125,15 +144,32 @@ def main():
             bucket_name = f"{workshop_name.lower()}-{i:03}"
             bucket_names.append(bucket_name)
     
+    return bucket_names
+
+def delete_buckets(bucket_names, region, s3=None, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Empty and delete the given buckets concurrently, returning how many were deleted.
+    """
+    s3 = s3 or aws_clients.get_client('s3', region)
     logging.info(f"Found {len(bucket_names)} buckets to delete")
     
     # Delete the buckets
-    deleted_count = 0
-    for bucket_name in bucket_names:
-        if delete_bucket(bucket_name, region):
-            deleted_count += 1
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        deleted_count = sum(executor.map(lambda bucket_name: delete_bucket(bucket_name, region, s3),
+                                         bucket_names))
     
     logging.info(f"Successfully deleted {deleted_count} out of {len(bucket_names)} buckets")
+    return deleted_count
+
+def main():
+    if len(sys.argv) != 3:
+        logging.error("Usage: python delete_s3_buckets.py <csv_file> <region>")
+        sys.exit(1)
+    
+    csv_file = sys.argv[1]
+    region = sys.argv[2]
+    
+    delete_buckets(find_workshop_buckets(csv_file, region), region)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
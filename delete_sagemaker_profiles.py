@@ -1,11 +1,16 @@
-import boto3
 import csv
 import logging
 import sys
+from concurrent.futures import ThreadPoolExecutor
+import throttling
+import failure_queue
+import aws_clients
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+DEFAULT_MAX_WORKERS = 8
+
 def list_user_profiles(sm_client, domain_id):
     try:
         user_profiles = []
@@ -19,7 +24,8 @@ def list_user_profiles(sm_client, domain_id):
 
 def delete_user_profile(sm_client, domain_id, username):
     try:
-        response = sm_client.delete_user_profile(
+        response = throttling.call(
+            sm_client, 'delete_user_profile',
             DomainId=domain_id,
             UserProfileName=username
         )
@@ -29,6 +35,7 @@ def delete_user_profile(sm_client, domain_id, username):
         logging.warning(f"User profile '{username}' not found.")
     except Exception as e:
         logging.error(f"Failed to delete user profile '{username}': {e}")
+        failure_queue.record('delete_user_profile', {'domain_id': domain_id, 'username': username}, e)
         return None
 
 def get_domain_id_from_csv(csv_file):
@@ -49,17 +56,8 @@ def get_domain_id_from_csv(csv_file):
         logging.error(f"Failed to process CSV file: {e}")
         return None
 
-def main(csv_file, region):
-    session = boto3.Session(region_name=region)
-    sm_client = session.client('sagemaker')
-    
-    domain_id = get_domain_id_from_csv(csv_file)
-    if not domain_id:
-        logging.error("Failed to get Sagemaker Domain ID from CSV. Exiting.")
-        return
-
-    logging.info(f"Using Sagemaker Domain ID: {domain_id}")
-
+def delete_user_profiles(sm_client, domain_id, max_workers=DEFAULT_MAX_WORKERS):
+    """Delete every user profile in the domain concurrently."""
     # List all user profiles
     user_profiles = list_user_profiles(sm_client, domain_id)
     
@@ -68,9 +66,20 @@ def main(csv_file, region):
         return
 
     # Delete all user profiles
-    for profile in user_profiles:
-        username = profile['UserProfileName']
-        delete_user_profile(sm_client, domain_id, username)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(lambda profile: delete_user_profile(sm_client, domain_id, profile['UserProfileName']),
+                          user_profiles))
+
+def main(csv_file, region):
+    sm_client = aws_clients.get_client('sagemaker', region)
+    
+    domain_id = get_domain_id_from_csv(csv_file)
+    if not domain_id:
+        logging.error("Failed to get Sagemaker Domain ID from CSV. Exiting.")
+        return
+
+    logging.info(f"Using Sagemaker Domain ID: {domain_id}")
+    delete_user_profiles(sm_client, domain_id)
 
 if __name__ == "__main__":
     if len(sys.argv) != 3:
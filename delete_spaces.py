@@ -1,101 +1,122 @@
 #!/usr/bin/env python3
 
-import subprocess
-import json
 import logging
 import time
 import csv
 import sys
+from concurrent.futures import ThreadPoolExecutor
+import throttling
+import failure_queue
+import aws_clients
 
 # Constants
 WAIT_TIME = 5  # Time in seconds to wait between checks
 MAX_WAIT_ITERATIONS = 60  # Maximum number of iterations to wait
+DEFAULT_MAX_WORKERS = 8
 
-def list_spaces(domain_id, region):
-    command = ["aws", "sagemaker", "list-spaces", "--domain-id", domain_id, "--region", region]
+def list_spaces(sm_client, domain_id):
     try:
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
-        spaces = json.loads(result.stdout).get('Spaces', [])
+        spaces = []
+        paginator = sm_client.get_paginator('list_spaces')
+        for page in paginator.paginate(DomainIdEquals=domain_id):
+            spaces.extend(page['Spaces'])
         return spaces
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         logging.error(f"Failed to list spaces. Error: {e}")
         return []
 
-def list_apps(domain_id, region):
-    command = ["aws", "sagemaker", "list-apps", "--domain-id", domain_id, "--region", region]
+def list_apps(sm_client, domain_id):
     try:
-        result = subprocess.run(command, check=True, capture_output=True, text=True)
-        apps = json.loads(result.stdout).get('Apps', [])
+        apps = []
+        paginator = sm_client.get_paginator('list_apps')
+        for page in paginator.paginate(DomainIdEquals=domain_id):
+            apps.extend(page['Apps'])
         return apps
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
         logging.error(f"Failed to list apps. Error: {e}")
         return []
 
-def delete_app(domain_id, app_name, app_type, region, user_profile_name=None, space_name=None):
+def delete_app(sm_client, domain_id, app_name, app_type, user_profile_name=None, space_name=None):
     if user_profile_name:
-        delete_command = ["aws", "sagemaker", "delete-app", "--domain-id", domain_id, "--user-profile-name", user_profile_name, "--app-name", app_name, "--app-type", app_type, "--region", region]
+        owner = {'UserProfileName': user_profile_name}
     elif space_name:
-        delete_command = ["aws", "sagemaker", "delete-app", "--domain-id", domain_id, "--space-name", space_name, "--app-name", app_name, "--app-type", app_type, "--region", region]
+        owner = {'SpaceName': space_name}
     else:
         logging.error(f"Neither UserProfileName nor SpaceName provided for app: {app_name}. Skipping deletion.")
         return
-    
+
     try:
-        result = subprocess.run(delete_command, check=False, capture_output=True, text=True)
-        
-        # Check if the error is about the app already being deleted
-        if result.returncode != 0:
-            if "App [default] has already been deleted" in result.stderr:
-                logging.info(f"App: {app_name} of type: {app_type} from user profile: {user_profile_name} or space: {space_name} was already deleted.")
-                return
-            else:
-                # If it's a different error, raise it
-                subprocess.run(delete_command, check=True)
-                
+        throttling.call(sm_client, 'delete_app', DomainId=domain_id, AppName=app_name, AppType=app_type, **owner)
         logging.info(f"Initiated deletion of app: {app_name} of type: {app_type} from user profile: {user_profile_name} or space: {space_name}")
-    except subprocess.CalledProcessError as e:
+    except Exception as e:
+        # Check if the error is about the app already being deleted
+        if "has already been deleted" in str(e):
+            logging.info(f"App: {app_name} of type: {app_type} from user profile: {user_profile_name} or space: {space_name} was already deleted.")
+            return
         logging.error(f"Failed to delete app: {app_name} of type: {app_type} from user profile: {user_profile_name} or space: {space_name}. Error: {e}")
 
-def delete_all_apps(domain_id, region):
+def delete_all_apps(sm_client, domain_id):
     logging.info(f"Starting deletion of all apps for domain ID: {domain_id}")
-    
+
     # List all apps
-    apps = list_apps(domain_id, region)
+    apps = [app for app in list_apps(sm_client, domain_id) if app.get('Status') not in ('Deleted', 'Deleting')]
     if not apps:
         logging.info("No apps found to delete.")
         return
-    
+
     # Delete each app
-    for app in apps:
-        app_name = app['AppName']
-        app_type = app['AppType']
-        user_profile_name = app.get('UserProfileName')
-        space_name = app.get('SpaceName')
-        delete_app(domain_id, app_name, app_type, region, user_profile_name, space_name)
-
-def delete_space(domain_id, space_name, region):
-    delete_command = ["aws", "sagemaker", "delete-space", "--domain-id", domain_id, "--space-name", space_name, "--region", region]
-    
+    with ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS) as executor:
+        list(executor.map(lambda app: delete_app(sm_client, domain_id, app['AppName'], app['AppType'],
+                                                 app.get('UserProfileName'), app.get('SpaceName')), apps))
+
+    # Spaces cannot be deleted while their apps are still shutting down
+    for _ in range(MAX_WAIT_ITERATIONS):
+        if not any(app.get('Status') == 'Deleting' for app in list_apps(sm_client, domain_id)):
+            return
+        time.sleep(WAIT_TIME)
+    logging.error("Apps did not finish deleting within the allotted time.")
+
+def delete_space(sm_client, domain_id, space_name):
+    """Initiate deletion of a space without waiting for it to finish."""
     try:
-        subprocess.run(delete_command, check=True)
+        throttling.call(sm_client, 'delete_space', DomainId=domain_id, SpaceName=space_name)
         logging.info(f"Initiated deletion of space: {space_name}")
-        
-        # Custom wait loop
-        for _ in range(MAX_WAIT_ITERATIONS):
-            time.sleep(WAIT_TIME)
-            if not space_exists(domain_id, space_name, region):
-                logging.info(f"Successfully deleted space: {space_name}")
-                return
-        logging.error(f"Failed to delete space: {space_name} within the allotted time.")
-    except subprocess.CalledProcessError as e:
+        return True
+    except Exception as e:
         logging.error(f"Failed to delete space: {space_name}. Error: {e}")
+        failure_queue.record('delete_space', {'domain_id': domain_id, 'space_name': space_name}, e)
+        return False
+
+def delete_domain_spaces(sm_client, domain_id):
+    """Delete every app and space in a domain, waiting until all spaces are gone."""
+    logging.info(f"Starting deletion process for domain ID: {domain_id}")
+
+    # Delete all apps first
+    delete_all_apps(sm_client, domain_id)
+
+    # List all spaces after apps are deleted
+    spaces = list_spaces(sm_client, domain_id)
+    if not spaces:
+        logging.info("No spaces found to delete.")
+        return []
+
+    with ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS) as executor:
+        deleted = list(executor.map(lambda space: delete_space(sm_client, domain_id, space['SpaceName']), spaces))
+    pending = {space['SpaceName'] for space, ok in zip(spaces, deleted) if ok}
 
-def space_exists(domain_id, space_name, region):
-    spaces = list_spaces(domain_id, region)
-    for space in spaces:
-        if space['SpaceName'] == space_name:
-            return True
-    return False
+    # One listing per check covers every space being deleted
+    for _ in range(MAX_WAIT_ITERATIONS):
+        if not pending:
+            break
+        time.sleep(WAIT_TIME)
+        remaining = {space['SpaceName'] for space in list_spaces(sm_client, domain_id)}
+        for space_name in pending - remaining:
+            logging.info(f"Successfully deleted space: {space_name}")
+        pending &= remaining
+
+    if pending:
+        logging.error(f"Failed to delete spaces within the allotted time: {', '.join(sorted(pending))}")
+    return sorted(pending)
 
 def get_domain_id_from_csv(csv_file):
     try:
@@ -124,28 +145,16 @@ def main(csv_file, region):
     if not domain_id:
         logging.error("Failed to fetch Sagemaker Domain ID from CSV. Exiting.")
         sys.exit(1)
-    
-    logging.info(f"Starting deletion process for domain ID: {domain_id} in region: {region}")
 
-    # Delete all apps first
-    delete_all_apps(domain_id, region)
-    
-    # List all spaces after apps are deleted
-    spaces = list_spaces(domain_id, region)
-    if not spaces:
-        logging.info("No spaces found to delete.")
-        exit()
-    
-    # Delete each space
-    for space in spaces:
-        space_name = space['SpaceName']
-        delete_space(domain_id, space_name, region)
+    logging.info(f"Region: {region}")
+    sm_client = aws_clients.get_client('sagemaker', region)
+    delete_domain_spaces(sm_client, domain_id)
 
 if __name__ == "__main__":
     if len(sys.argv) < 3:
         print("Usage: python script.py <csvs_file> <aws-region>")
         sys.exit(1)
-    
+
     csv_file = sys.argv[1]
     aws_region = sys.argv[2]
     main(csv_file, aws_region)
@@ -0,0 +1,150 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+from botocore.exceptions import ClientError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+class SkippedAfterFailure(Exception):
+    """Recorded for later stages that never ran because an earlier stage failed for the same user."""
+
+def failures_file(workshop_name):
+    return f"{workshop_name}-failures.json"
+
+def users_csv_file(path):
+    """Return the users CSV that belongs to a failures file."""
+    return path[:-len('-failures.json')] + '-users.csv'
+
+class FailureQueue:
+    """
+    Failed operations for one workshop, persisted to `<workshop>-failures.json`.
+
+    Each entry holds the operation name, the JSON-serialisable arguments needed
+    to run it again, and the error class it failed with, so only the failed
+    items are retried. Users whose handout row is waiting on a failed item are
+    held until all their items succeed. The file is removed once empty.
+    """
+
+    def __init__(self, path, region=None):
+        self.path = path
+        self.region = region
+        self.failures = []
+        self.held_users = {}
+        self.lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                data = json.load(f)
+            self.region = region or data.get('region')
+            self.failures = data.get('failures', [])
+            self.held_users = data.get('held_users', {})
+
+    def __len__(self):
+        with self.lock:
+            return len(self.failures)
+
+    def add(self, operation, args, error):
+        entry = {
+            'operation': operation,
+            'args': args,
+            'error_class': type(error).__name__,
+            'error': str(error),
+            'failed_at': datetime.now().isoformat(timespec='seconds'),
+        }
+        if isinstance(error, ClientError):
+            entry['error_code'] = error.response.get('Error', {}).get('Code')
+        with self.lock:
+            # A repeat failure of the same item replaces its earlier entry
+            self.failures = [failure for failure in self.failures
+                             if (failure['operation'], failure['args']) != (operation, args)]
+            self.failures.append(entry)
+            self.save()
+
+    def take(self):
+        """
+        Remove and return every queued failure, e.g. to retry them.
+
+        The file keeps the taken failures until flush(), so a crash mid-retry loses nothing.
+        """
+        with self.lock:
+            failures, self.failures = self.failures, []
+            return failures
+
+    def flush(self):
+        with self.lock:
+            self.save()
+
+    def hold_user(self, username, password, resources=(), spare=False):
+        """Keep a user out of the handout until no failure mentions them or their resources."""
+        with self.lock:
+            self.held_users[username] = {'password': password, 'resources': list(resources)}
+            if spare:
+                self.held_users[username]['spare'] = True
+            self.save()
+
+    def mentions(self, *values):
+        """Return True if any queued failure has one of `values` among its arguments."""
+        with self.lock:
+            return bool(self._pending_values() & set(values))
+
+    def _pending_values(self):
+        return {str(value) for failure in self.failures for value in failure['args'].values()}
+
+    def release_ready_users(self, spares=False):
+        """
+        Return [(username, password)] for held users with no failures left, and stop holding them.
+
+        Spare seats are only released when `spares` is True, since they do not go in the handout.
+        """
+        with self.lock:
+            pending = self._pending_values()
+            ready = [username for username, held in self.held_users.items()
+                     if not pending & {username, *held['resources']} and held.get('spare', False) == spares]
+            released = [(username, self.held_users.pop(username)['password']) for username in sorted(ready)]
+            if released:
+                self.save()
+            return released
+
+    def save(self):
+        if not self.failures and not self.held_users:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            return
+        temp_path = f"{self.path}.tmp"
+        # Held users' passwords are only readable by the owner
+        with os.fdopen(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+            json.dump({'region': self.region, 'failures': self.failures, 'held_users': self.held_users}, f, indent=2)
+        os.replace(temp_path, self.path)
+
+# The queue that record() writes to; None means failures are only logged
+active = None
+
+def start(path, region=None):
+    """Load (or create) the failure queue at `path` and make it the active queue."""
+    global active
+    active = FailureQueue(path, region)
+    return active
+
+def stop():
+    global active
+    active = None
+
+def hold_user(username, password, resources=(), spare=False):
+    """
+    Hold a user back from the handout if the active queue has failures for them.
+
+    Returns True if the user was held.
+    """
+    queue = active
+    if queue is not None and queue.mentions(username, *resources):
+        queue.hold_user(username, password, resources, spare)
+        return True
+    return False
+
+def record(operation, args, error):
+    """Add a failed operation to the active queue, if there is one."""
+    queue = active
+    if queue is not None:
+        queue.add(operation, args, error)
@@ -1,9 +1,11 @@
 import json
 import logging
 import os
+import time
 import requests
 import boto3
 import base64
+from botocore.exceptions import ClientError
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -15,6 +17,16 @@ IDENTITY_POOL_ID = os.environ['IDENTITY_POOL_ID']
 CUSTOM_AWS_REGION = os.environ['CUSTOM_AWS_REGION']
 STUDIO_DOMAIN_ID = os.environ['STUDIO_DOMAIN_ID']
 USER_POOL_ID = os.environ['USER_POOL_ID']
+# Lazy mode creates a user's SageMaker profile, and their bucket when USER_BUCKET_PREFIX is set, on first login
+LAZY_PROVISIONING = os.environ.get('LAZY_PROVISIONING', 'false') == 'true'
+USER_BUCKET_PREFIX = os.environ.get('USER_BUCKET_PREFIX', '')
+# The workshop's bucket settings, applied like create_s3_buckets.create_bucket does
+BUCKET_ENCRYPTION = os.environ.get('BUCKET_ENCRYPTION', 'false') == 'true'
+BUCKET_EXPIRATION_DAYS = int(os.environ.get('BUCKET_EXPIRATION_DAYS') or 0)
+WORKSHOP_NAME = os.environ.get('WORKSHOP_NAME', '')
+# Stay inside API Gateway's 30 second integration timeout
+PROFILE_WAIT_SECONDS = 20
+PROFILE_POLL_SECONDS = 2
 
 def lambda_handler(event, context):
     logger.info("Received event: %s", json.dumps(event, indent=2))
@@ -77,6 +89,17 @@ def lambda_handler(event, context):
                 'body': 'Failed to get AWS credentials'
             }
 
+        if LAZY_PROVISIONING and not provision_user(username):
+            # The profile is still being created; send the user back through sign-in shortly
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'text/html'
+                },
+                'body': (f'<html><head><meta http-equiv="refresh" content="15;url={login_url()}"></head>'
+                         '<body>Your workspace is being prepared. You will be redirected in a few seconds...</body></html>')
+            }
+
         # Generate the presigned URL for SageMaker Studio
         presigned_url = generate_presigned_domain_url(CUSTOM_AWS_REGION, STUDIO_DOMAIN_ID, username)
 
@@ -101,6 +124,85 @@ def lambda_handler(event, context):
             'body': f"Internal server error: {str(e)}"
         }
 
+def login_url():
+    return (f"https://{os.environ['COGNITO_DOMAIN']}/login?client_id={CLIENT_ID}&response_type=code"
+            f"&scope=aws.cognito.signin.user.admin+openid+profile&redirect_uri={REDIRECT_URI}")
+
+def user_bucket_name(username):
+    """The bucket the workshop tools planned for this user: <prefix>-<user number>."""
+    return f"{USER_BUCKET_PREFIX}-{username.split('-')[-1]}"
+
+def ensure_user_bucket(username):
+    """
+    Create the user's bucket if it is missing, with the workshop's encryption
+    and expiration settings. Another login creating it first is fine.
+    """
+    s3_client = boto3.client('s3', region_name=CUSTOM_AWS_REGION)
+    bucket_name = user_bucket_name(username)
+    try:
+        if CUSTOM_AWS_REGION == 'us-east-1':
+            s3_client.create_bucket(Bucket=bucket_name)
+        else:
+            s3_client.create_bucket(Bucket=bucket_name,
+                                    CreateBucketConfiguration={'LocationConstraint': CUSTOM_AWS_REGION})
+        logger.info("Created bucket %s", bucket_name)
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'BucketAlreadyOwnedByYou':
+            raise
+    s3_client.put_bucket_tagging(Bucket=bucket_name, Tagging={'TagSet': [
+        {'Key': 'project', 'Value': 'cmt-workshop'},
+        {'Key': 'workshop', 'Value': WORKSHOP_NAME},
+    ]})
+    if BUCKET_ENCRYPTION:
+        s3_client.put_bucket_encryption(Bucket=bucket_name, ServerSideEncryptionConfiguration={
+            'Rules': [{'ApplyServerSideEncryptionByDefault': {'SSEAlgorithm': 'AES256'}}]
+        })
+    if BUCKET_EXPIRATION_DAYS:
+        s3_client.put_bucket_lifecycle_configuration(Bucket=bucket_name, LifecycleConfiguration={
+            'Rules': [{
+                'ID': 'workshop-expiration',
+                'Filter': {'Prefix': ''},
+                'Status': 'Enabled',
+                'Expiration': {'Days': BUCKET_EXPIRATION_DAYS},
+                'AbortIncompleteMultipartUpload': {'DaysAfterInitiation': 1}
+            }]
+        })
+
+def provision_user(username):
+    """
+    Make sure the user's SageMaker profile (and bucket) exist, creating them on first login.
+
+    Concurrent logins for the same user both try the create; the loser sees
+    ResourceInUse and waits on the same profile. Returns True once the profile
+    is InService, or False if it is still being created.
+    """
+    sagemaker_client = boto3.client('sagemaker', region_name=CUSTOM_AWS_REGION)
+    if USER_BUCKET_PREFIX:
+        ensure_user_bucket(username)
+
+    try:
+        status = sagemaker_client.describe_user_profile(DomainId=STUDIO_DOMAIN_ID,
+                                                        UserProfileName=username)['Status']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ResourceNotFound':
+            raise
+        try:
+            sagemaker_client.create_user_profile(DomainId=STUDIO_DOMAIN_ID, UserProfileName=username)
+            logger.info("Created user profile %s on first login", username)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceInUse':
+                raise
+        status = 'Pending'
+
+    deadline = time.monotonic() + PROFILE_WAIT_SECONDS
+    while status not in ('InService', 'Failed') and time.monotonic() < deadline:
+        time.sleep(PROFILE_POLL_SECONDS)
+        status = sagemaker_client.describe_user_profile(DomainId=STUDIO_DOMAIN_ID,
+                                                        UserProfileName=username)['Status']
+    if status == 'Failed':
+        raise RuntimeError(f"User profile {username} failed to create")
+    return status == 'InService'
+
 def get_aws_credentials(id_token):
     client = boto3.client('cognito-identity', region_name=CUSTOM_AWS_REGION)
     try:
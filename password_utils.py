@@ -1,10 +1,10 @@
 # password_utils.py
-import boto3
 import csv
 import string
 import random
 import logging
 import sys
+import aws_clients
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -36,7 +36,7 @@ def update_user_passwords(csv_file, region):
         rows = list(reader)
         user_pool_id = rows[1][1]  # Get user pool ID from second row
     
-    client = boto3.client('cognito-idp', region_name=region)
+    client = aws_clients.get_client('cognito-idp', region)
     
     # Create new CSV content with updated passwords
     new_rows = rows[:4]  # Keep the header rows
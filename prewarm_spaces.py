@@ -0,0 +1,171 @@
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import aws_clients
+import state_store
+import throttling
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MAX_WORKERS = 8
+DEFAULT_INSTANCE_TYPE = 'ml.t3.medium'
+APP_NAME = 'default'
+READY_POLL_SECONDS = 15
+READY_TIMEOUT_SECONDS = 1200
+
+def space_name(username):
+    return f"{username}-space"
+
+def create_space(sm_client, domain_id, username, instance_type=DEFAULT_INSTANCE_TYPE):
+    """Create a user's private JupyterLab space. An existing space counts as created."""
+    try:
+        throttling.call(
+            sm_client, 'create_space',
+            DomainId=domain_id,
+            SpaceName=space_name(username),
+            OwnershipSettings={'OwnerUserProfileName': username},
+            SpaceSharingSettings={'SharingType': 'Private'},
+            SpaceSettings={
+                'AppType': 'JupyterLab',
+                'JupyterLabAppSettings': {'DefaultResourceSpec': {'InstanceType': instance_type}},
+            }
+        )
+        logging.info(f"Created space {space_name(username)}")
+        return True
+    except Exception as e:
+        if throttling.error_code(e) == 'ResourceInUse':
+            return True
+        logging.error(f"Failed to create space {space_name(username)}: {e}")
+        return False
+
+def start_app(sm_client, domain_id, username, instance_type=DEFAULT_INSTANCE_TYPE):
+    """Start the JupyterLab app in a user's space. An app that is already running counts as started."""
+    try:
+        throttling.call(
+            sm_client, 'create_app',
+            DomainId=domain_id,
+            SpaceName=space_name(username),
+            AppType='JupyterLab',
+            AppName=APP_NAME,
+            ResourceSpec={'InstanceType': instance_type}
+        )
+        logging.info(f"Starting JupyterLab in {space_name(username)}")
+        return True
+    except Exception as e:
+        if throttling.error_code(e) == 'ResourceInUse':
+            return True
+        logging.error(f"Failed to start JupyterLab in {space_name(username)}: {e}")
+        return False
+
+def get_space_statuses(sm_client, domain_id):
+    """Return {space name: status} for the whole domain with one paginated listing."""
+    statuses = {}
+    for page in sm_client.get_paginator('list_spaces').paginate(DomainIdEquals=domain_id):
+        for space in page['Spaces']:
+            statuses[space['SpaceName']] = space['Status']
+    return statuses
+
+def get_app_statuses(sm_client, domain_id):
+    """Return {space name: JupyterLab app status} for the whole domain with one paginated listing."""
+    statuses = {}
+    for page in sm_client.get_paginator('list_apps').paginate(DomainIdEquals=domain_id):
+        for app in page['Apps']:
+            if app.get('SpaceName') and app['AppType'] == 'JupyterLab' and app['Status'] not in ('Deleted', 'Deleting'):
+                statuses[app['SpaceName']] = app['Status']
+    return statuses
+
+def prewarm(sm_client, domain_id, usernames, max_workers=DEFAULT_MAX_WORKERS, instance_type=DEFAULT_INSTANCE_TYPE,
+            timeout=READY_TIMEOUT_SECONDS):
+    """
+    Create every user's space and start its JupyterLab app, at most `max_workers` calls at a time.
+
+    Apps can only start once their space is InService, so each poll lists the
+    domain's spaces and apps once, starts apps in the spaces that became ready
+    and stops when every app has settled or the timeout passes.
+    Returns {username: 'InService' | 'Failed' | 'Pending'}.
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        created = list(executor.map(lambda username: create_space(sm_client, domain_id, username, instance_type),
+                                    usernames))
+        results = {username: 'Pending' if ok else 'Failed' for username, ok in zip(usernames, created)}
+        started = set()
+        deadline = time.monotonic() + timeout
+
+        while True:
+            try:
+                spaces = get_space_statuses(sm_client, domain_id)
+                apps = get_app_statuses(sm_client, domain_id)
+            except Exception as e:
+                logging.warning(f"Failed to list spaces and apps: {e}")
+                spaces, apps = {}, {}
+
+            to_start = []
+            for username, result in results.items():
+                if result != 'Pending':
+                    continue
+                name = space_name(username)
+                if spaces.get(name) in ('Failed', 'Update_Failed', 'Delete_Failed'):
+                    results[username] = 'Failed'
+                elif apps.get(name) in ('InService', 'Failed'):
+                    results[username] = apps[name]
+                elif spaces.get(name) == 'InService' and name not in apps and username not in started:
+                    to_start.append(username)
+
+            for username, ok in zip(to_start, executor.map(
+                    lambda username: start_app(sm_client, domain_id, username, instance_type), to_start)):
+                started.add(username)
+                if not ok:
+                    results[username] = 'Failed'
+
+            pending = [username for username, result in results.items() if result == 'Pending']
+            logging.info(f"{len(usernames) - len(pending)} of {len(usernames)} spaces settled")
+            if not pending or time.monotonic() >= deadline:
+                break
+            time.sleep(READY_POLL_SECONDS)
+    return results
+
+def report(results):
+    """Print a readiness summary and return the number of users whose app is running."""
+    ready = sorted(username for username, status in results.items() if status == 'InService')
+    for status in ('Pending', 'Failed'):
+        usernames = sorted(username for username, result in results.items() if result == status)
+        if usernames:
+            print(f"{status}: {', '.join(usernames)}")
+    print(f"{len(ready)} of {len(results)} JupyterLab apps are running")
+    return len(ready)
+
+def wait_until(start_at):
+    """Sleep until a datetime, so the pre-warm can be scheduled ahead of a session."""
+    delay = (start_at - datetime.now()).total_seconds()
+    if delay > 0:
+        logging.info(f"Waiting until {start_at.isoformat(timespec='minutes')} to pre-warm spaces")
+        time.sleep(delay)
+
+def main(workshop_name, region, start_at=None, max_workers=DEFAULT_MAX_WORKERS):
+    store = state_store.get_store()
+    workshop = store.get_workshop(workshop_name)
+    if not workshop:
+        logging.error(f"Workshop {workshop_name} is not in the state store.")
+        sys.exit(1)
+    # Only handed-out users; lazily provisioned users have no profile to own a space yet
+    usernames = [user['username'] for user in store.users(workshop_name, cognito_status='created')
+                 if user['profile_status'] not in ('lazy', 'Failed')]
+
+    if start_at:
+        wait_until(start_at)
+    sm_client = aws_clients.get_factory(region, max_workers * 2).client('sagemaker')
+    results = prewarm(sm_client, workshop['sagemaker_domain_id'], usernames, max_workers)
+    store.save_users(workshop_name, [{'username': username, 'space_status': status}
+                                     for username, status in results.items()])
+    report(results)
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python prewarm_spaces.py <workshop_name> <region> [start time, e.g. 2024-05-01T08:30]")
+        sys.exit(1)
+
+    main(sys.argv[1], sys.argv[2], datetime.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 else None)
@@ -0,0 +1,87 @@
+import logging
+import queue
+import threading
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_QUEUE_SIZE = 32
+
+# Marks the end of a stage's input
+_DONE = object()
+
+def run_pipeline(items, stages, queue_size=DEFAULT_QUEUE_SIZE, on_complete=None):
+    """
+    Stream items through a series of stages connected by bounded queues.
+
+    `stages` is a list of (name, func, workers) tuples. Each item moves to the
+    next stage as soon as func(item) returns it (or a replacement object), so
+    early items finish while later ones are still in the first stage. Returning
+    None, or raising, drops the item and records it as failed in that stage.
+
+    on_complete(item) is called as each item leaves the last stage. Returns
+    (completed items, {stage name: [failed items]}).
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    completed = []
+    failures = {name: [] for name, _, _ in stages}
+    lock = threading.Lock()
+
+    def work(name, func, inbox, outbox):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                # Pass the end marker on to this stage's other workers
+                inbox.put(_DONE)
+                return
+            try:
+                result = func(item)
+            except Exception as e:
+                logging.error(f"{name} failed for {item}: {e}")
+                result = None
+            if result is None:
+                with lock:
+                    failures[name].append(item)
+            else:
+                outbox.put(result)
+
+    def run_stage(name, func, workers, inbox, outbox):
+        threads = [threading.Thread(target=work, args=(name, func, inbox, outbox), daemon=True)
+                   for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # Each stage shuts its workers down once its input ends, then ends the next stage's input
+    def stage_runner(index):
+        name, func, workers = stages[index]
+        run_stage(name, func, workers, queues[index], queues[index + 1])
+        queues[index + 1].put(_DONE)
+
+    runners = []
+    for index in range(len(stages)):
+        runner = threading.Thread(target=stage_runner, args=(index,), daemon=True)
+        runner.start()
+        runners.append(runner)
+
+    def feed():
+        for item in items:
+            queues[0].put(item)
+        queues[0].put(_DONE)
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+
+    while True:
+        item = queues[-1].get()
+        if item is _DONE:
+            break
+        completed.append(item)
+        if on_complete:
+            on_complete(item)
+
+    feeder.join()
+    for runner in runners:
+        runner.join()
+    return completed, failures
@@ -0,0 +1,143 @@
+import csv
+import logging
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aws_clients
+import failure_queue
+import state_store
+import create_cognito_users
+import create_sagemaker_profiles
+import create_s3_buckets
+import delete_spaces
+import delete_sagemaker_profiles
+import delete_cognito_users
+import delete_s3_buckets
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MAX_WORKERS = 8
+DRAIN_ROUNDS = 3
+DRAIN_BASE_DELAY_SECONDS = 5
+
+def _create_cognito_user(region, user_pool_id, username, password):
+    create_cognito_users.create_cognito_user(aws_clients.get_client('cognito-idp', region), username, password,
+                                             user_pool_id)
+
+def _set_user_password(region, user_pool_id, username, password):
+    create_cognito_users.set_user_password(aws_clients.get_client('cognito-idp', region), username, password,
+                                           user_pool_id)
+
+def _create_user_profile(region, domain_id, username):
+    create_sagemaker_profiles.create_user_profile(aws_clients.get_client('sagemaker', region), region, domain_id,
+                                                  username)
+
+def _create_bucket(region, bucket_name, project_tag, encryption=False, expiration_days=None):
+    create_s3_buckets.create_bucket(bucket_name, project_tag, region, aws_clients.get_client('s3', region),
+                                    encryption, expiration_days)
+
+def _delete_space(region, domain_id, space_name):
+    delete_spaces.delete_space(aws_clients.get_client('sagemaker', region), domain_id, space_name)
+
+def _delete_user_profile(region, domain_id, username):
+    delete_sagemaker_profiles.delete_user_profile(aws_clients.get_client('sagemaker', region), domain_id, username)
+
+def _delete_cognito_user(region, user_pool_id, username):
+    delete_cognito_users.delete_cognito_user(user_pool_id, username, region,
+                                             aws_clients.get_client('cognito-idp', region))
+
+def _delete_bucket(region, bucket_name):
+    delete_s3_buckets.delete_bucket(bucket_name, region, aws_clients.get_client('s3', region))
+
+# Operations are retried in this order, so a user exists before their password
+# is set and a space is gone before its owner's profile is deleted.
+OPERATIONS = {
+    'create_cognito_user': _create_cognito_user,
+    'set_user_password': _set_user_password,
+    'create_user_profile': _create_user_profile,
+    'create_bucket': _create_bucket,
+    'delete_space': _delete_space,
+    'delete_user_profile': _delete_user_profile,
+    'delete_cognito_user': _delete_cognito_user,
+    'delete_bucket': _delete_bucket,
+}
+
+def retry(failure, region):
+    """Run one failed operation again. A repeat failure is recorded back into the active queue."""
+    try:
+        OPERATIONS[failure['operation']](region, **failure['args'])
+    except Exception as e:
+        logging.error(f"Retrying {failure['operation']} {failure['args']} failed: {e}")
+        failure_queue.record(failure['operation'], failure['args'], e)
+
+def drain(queue, region=None, rounds=DRAIN_ROUNDS, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Retry every queued failure, backing off between rounds, until the queue is empty.
+
+    Returns the number of failures still queued after the last round.
+    """
+    region = region or queue.region
+    failure_queue.active = queue
+    for round_number in range(rounds):
+        if not len(queue):
+            break
+        delay = DRAIN_BASE_DELAY_SECONDS * 2 ** round_number
+        logging.info(f"Retrying {len(queue)} failed operations in {delay}s (round {round_number + 1} of {rounds})")
+        time.sleep(delay)
+
+        failures = queue.take()
+        for operation in OPERATIONS:
+            batch = [failure for failure in failures if failure['operation'] == operation]
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                list(executor.map(lambda failure: retry(failure, region), batch))
+        queue.flush()
+
+    remaining = len(queue)
+    if remaining:
+        logging.error(f"{remaining} operations still failing, see {queue.path}")
+    return remaining
+
+def append_released_users(queue):
+    """
+    Add held users whose failures have all been retried to the state store and the users CSV.
+
+    Released spare seats are only marked ready in the state store.
+    """
+    csv_file = failure_queue.users_csv_file(queue.path)
+    store = state_store.get_store()
+    workshop_name = state_store.workshop_name_from_csv(csv_file)
+    spares = queue.release_ready_users(spares=True)
+    if spares and store.get_workshop(workshop_name):
+        store.save_users(workshop_name, [{'username': username, 'cognito_status': 'spare',
+                                          'profile_status': 'created'} for username, _ in spares])
+
+    released = queue.release_ready_users()
+    if not released:
+        return released
+
+    if store.get_workshop(workshop_name):
+        store.save_users(workshop_name, [{'username': username, 'password': password, 'cognito_status': 'created',
+                                          'profile_status': 'created'} for username, password in released])
+    with open(csv_file, mode='a', newline='') as file:
+        csv.writer(file).writerows(released)
+    logging.info(f"Added {len(released)} users to {csv_file}")
+    return released
+
+def main(failures_path, rounds=DRAIN_ROUNDS):
+    queue = failure_queue.start(failures_path)
+    if not len(queue):
+        logging.info(f"No failed operations in {failures_path}.")
+    remaining = drain(queue, rounds=rounds)
+    append_released_users(queue)
+    failure_queue.stop()
+    return remaining
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python retry_failures.py <workshop>-failures.json [rounds]")
+        sys.exit(1)
+
+    remaining = main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else DRAIN_ROUNDS)
+    sys.exit(1 if remaining else 0)
@@ -0,0 +1,211 @@
+import csv
+import hashlib
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
+from delete_s3_buckets import list_matching_buckets
+from create_s3_buckets import user_prefix
+import throttling
+import aws_clients
+import state_store
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MAX_WORKERS = 16
+# Objects above this size are copied as parallel multipart copies
+MULTIPART_THRESHOLD = 256 * 1024 * 1024
+PART_SIZE = 64 * 1024 * 1024
+# Destination objects remember the ETag of the object they were copied from,
+# because multipart copies get a different ETag than their source.
+SOURCE_ETAG_KEY = 'source-etag'
+
+def parse_s3_uri(uri):
+    """
+    Split an s3://bucket/prefix URI into (bucket, prefix).
+    """
+    bucket, _, prefix = uri[len('s3://'):].partition('/')
+    return bucket, prefix
+
+def list_source_objects(s3, bucket, prefix):
+    """
+    List every object under an S3 prefix as (key, relative key, size, etag).
+    """
+    objects = []
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith('/'):
+                continue
+            objects.append((obj['Key'], obj['Key'][len(prefix):].lstrip('/'), obj['Size'], obj['ETag'].strip('"')))
+    return objects
+
+def file_md5(path):
+    md5 = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def is_up_to_date(s3, bucket, key, source_etag):
+    """
+    Check whether the destination object already holds the source object's data.
+    """
+    try:
+        head = throttling.call(s3, 'head_object', Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+    return source_etag in (head['ETag'].strip('"'), head.get('Metadata', {}).get(SOURCE_ETAG_KEY))
+
+def multipart_copy(s3, source_bucket, source_key, size, bucket, key, metadata, part_executor):
+    """
+    Server-side copy of a large object, copying its parts in parallel.
+    """
+    upload_id = s3.create_multipart_upload(Bucket=bucket, Key=key, Metadata=metadata)['UploadId']
+    copy_source = {'Bucket': source_bucket, 'Key': source_key}
+
+    def copy_part(part_number):
+        start = (part_number - 1) * PART_SIZE
+        end = min(start + PART_SIZE, size) - 1
+        response = throttling.call(s3, 'upload_part_copy', Bucket=bucket, Key=key, UploadId=upload_id,
+                                   PartNumber=part_number, CopySource=copy_source,
+                                   CopySourceRange=f"bytes={start}-{end}")
+        return {'PartNumber': part_number, 'ETag': response['CopyPartResult']['ETag']}
+
+    try:
+        part_count = (size + PART_SIZE - 1) // PART_SIZE
+        parts = list(part_executor.map(copy_part, range(1, part_count + 1)))
+        s3.complete_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        raise
+
+def copy_object(s3, source_bucket, source_key, size, source_etag, bucket, key, part_executor):
+    """
+    Copy one object server-side unless the destination already matches.
+
+    Returns 'copied', 'skipped' or 'failed'.
+    """
+    try:
+        if is_up_to_date(s3, bucket, key, source_etag):
+            return 'skipped'
+
+        metadata = {SOURCE_ETAG_KEY: source_etag}
+        if size > MULTIPART_THRESHOLD:
+            multipart_copy(s3, source_bucket, source_key, size, bucket, key, metadata, part_executor)
+        else:
+            throttling.call(s3, 'copy_object', Bucket=bucket, Key=key,
+                            CopySource={'Bucket': source_bucket, 'Key': source_key},
+                            MetadataDirective='REPLACE', Metadata=metadata)
+        return 'copied'
+    except Exception as e:
+        logging.error(f"Failed to copy '{source_key}' to 's3://{bucket}/{key}': {e}")
+        return 'failed'
+
+def upload_local_directory(s3, directory, bucket, prefix):
+    """
+    Upload a local directory once, returning its objects as (key, relative key, size, etag).
+
+    The uploaded copy then serves as the server-side copy source for every other user.
+    """
+    objects = []
+    transfer_config = TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, multipart_chunksize=PART_SIZE)
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            relative_key = os.path.relpath(path, directory).replace(os.sep, '/')
+            key = f"{prefix}{relative_key}"
+            etag = file_md5(path)
+            if not is_up_to_date(s3, bucket, key, etag):
+                s3.upload_file(path, bucket, key, ExtraArgs={'Metadata': {SOURCE_ETAG_KEY: etag}}, Config=transfer_config)
+            objects.append((key, relative_key, os.path.getsize(path), etag))
+    return objects
+
+def seed(s3, source, targets, max_workers=DEFAULT_MAX_WORKERS):
+    """
+    Distribute a dataset into every (bucket, prefix) target.
+
+    `source` is an s3:// URI or a local directory. Returns a {'copied', 'skipped',
+    'failed'} count summary.
+    """
+    summary = {'copied': 0, 'skipped': 0, 'failed': 0}
+    if not targets:
+        return summary
+
+    if source.startswith('s3://'):
+        source_bucket, source_prefix = parse_s3_uri(source)
+        objects = list_source_objects(s3, source_bucket, source_prefix)
+    else:
+        # Seed the first target from disk, then copy server-side from there
+        source_bucket, first_prefix = targets[0]
+        objects = upload_local_directory(s3, source, source_bucket, first_prefix)
+        summary['copied'] += len(objects)
+        targets = targets[1:]
+
+    logging.info(f"Seeding {len(objects)} objects into {len(targets)} destinations")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor, \
+            ThreadPoolExecutor(max_workers=max_workers) as part_executor:
+        futures = [
+            executor.submit(copy_object, s3, source_bucket, key, size, etag, bucket, f"{prefix}{relative_key}", part_executor)
+            for bucket, prefix in targets
+            for key, relative_key, size, etag in objects
+        ]
+        for future in futures:
+            summary[future.result()] += 1
+    return summary
+
+def build_seed_targets(usernames, bucket_names):
+    """
+    Map a workshop's users and buckets to (bucket, prefix) seed destinations.
+    """
+    shared_buckets = [bucket_name for bucket_name in bucket_names if bucket_name.endswith('-shared')]
+    if shared_buckets:
+        return [(shared_buckets[0], user_prefix(username)) for username in usernames]
+    return [(bucket_name, '') for bucket_name in bucket_names]
+
+def get_seed_targets(csv_file, region):
+    """
+    Find the (bucket, prefix) destinations for every attendee of a workshop.
+    """
+    workshop_name = csv_file.split('-users.csv')[0]
+    store = state_store.get_store()
+    if store.get_workshop(workshop_name):
+        usernames = [user['username'] for user in store.users(workshop_name, cognito_status='created')]
+        return build_seed_targets(usernames, store.bucket_names(workshop_name))
+
+    with open(csv_file, 'r') as f:
+        usernames = [row[0] for row in csv.reader(f) if row and row[0].startswith("workshop-")]
+
+    return build_seed_targets(usernames, list_matching_buckets(region, workshop_name.lower()))
+
+def main(csv_file, region, source, max_workers=DEFAULT_MAX_WORKERS):
+    s3 = aws_clients.get_factory(region, max_workers * 2).client('s3')
+    targets = get_seed_targets(csv_file, region)
+    if not targets:
+        logging.error(f"No workshop storage found for {csv_file} in {region}.")
+        return None
+
+    start_time = time.monotonic()
+    summary = seed(s3, source, targets, max_workers)
+    logging.info(f"Seeded {len(targets)} destinations in {time.monotonic() - start_time:.1f}s: "
+                 f"{summary['copied']} copied, {summary['skipped']} already up to date, {summary['failed']} failed")
+    return summary
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5):
+        print("Usage: python seed_workshop_data.py <csv_file> <region> <s3://bucket/prefix | local_directory> [max_workers]")
+        sys.exit(1)
+
+    csv_file = sys.argv[1]
+    region = sys.argv[2]
+    source = sys.argv[3]
+    max_workers = int(sys.argv[4]) if len(sys.argv) == 5 else DEFAULT_MAX_WORKERS
+
+    main(csv_file, region, source, max_workers)
@@ -0,0 +1,195 @@
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+from botocore.config import Config
+import seed_workshop_data
+import stack_outputs
+import state_store
+import throttling
+from workshop_engine import WorkshopEngine
+from workshop_deployment.workshop_deployment_stack import CACHE_DIRECTORY, read_package_manifest
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_PACKAGES_FILE = "workshop-packages.txt"
+# Wheels are downloaded for the SageMaker Distribution images' platform and Python
+WHEEL_PLATFORM = "manylinux2014_x86_64"
+WHEEL_PYTHON_VERSION = "3.11"
+NFS_PORT = 2049
+MAX_FILL_INVOCATIONS = 20
+# A fill invocation runs for up to the Lambda's 15 minute timeout. It is never
+# retried by botocore, since a retry would run alongside the first invocation.
+FILL_READ_TIMEOUT = 900
+
+def fill_client(engine):
+    """A Lambda client that waits out a whole synchronous fill invocation."""
+    config = engine.clients.config.merge(Config(read_timeout=FILL_READ_TIMEOUT, retries={'mode': 'standard', 'total_max_attempts': 1}))
+    client = engine.clients.session.client('lambda', region_name=engine.region, config=config)
+    engine.clients.instrument(client)
+    return client
+
+def workshop_packages(packages_file=DEFAULT_PACKAGES_FILE):
+    """The packages listed in the workshop package manifest, or None without one."""
+    return read_package_manifest(packages_file) if os.path.exists(packages_file) else None
+
+def build_wheelhouse(packages, directory):
+    """Download wheels for the workshop packages and their dependencies. Returns True on success."""
+    command = [sys.executable, '-m', 'pip', 'download', '--quiet', '--dest', directory, '--only-binary=:all:',
+               '--platform', WHEEL_PLATFORM, '--python-version', WHEEL_PYTHON_VERSION, *packages]
+    try:
+        subprocess.run(command, check=True)
+        return True
+    except Exception as e:
+        logging.error(f"Failed to download the workshop wheels: {e}")
+        return False
+
+def stage(s3, bucket, packages=None, datasets_source=None):
+    """
+    Stage the wheelhouse and datasets in the cache staging bucket, under
+    wheelhouse/ and datasets/. Returns False if anything failed to stage.
+    """
+    ok = True
+    if packages:
+        with tempfile.TemporaryDirectory() as directory:
+            ok = build_wheelhouse(packages, directory)
+            if ok:
+                summary = seed_workshop_data.seed(s3, directory, [(bucket, 'wheelhouse/')])
+                ok = not summary['failed']
+    if datasets_source:
+        summary = seed_workshop_data.seed(s3, datasets_source, [(bucket, 'datasets/')])
+        ok = ok and not summary['failed']
+    return ok
+
+def mount_target_security_groups(efs_client, file_system_id):
+    groups = set()
+    for mount_target in efs_client.describe_mount_targets(FileSystemId=file_system_id)['MountTargets']:
+        groups.update(efs_client.describe_mount_target_security_groups(
+            MountTargetId=mount_target['MountTargetId'])['SecurityGroups'])
+    return sorted(groups)
+
+def nfs_permission(security_group_id):
+    return [{'IpProtocol': 'tcp', 'FromPort': NFS_PORT, 'ToPort': NFS_PORT,
+             'UserIdGroupPairs': [{'GroupId': security_group_id}]}]
+
+def allow_nfs(efs_client, ec2_client, file_system_id, security_group_id):
+    """Let the cache fill Lambda's security group reach the file system's mount targets."""
+    for group_id in mount_target_security_groups(efs_client, file_system_id):
+        try:
+            ec2_client.authorize_security_group_ingress(GroupId=group_id, IpPermissions=nfs_permission(security_group_id))
+        except Exception as e:
+            if throttling.error_code(e) != 'InvalidPermission.Duplicate':
+                raise
+
+def revoke_nfs(efs_client, ec2_client, file_system_id, security_group_id):
+    """Remove the rules added by allow_nfs, which would otherwise block deleting the Lambda's security group."""
+    for group_id in mount_target_security_groups(efs_client, file_system_id):
+        try:
+            ec2_client.revoke_security_group_ingress(GroupId=group_id, IpPermissions=nfs_permission(security_group_id))
+        except Exception as e:
+            if throttling.error_code(e) != 'InvalidPermission.NotFound':
+                raise
+
+def fill_function(engine, outputs):
+    """Return the cache fill Lambda's name and security group ID."""
+    function_name = outputs['CacheFillFunctionName']
+    configuration = engine.client('lambda').get_function_configuration(FunctionName=function_name)
+    return function_name, configuration['VpcConfig']['SecurityGroupIds'][0]
+
+def fill(lambda_client, function_name):
+    """
+    Invoke the cache fill Lambda until everything staged is in the cache.
+    Returns the {'copied', 'failed'} counts over all invocations, or None if it never finished.
+    """
+    totals = {'copied': 0, 'failed': 0}
+    for _ in range(MAX_FILL_INVOCATIONS):
+        response = lambda_client.invoke(FunctionName=function_name, Payload=b'{}')
+        result = json.loads(response['Payload'].read())
+        if response.get('FunctionError'):
+            logging.error(f"The cache fill Lambda failed: {result}")
+            return None
+        totals['copied'] += result['copied']
+        totals['failed'] += result['failed']
+        if not result['remaining']:
+            return totals
+        logging.info(f"{result['remaining']} files left to cache, invoking the fill Lambda again")
+    logging.error(f"The cache was not filled after {MAX_FILL_INVOCATIONS} invocations")
+    return None
+
+def mount_settings(file_system_id):
+    return [{'EFSFileSystemConfig': {'FileSystemId': file_system_id, 'FileSystemPath': CACHE_DIRECTORY}}]
+
+def mount_on_domain(sm_client, domain_id, file_system_id):
+    """Make the cache directory a default custom file system for the domain's users and spaces."""
+    settings = mount_settings(file_system_id)
+    throttling.call(sm_client, 'update_domain', DomainId=domain_id,
+                    DefaultUserSettings={'CustomFileSystemConfigs': settings},
+                    DefaultSpaceSettings={'CustomFileSystemConfigs': settings})
+
+def fill_workshop_cache(engine, workshop_name, packages=None, datasets_source=None):
+    """
+    Fill the workshop's shared cache once: stage the wheelhouse and datasets
+    in S3, copy them onto the domain's home EFS with the fill Lambda, and
+    mount the cache on the domain. Returns the cache's file system ID, or None.
+    """
+    store = state_store.get_store()
+    workshop = store.get_workshop(workshop_name)
+    if not workshop:
+        logging.error(f"Workshop {workshop_name} is not in the state store.")
+        return None
+    outputs = stack_outputs.fetch_stack_outputs(workshop['stack_name'], engine.region)
+    if not outputs or 'CacheFillFunctionName' not in outputs:
+        logging.error(f"The {workshop_name} stack has no shared cache; update it with SharedCache=true to add one.")
+        return None
+
+    if not stage(engine.client('s3'), outputs['CacheStagingBucketName'], packages, datasets_source):
+        return None
+
+    sm_client = engine.client('sagemaker')
+    file_system_id = sm_client.describe_domain(DomainId=workshop['sagemaker_domain_id'])['HomeEfsFileSystemId']
+    function_name, security_group_id = fill_function(engine, outputs)
+    allow_nfs(engine.client('efs'), engine.client('ec2'), file_system_id, security_group_id)
+
+    summary = fill(fill_client(engine), function_name)
+    if summary is None or summary['failed']:
+        return None
+    logging.info(f"Shared cache filled: {summary['copied']} files copied")
+
+    mount_on_domain(sm_client, workshop['sagemaker_domain_id'], file_system_id)
+    store.save_workshop(workshop_name, cache_file_system_id=file_system_id)
+    return file_system_id
+
+def remove_cache_access(engine, workshop_name):
+    """Revoke the fill Lambda's NFS access before the workshop stack is deleted. Returns True on success."""
+    workshop = state_store.get_store().get_workshop(workshop_name)
+    if not workshop or not workshop['cache_file_system_id']:
+        return True
+    try:
+        outputs = stack_outputs.fetch_stack_outputs(workshop['stack_name'], engine.region)
+        _, security_group_id = fill_function(engine, outputs)
+        revoke_nfs(engine.client('efs'), engine.client('ec2'), workshop['cache_file_system_id'], security_group_id)
+        return True
+    except Exception as e:
+        logging.error(f"Failed to revoke the shared cache's NFS access: {e}")
+        return False
+
+def main(workshop_name, region, datasets_source=None, packages_file=DEFAULT_PACKAGES_FILE):
+    engine = WorkshopEngine(region)
+    packages = workshop_packages(packages_file)
+    if not packages and not datasets_source:
+        logging.error(f"Nothing to cache: no {packages_file} and no datasets source.")
+        sys.exit(1)
+    if not engine.run_stage("Filling the shared cache", fill_workshop_cache, engine, workshop_name, packages,
+                            datasets_source):
+        sys.exit(1)
+    engine.log_metrics()
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (3, 4):
+        print("Usage: python shared_cache.py <workshop_name> <region> [s3://bucket/prefix | local_directory of datasets]")
+        sys.exit(1)
+
+    main(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)
@@ -0,0 +1,73 @@
+import csv
+import logging
+import sys
+import threading
+import failure_queue
+import state_store
+from workshop_engine import WorkshopEngine, add_spare_seats, retry_failed_operations
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def claim_seat(workshop_name):
+    """
+    Hand a spare seat to a late joiner and add it to the users CSV.
+
+    Returns (username, password), or None if the workshop has no spares left.
+    """
+    seat = state_store.get_store().claim_spare(workshop_name)
+    if seat is None:
+        logging.error(f"Workshop {workshop_name} has no spare seats left.")
+        return None
+    with open(f"{workshop_name}-users.csv", mode='a', newline='') as file:
+        csv.writer(file).writerow([seat['username'], seat['password']])
+    logging.info(f"Handed out spare seat {seat['username']}")
+    return seat['username'], seat['password']
+
+def refill(engine, workshop_name, target=None):
+    """
+    Provision spare seats until the workshop has `target` of them again
+    (by default the number it was created with). Returns the number added.
+    """
+    store = state_store.get_store()
+    workshop = store.get_workshop(workshop_name)
+    if not workshop:
+        logging.error(f"Workshop {workshop_name} is not in the state store.")
+        return 0
+    target = (workshop['spare_seats'] or 0) if target is None else target
+    missing = target - len(store.users(workshop_name, cognito_status='spare'))
+    if missing <= 0:
+        return 0
+
+    failure_queue.start(failure_queue.failures_file(workshop_name), engine.region)
+    # Replacement seats get the same course data as the seats made at create time
+    results = engine.run_stage(f"Provisioning {missing} spare seats", add_spare_seats, engine, workshop_name, missing,
+                               workshop['seed_source'])
+    retry_failed_operations(engine)
+    return len(results['spares']) if results else 0
+
+def refill_in_background(engine, workshop_name, target=None):
+    """Start refilling spare seats on a worker thread, so a claimed seat can be handed out straight away."""
+    thread = threading.Thread(target=refill, args=(engine, workshop_name, target), name="spare-seat-refill")
+    thread.start()
+    return thread
+
+def main(command, workshop_name, region, count=None):
+    engine = WorkshopEngine(region)
+    if command == 'claim':
+        seat = claim_seat(workshop_name)
+        if seat is None:
+            sys.exit(1)
+        # Flushed so the seat can be handed out while the refill runs, even when output is piped
+        print(f"Username: {seat[0]}\nPassword: {seat[1]}", flush=True)
+        refill_in_background(engine, workshop_name).join()
+    else:
+        print(f"Added {refill(engine, workshop_name, count)} spare seats")
+    engine.log_metrics()
+
+if __name__ == "__main__":
+    if len(sys.argv) not in (4, 5) or sys.argv[1] not in ('claim', 'refill'):
+        print("Usage: python spare_seats.py claim <workshop_name> <region> | refill <workshop_name> <region> [count]")
+        sys.exit(1)
+
+    main(sys.argv[1], sys.argv[2], sys.argv[3], int(sys.argv[4]) if len(sys.argv) > 4 else None)
@@ -0,0 +1,77 @@
+import json
+import logging
+import sys
+import aws_clients
+import state_store
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+def stack_name(workshop_name):
+    return f"{workshop_name}-WorkshopDeploymentStack"
+
+def outputs_file(workshop_name):
+    """The file `cdk deploy --outputs-file` writes the workshop stack's outputs to."""
+    return f"{workshop_name}-outputs.json"
+
+def read_outputs_file(path, name):
+    """Return {output key: value} for one stack from a cdk outputs file, or None if it is missing."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f).get(name)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logging.error(f"Failed to read stack outputs from {path}: {e}")
+        return None
+
+def fetch_stack_outputs(name, region=None):
+    """Return {output key: value} for a deployed stack with one DescribeStacks call, or None."""
+    try:
+        cloudformation = aws_clients.get_client('cloudformation', region)
+        stack = cloudformation.describe_stacks(StackName=name)['Stacks'][0]
+        return {output['OutputKey']: output['OutputValue'] for output in stack.get('Outputs', [])}
+    except Exception as e:
+        logging.error(f"Failed to describe stack {name}: {e}")
+        return None
+
+def get_stack_outputs(workshop_name, region=None):
+    """
+    Return the workshop stack's outputs, from the last deploy's outputs file or straight from CloudFormation.
+    """
+    name = stack_name(workshop_name)
+    return read_outputs_file(outputs_file(workshop_name), name) or fetch_stack_outputs(name, region)
+
+def workshop_outputs(outputs):
+    """
+    Pick the IDs the provisioning scripts need out of a stack's outputs.
+
+    Returns (user pool ID, SageMaker domain ID, hosted UI URL, import role ARN).
+    The import role is None for stacks deployed before bulk import support.
+    """
+    outputs = outputs or {}
+    return (outputs.get('CognitoUserPoolID'), outputs.get('SageMakerDomainID'), outputs.get('HostedUIUrl'),
+            outputs.get('CognitoImportRoleArn'))
+
+def record_outputs(workshop_name, region, outputs, name=None):
+    """Save a stack's outputs on the workshop's row in the state store."""
+    user_pool_id, sagemaker_domain_id, hosted_uri, import_role_arn = workshop_outputs(outputs)
+    state_store.get_store().save_workshop(workshop_name, region=region, stack_name=name or stack_name(workshop_name),
+                                          user_pool_id=user_pool_id, sagemaker_domain_id=sagemaker_domain_id,
+                                          hosted_uri=hosted_uri, import_role_arn=import_role_arn)
+
+def main(workshop_name, region):
+    outputs = fetch_stack_outputs(stack_name(workshop_name), region)
+    if not outputs:
+        sys.exit(1)
+    record_outputs(workshop_name, region, outputs)
+    for key, value in sorted(outputs.items()):
+        print(f"{key} = {value}")
+    return outputs
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python stack_outputs.py <workshop_name> <region>")
+        sys.exit(1)
+
+    main(sys.argv[1], sys.argv[2])
@@ -0,0 +1,292 @@
+import csv
+import logging
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_DB_PATH = "workshops.db"
+
+WORKSHOP_FIELDS = ('region', 'stack_name', 'user_pool_id', 'sagemaker_domain_id', 'hosted_uri',
+                   'shared_bucket_name', 'import_role_arn', 'spare_seats', 'lazy_provisioning', 'user_bucket_prefix',
+                   'cache_file_system_id', 'bucket_encryption', 'bucket_expiration_days',
+                   'seed_source', 'vpc_id', 'vpc_endpoints')
+USER_FIELDS = ('password', 'bucket', 'cognito_status', 'profile_status', 'space_status')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS workshops (
+    name TEXT PRIMARY KEY,
+    region TEXT,
+    stack_name TEXT,
+    user_pool_id TEXT,
+    sagemaker_domain_id TEXT,
+    hosted_uri TEXT,
+    shared_bucket_name TEXT,
+    import_role_arn TEXT,
+    spare_seats INTEGER,
+    lazy_provisioning INTEGER,
+    user_bucket_prefix TEXT,
+    cache_file_system_id TEXT,
+    bucket_encryption INTEGER,
+    bucket_expiration_days INTEGER,
+    seed_source TEXT,
+    vpc_id TEXT,
+    vpc_endpoints INTEGER,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS users (
+    workshop TEXT NOT NULL REFERENCES workshops(name) ON DELETE CASCADE,
+    username TEXT NOT NULL,
+    password TEXT,
+    bucket TEXT,
+    cognito_status TEXT,
+    profile_status TEXT,
+    space_status TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (workshop, username)
+);
+CREATE INDEX IF NOT EXISTS users_by_bucket ON users (bucket);
+CREATE INDEX IF NOT EXISTS workshops_by_region ON workshops (region);
+"""
+
+# Columns added after the first release, as (table, column, type), for databases created before them
+ADDED_COLUMNS = [
+    ('workshops', 'spare_seats', 'INTEGER'),
+    ('workshops', 'lazy_provisioning', 'INTEGER'),
+    ('workshops', 'user_bucket_prefix', 'TEXT'),
+    ('workshops', 'cache_file_system_id', 'TEXT'),
+    ('workshops', 'bucket_encryption', 'INTEGER'),
+    ('workshops', 'bucket_expiration_days', 'INTEGER'),
+    ('workshops', 'seed_source', 'TEXT'),
+    ('workshops', 'vpc_id', 'TEXT'),
+    ('workshops', 'vpc_endpoints', 'INTEGER'),
+]
+
+def now():
+    return datetime.now().isoformat(timespec='seconds')
+
+class WorkshopStore:
+    """
+    Local SQLite record of every workshop and its users.
+
+    Workshops hold the stack outputs; users hold their password, bucket and
+    the status of their Cognito account, SageMaker profile and space. A
+    cognito_status of 'spare' marks a ready seat not yet handed out, and
+    'reserved' a user number taken by an add that is still running. Each
+    write is its own transaction, and the connection is shared across worker
+    threads behind a lock. The users CSV is exported from here for handouts.
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        # The database holds attendee passwords; SQLite gives its journal files the same mode
+        if os.path.exists(path):
+            os.chmod(path, 0o600)
+        else:
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        with self.conn:
+            self.conn.executescript(SCHEMA)
+            for table, column, column_type in ADDED_COLUMNS:
+                columns = {row['name'] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+                if column not in columns:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def save_workshop(self, name, **fields):
+        """Insert a workshop, or update the given fields of an existing one."""
+        unknown = set(fields) - set(WORKSHOP_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown workshop fields: {', '.join(sorted(unknown))}")
+        timestamp = now()
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        updates = ''.join(f", {field} = excluded.{field}" for field in fields)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT INTO workshops (name, created_at, updated_at{', ' + columns if fields else ''}) "
+                f"VALUES (?, ?, ?{', ' + placeholders if fields else ''}) "
+                f"ON CONFLICT (name) DO UPDATE SET updated_at = excluded.updated_at{updates}",
+                (name, timestamp, timestamp, *fields.values()))
+
+    def get_workshop(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM workshops WHERE name = ?", (name,)).fetchone()
+        return dict(row) if row else None
+
+    def list_workshops(self, region=None):
+        query, params = "SELECT * FROM workshops", ()
+        if region:
+            query, params = "SELECT * FROM workshops WHERE region = ?", (region,)
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query + " ORDER BY name", params)]
+
+    def vpc_endpoint_dependents(self, name):
+        """
+        Return the other workshops in the VPC of a workshop whose stack owns
+        the VPC endpoints (vpc_endpoints), or [] if it owns none.
+        """
+        workshop = self.get_workshop(name)
+        if not workshop or not workshop['vpc_endpoints']:
+            return []
+        with self.lock:
+            return [row['name'] for row in self.conn.execute(
+                "SELECT name FROM workshops WHERE region = ? AND vpc_id = ? AND name != ? ORDER BY name",
+                (workshop['region'], workshop['vpc_id'], name))]
+
+    def delete_workshop(self, name):
+        """Forget a workshop and its users once it has been torn down."""
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM workshops WHERE name = ?", (name,))
+
+    def save_users(self, workshop, users):
+        """Insert or update users in one transaction. Each user is a dict with 'username' and any USER_FIELDS."""
+        timestamp = now()
+        with self.lock, self.conn:
+            for user in users:
+                fields = {key: value for key, value in user.items() if key != 'username'}
+                unknown = set(fields) - set(USER_FIELDS)
+                if unknown:
+                    raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+                columns = ''.join(f", {field}" for field in fields)
+                placeholders = ''.join(', ?' for _ in fields)
+                updates = ''.join(f", {field} = excluded.{field}" for field in fields)
+                self.conn.execute(
+                    f"INSERT INTO users (workshop, username, created_at, updated_at{columns}) "
+                    f"VALUES (?, ?, ?, ?{placeholders}) "
+                    f"ON CONFLICT (workshop, username) DO UPDATE SET updated_at = excluded.updated_at{updates}",
+                    (workshop, user['username'], timestamp, timestamp, *fields.values()))
+
+    def save_user(self, workshop, username, **fields):
+        self.save_users(workshop, [{'username': username, **fields}])
+
+    def users(self, workshop, cognito_status=None):
+        query, params = "SELECT * FROM users WHERE workshop = ?", (workshop,)
+        if cognito_status:
+            query, params = query + " AND cognito_status = ?", params + (cognito_status,)
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query + " ORDER BY username", params)]
+
+    def reserve_user_numbers(self, workshop, count):
+        """
+        Reserve `count` consecutive user numbers after the highest one in use and return them as a range.
+
+        Numbers are read from the usernames, so gaps and out-of-order rows are
+        fine. Each reserved user gets a 'reserved' placeholder row, written in
+        the same write transaction as the read, so concurrent adds never
+        collide. Release the ones an add did not use with release_reservations.
+        """
+        timestamp = now()
+        with self.lock, self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            highest = self.conn.execute(
+                "SELECT MAX(CAST(SUBSTR(username, INSTR(username, '-') + 1) AS INTEGER)) FROM users "
+                "WHERE workshop = ?", (workshop,)).fetchone()[0]
+            first = (highest or 0) + 1
+            self.conn.executemany(
+                "INSERT INTO users (workshop, username, cognito_status, created_at, updated_at) "
+                "VALUES (?, ?, 'reserved', ?, ?)",
+                [(workshop, f"workshop-{number:03}", timestamp, timestamp) for number in range(first, first + count)])
+        return range(first, first + count)
+
+    def release_reservations(self, workshop, numbers, keep=()):
+        """
+        Delete the placeholder rows left in a range from reserve_user_numbers,
+        except for usernames in `keep`. Rows reserved by other adds, which may
+        still be running, are never touched. Returns the number deleted.
+        """
+        usernames = [f"workshop-{number:03}" for number in numbers]
+        unused = [(workshop, username) for username in usernames if username not in keep]
+        with self.lock, self.conn:
+            deleted = self.conn.executemany(
+                "DELETE FROM users WHERE workshop = ? AND username = ? AND cognito_status = 'reserved'", unused).rowcount
+        return deleted
+
+    def claim_spare(self, workshop):
+        """
+        Hand out one spare seat: mark it created and return its row, or None if none are left.
+
+        The update only matches a seat that is still spare, so concurrent claims,
+        even from other processes, never get the same seat.
+        """
+        while True:
+            with self.lock, self.conn:
+                row = self.conn.execute("SELECT * FROM users WHERE workshop = ? AND cognito_status = 'spare' "
+                                        "ORDER BY username LIMIT 1", (workshop,)).fetchone()
+                if row is None:
+                    return None
+                claimed = self.conn.execute(
+                    "UPDATE users SET cognito_status = 'created', updated_at = ? "
+                    "WHERE workshop = ? AND username = ? AND cognito_status = 'spare'",
+                    (now(), workshop, row['username'])).rowcount
+            if claimed:
+                return {**dict(row), 'cognito_status': 'created'}
+
+    def bucket_names(self, workshop):
+        """Return the workshop's buckets, including its shared bucket, without scanning the account."""
+        workshop_row = self.get_workshop(workshop) or {}
+        with self.lock:
+            buckets = {row['bucket'] for row in self.conn.execute(
+                "SELECT DISTINCT bucket FROM users WHERE workshop = ? AND bucket IS NOT NULL", (workshop,))}
+        if workshop_row.get('shared_bucket_name'):
+            buckets.add(workshop_row['shared_bucket_name'])
+        return sorted(buckets)
+
+    def export_csv(self, workshop, path=None):
+        """Write the attendee handout CSV (stack details, then one row per created user)."""
+        info = self.get_workshop(workshop)
+        path = path or f"{workshop}-users.csv"
+        with open(path, mode='w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(["Hosted URI", info['hosted_uri']])
+            writer.writerow(["User Pool ID", info['user_pool_id']])
+            writer.writerow(["Sagemaker Domain ID", info['sagemaker_domain_id']])
+            writer.writerow(["Username", "Password"])
+            writer.writerows((user['username'], user['password'])
+                             for user in self.users(workshop, cognito_status='created'))
+        return path
+
+    def import_csv(self, csv_file, region=None):
+        """Record a workshop that only exists as a users CSV. Returns the workshop name."""
+        workshop = workshop_name_from_csv(csv_file)
+        with open(csv_file, 'r') as file:
+            rows = [row for row in csv.reader(file) if row]
+        info = {row[0]: row[1] for row in rows[:3] if len(row) > 1}
+        self.save_workshop(workshop, region=region, stack_name=f"{workshop}-WorkshopDeploymentStack",
+                           user_pool_id=info.get("User Pool ID"), sagemaker_domain_id=info.get("Sagemaker Domain ID"),
+                           hosted_uri=info.get("Hosted URI"))
+        self.save_users(workshop, [{'username': row[0], 'password': row[1], 'cognito_status': 'created'}
+                                   for row in rows[4:] if len(row) > 1])
+        return workshop
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+def get_store(path=DEFAULT_DB_PATH):
+    """Return the process-wide store for a database file, opening it on first use."""
+    with _stores_lock:
+        if path not in _stores:
+            _stores[path] = WorkshopStore(path)
+        return _stores[path]
+
+def workshop_name_from_csv(csv_file):
+    return os.path.basename(csv_file).split('-users.csv')[0]
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('export', 'import'):
+        print("Usage: python state_store.py export <workshop_name> | import <csv_file> [region]")
+        sys.exit(1)
+
+    store = get_store()
+    if sys.argv[1] == 'export':
+        print(f"Wrote {store.export_csv(sys.argv[2])}")
+    else:
+        print(f"Recorded workshop {store.import_csv(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None)}")
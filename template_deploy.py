@@ -0,0 +1,204 @@
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+from datetime import datetime
+import aws_clients
+import stack_outputs
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Everything that goes into the synthesized templates; a change to any of these is a new code version
+SOURCE_PATHS = ['app.py', 'cdk.json', 'workshop_deployment', 'lambda', 'lambda_layer', 'cache_lambda',
+                'workshop-packages.txt']
+TEMPLATE_STACKS = {'bucket': 'WorkshopTemplate', 'shared': 'WorkshopTemplateShared'}
+PUBLISHED_FILE = "published-templates.json"
+CDK_OUT_DIR = "cdk.out.templates"
+# Stack parameters and their template defaults, passed through from the deploy parameters when set
+OPTIONAL_PARAMETERS = {
+    'LazyProvisioning': 'false',
+    'UserBucketPrefix': '',
+    'BucketEncryption': 'false',
+    'BucketExpirationDays': '0',
+    'VpcEndpoints': 'false',
+    'VpcCidr': '',
+    'RouteTableIDs': '',
+    'SharedCache': 'false',
+}
+# The parameters a workshop-neutral stack, such as a warm pool stack, is created with
+BASE_PARAMETERS = ('AWSRegion', 'VPCID', 'SubnetIDs')
+
+def code_version(paths=SOURCE_PATHS):
+    """Hash the stack and Lambda sources into a short version string."""
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, dirs, names in os.walk(path)
+                           if '__pycache__' not in root for name in names)
+        elif os.path.exists(path):
+            files = [path]
+        else:
+            continue
+        for file_path in files:
+            digest.update(file_path.encode())
+            with open(file_path, 'rb') as f:
+                digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+def load_published(path=PUBLISHED_FILE):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_published(published, path=PUBLISHED_FILE):
+    with open(path, 'w') as f:
+        json.dump(published, f, indent=2)
+
+def template_url(assets_manifest, stack, account, region):
+    """Return the S3 URL cdk-assets publishes a stack's template to, from its assets manifest."""
+    with open(assets_manifest, 'r') as f:
+        manifest = json.load(f)
+    for asset in manifest.get('files', {}).values():
+        if asset['source']['path'] == f"{stack}.template.json":
+            destination = next(iter(asset['destinations'].values()))
+            bucket = destination['bucketName'].replace('${AWS::AccountId}', account).replace('${AWS::Region}', region)
+            key = destination['objectKey']
+            return f"https://{bucket}.s3.{region}.amazonaws.com/{key}"
+    raise ValueError(f"No template asset for {stack} in {assets_manifest}")
+
+def run(command, env=None):
+    """Run a shell command, streaming its output. Returns True on success."""
+    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                               bufsize=1, env=env)
+    for line in iter(process.stdout.readline, ''):
+        print(line, end='')
+        sys.stdout.flush()
+    process.stdout.close()
+    return process.wait() == 0
+
+def publish_templates(region, version=None):
+    """
+    Synthesize the workshop templates and publish them and their assets to the
+    CDK bootstrap bucket, once per code version and region.
+
+    Returns {storage mode: template URL}, or None if synth or publishing failed.
+    """
+    version = version or code_version()
+    published = load_published()
+    key = f"{version}/{region}"
+    if key in published:
+        return published[key]
+
+    print(f"Publishing workshop templates for code version {version} in {region}... Please wait")
+    out_dir = os.path.join(CDK_OUT_DIR, version)
+    if not run(f"cdk synth --context template_mode=true --output {out_dir} --quiet"):
+        logging.error("Failed to synthesize the workshop templates")
+        return None
+
+    env = dict(os.environ, AWS_REGION=region, AWS_DEFAULT_REGION=region)
+    account = aws_clients.get_client('sts', region).get_caller_identity()['Account']
+    urls = {}
+    for mode, stack in TEMPLATE_STACKS.items():
+        manifest = os.path.join(out_dir, f"{stack}.assets.json")
+        if not run(f"npx --yes cdk-assets --path {manifest} publish", env=env):
+            logging.error(f"Failed to publish the assets for {stack}")
+            return None
+        urls[mode] = template_url(manifest, stack, account, region)
+
+    published[key] = urls
+    save_published(published)
+    return urls
+
+def stack_parameters(params, workshop_name, shared_bucket_name=None):
+    parameters = {
+        'WorkshopName': workshop_name,
+        'AWSRegion': params['AWSRegion'],
+        'VPCID': params['VPCID'],
+        'SubnetIDs': ','.join(params['SubnetIDs']),
+    }
+    if shared_bucket_name:
+        parameters['SharedBucket'] = shared_bucket_name
+    for key in OPTIONAL_PARAMETERS:
+        if params.get(key):
+            parameters[key] = params[key]
+    return [{'ParameterKey': key, 'ParameterValue': value} for key, value in parameters.items()]
+
+def stack_tags(workshop_name):
+    return [{'Key': 'project', 'Value': 'cmt-workshop'},
+            {'Key': 'workshop', 'Value': workshop_name},
+            {'Key': 'creation-date', 'Value': datetime.now().strftime("%Y-%m-%d")}]
+
+def create_workshop_stack(params, workshop_name, shared_bucket_name=None, wait=True, name=None, tags=None):
+    """
+    Create the workshop stack from the published template with one CreateStack call.
+
+    Returns the stack's outputs once it is complete (or the stack ID when
+    wait is False), or None if the create failed.
+    """
+    region = params['AWSRegion']
+    urls = publish_templates(region)
+    if not urls:
+        return None
+
+    name = name or stack_outputs.stack_name(workshop_name)
+    try:
+        cloudformation = aws_clients.get_client('cloudformation', region)
+        response = cloudformation.create_stack(
+            StackName=name,
+            TemplateURL=urls['shared' if shared_bucket_name else 'bucket'],
+            Parameters=stack_parameters(params, workshop_name, shared_bucket_name),
+            Capabilities=['CAPABILITY_IAM'],
+            Tags=tags or stack_tags(workshop_name)
+        )
+        logging.info(f"Creating stack {name} from the published template")
+        if not wait:
+            return response['StackId']
+        return wait_for_stack(name, region)
+    except Exception as e:
+        logging.error(f"Failed to create stack {name}: {e}")
+        return None
+
+def wait_for_stack(name, region=None):
+    """Wait for a stack to finish creating and return its outputs, or None if it failed."""
+    try:
+        cloudformation = aws_clients.get_client('cloudformation', region)
+        cloudformation.get_waiter('stack_create_complete').wait(StackName=name,
+                                                               WaiterConfig={'Delay': 15, 'MaxAttempts': 120})
+        print(f"\nStack {name} created successfully.")
+        return stack_outputs.fetch_stack_outputs(name, region)
+    except Exception as e:
+        logging.error(f"Stack {name} did not finish creating: {e}")
+        return None
+
+def delete_stack(name, region=None, wait=True):
+    """Delete a stack with CloudFormation directly. Returns True once it is gone."""
+    try:
+        cloudformation = aws_clients.get_client('cloudformation', region)
+        cloudformation.delete_stack(StackName=name)
+        if wait:
+            cloudformation.get_waiter('stack_delete_complete').wait(StackName=name,
+                                                                   WaiterConfig={'Delay': 15, 'MaxAttempts': 120})
+        print(f"\nStack {name} deleted successfully.")
+        return True
+    except Exception as e:
+        logging.error(f"Failed to delete stack {name}: {e}")
+        return False
+
+def main(region):
+    urls = publish_templates(region)
+    if not urls:
+        sys.exit(1)
+    for mode, url in urls.items():
+        print(f"{mode} = {url}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python template_deploy.py <region>")
+        sys.exit(1)
+
+    main(sys.argv[1])
@@ -0,0 +1,35 @@
+from botocore.stub import Stubber
+
+from aws_clients import ClientFactory, get_factory
+
+
+def test_clients_are_cached_per_service_and_region():
+    factory = ClientFactory("us-west-2", max_concurrency=32)
+
+    assert factory.client("s3") is factory.client("s3")
+    assert factory.client("s3", "us-east-1") is not factory.client("s3")
+    assert factory.client("s3").meta.config.max_pool_connections == 32
+    assert factory.client("s3").meta.config.retries == {"mode": "standard", "total_max_attempts": 1}
+
+
+def test_factory_is_shared_per_region():
+    assert get_factory("us-west-2") is get_factory("us-west-2")
+
+
+def test_calls_and_errors_are_counted():
+    factory = ClientFactory("us-west-2")
+    s3 = factory.client("s3")
+
+    with Stubber(s3) as stubber:
+        stubber.add_response("list_buckets", {"Buckets": [], "ResponseMetadata": {"RetryAttempts": 2}})
+        stubber.add_client_error("list_buckets", "AccessDenied")
+        s3.list_buckets()
+        try:
+            s3.list_buckets()
+        except s3.exceptions.ClientError:
+            pass
+
+    counter = factory.metrics.snapshot()[("s3", "ListBuckets")]
+    assert counter["calls"] == 2
+    assert counter["retries"] == 2
+    assert counter["errors"] == 1
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+import batch_deploy
+from state_store import WorkshopStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    monkeypatch.setattr(batch_deploy.state_store, "get_store", lambda: store)
+    return store
+
+
+def test_workshops_inherit_the_manifest_defaults(tmp_path, store):
+    path = tmp_path / "conference.json"
+    path.write_text(json.dumps({
+        "region": "us-west-2",
+        "defaults": {"vpc_id": "vpc-1", "subnet_ids": ["subnet-a"], "users": 30},
+        "workshops": [{"name": "track-a"}, {"name": "track-b", "users": 50, "region": "us-east-1"}],
+    }))
+
+    specs = batch_deploy.workshop_specs(batch_deploy.load_manifest(str(path)))
+
+    assert [(spec["name"], spec["region"], spec["users"]) for spec in specs] == [
+        ("track-a", "us-west-2", 30), ("track-b", "us-east-1", 50)]
+
+
+def test_duplicate_and_existing_workshops_are_caught(store):
+    defaults = {"region": "us-west-2", "vpc_id": "vpc-1", "subnet_ids": ["subnet-a"], "users": 10}
+
+    with pytest.raises(ValueError, match="Duplicate"):
+        batch_deploy.workshop_specs({"defaults": defaults, "workshops": [{"name": "track-a"}, {"name": "track-a"}]})
+
+    store.save_workshop("track-a")
+    specs = batch_deploy.workshop_specs({"defaults": defaults, "workshops": [{"name": "track-a"}, {"name": "track-b"}]})
+    assert batch_deploy.existing_workshops(specs) == ["track-a"]
+
+
+def test_concurrency_budget_is_split_between_parallel_workshops():
+    assert batch_deploy.worker_budget(64, 4) == 16
+    assert batch_deploy.worker_budget(3, 12) == 1
+
+
+def test_multi_region_workshops_get_one_workshop_and_user_block_per_region(store, tmp_path, monkeypatch):
+    manifest = {"defaults": {"users": 10}, "workshops": [{
+        "name": "summit",
+        "regions": {
+            "us-west-2": {"users": 120, "vpc_id": "vpc-1", "subnet_ids": ["subnet-a"]},
+            "us-east-1": {"users": 80, "vpc_id": "vpc-2", "subnet_ids": ["subnet-b"]},
+        },
+    }]}
+
+    specs = batch_deploy.workshop_specs(manifest)
+
+    assert [(spec["name"], spec["region"], spec["users"], spec["first_user_number"]) for spec in specs] == [
+        ("summit-us-west-2", "us-west-2", 120, 1), ("summit-us-east-1", "us-east-1", 80, 1001)]
+
+    monkeypatch.chdir(tmp_path)
+    store.save_workshop("summit-us-west-2", hosted_uri="https://west")
+    store.save_users("summit-us-west-2", [{"username": "workshop-001", "password": "a", "cognito_status": "created"}])
+    store.save_workshop("summit-us-east-1", hosted_uri="https://east")
+    store.save_users("summit-us-east-1", [{"username": "workshop-1001", "password": "b", "cognito_status": "created"},
+                                          {"username": "workshop-1002", "password": "c", "cognito_status": "spare"}])
+
+    assert batch_deploy.write_roster("summit", specs) == 2
+    assert (tmp_path / "summit-roster.csv").read_text().splitlines() == [
+        "Username,Password,Region,Sign-in URL",
+        "workshop-001,a,us-west-2,https://west",
+        "workshop-1001,b,us-east-1,https://east",
+    ]
+
+
+def test_vpc_endpoints_are_created_by_one_workshop_per_vpc(store):
+    defaults = {"region": "us-west-2", "vpc_id": "vpc-1", "subnet_ids": ["subnet-a"], "users": 10,
+                "vpc_endpoints": True}
+    workshops = [{"name": "track-a"}, {"name": "track-b"}, {"name": "track-c", "vpc_id": "vpc-2"}]
+
+    specs = batch_deploy.workshop_specs({"defaults": defaults, "workshops": workshops})
+
+    assert [spec["vpc_endpoints"] for spec in specs] == [True, False, True]
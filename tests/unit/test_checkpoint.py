@@ -0,0 +1,33 @@
+import os
+import stat
+
+from checkpoint import Checkpoint
+
+
+def test_progress_survives_a_restart(tmp_path):
+    path = str(tmp_path / "demo-checkpoint.jsonl")
+    users = [{"username": "workshop-001", "password": "pw", "bucket": "demo-001"}]
+
+    progress = Checkpoint(path)
+    progress.start({"workshop_name": "demo", "num_users": 1}, users)
+    progress.mark("Cognito user", "workshop-001")
+    progress.file.close()
+
+    resumed = Checkpoint(path)
+    assert resumed.resumed
+    assert resumed.settings == {"workshop_name": "demo", "num_users": 1}
+    assert resumed.users == users
+    assert resumed.is_done("Cognito user", "workshop-001")
+    assert not resumed.is_done("SageMaker profile", "workshop-001")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_torn_last_line_is_dropped(tmp_path):
+    path = tmp_path / "demo-checkpoint.jsonl"
+    path.write_text('{"type": "done", "stage": "S3 bucket", "username": "workshop-001"}\n{"type": "do')
+
+    progress = Checkpoint(str(path))
+    progress.mark("S3 bucket", "workshop-002")
+    progress.file.close()
+
+    assert Checkpoint(str(path)).done == {("S3 bucket", "workshop-001"), ("S3 bucket", "workshop-002")}
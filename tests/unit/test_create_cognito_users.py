@@ -0,0 +1,60 @@
+import csv
+import io
+import random
+import threading
+import time
+
+from create_cognito_users import build_import_csv, create_cognito_users
+
+
+class FakeCognitoClient:
+    class exceptions:
+        class UsernameExistsException(Exception):
+            pass
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.lock = threading.Lock()
+        self.passwords = {}
+
+    def admin_create_user(self, UserPoolId, Username, TemporaryPassword, MessageAction):
+        time.sleep(random.uniform(0, 0.01))
+        if Username in self.failing:
+            raise self.exceptions.UsernameExistsException(Username)
+        return {"User": {"Username": Username}}
+
+    def get_csv_header(self, UserPoolId):
+        return {"CSVHeader": ["name", "email", "cognito:mfa_enabled", "cognito:username", "email_verified"]}
+
+    def admin_set_user_password(self, UserPoolId, Username, Password, Permanent):
+        with self.lock:
+            self.passwords[Username] = Password
+
+
+def test_users_are_yielded_in_input_order():
+    users = [(f"workshop-{i:03}", f"pw{i}") for i in range(1, 41)]
+    client = FakeCognitoClient()
+
+    created = list(create_cognito_users(client, users, "pool", max_workers=8, users_per_second=0))
+
+    assert created == users
+    assert client.passwords == dict(users)
+
+
+def test_failed_users_are_skipped():
+    users = [(f"workshop-{i:03}", f"pw{i}") for i in range(1, 6)]
+    client = FakeCognitoClient(failing={"workshop-002", "workshop-004"})
+
+    created = list(create_cognito_users(client, users, "pool", max_workers=4, users_per_second=0))
+
+    assert [username for username, _ in created] == ["workshop-001", "workshop-003", "workshop-005"]
+
+
+def test_build_import_csv_fills_pool_header():
+    rows = list(csv.reader(io.StringIO(build_import_csv(FakeCognitoClient(), ["workshop-001", "workshop-002"], "pool"))))
+
+    assert rows[0] == ["name", "email", "cognito:mfa_enabled", "cognito:username", "email_verified"]
+    assert rows[1:] == [
+        ["", "", "false", "workshop-001", "false"],
+        ["", "", "false", "workshop-002", "false"],
+    ]
@@ -0,0 +1,45 @@
+import create_s3_buckets
+
+
+class FakeS3:
+    class exceptions:
+        class BucketAlreadyOwnedByYou(Exception):
+            pass
+
+    def __init__(self, existing=()):
+        self.buckets = set(existing)
+        self.calls = {}
+
+    def create_bucket(self, Bucket, CreateBucketConfiguration):
+        if Bucket in self.buckets:
+            raise self.exceptions.BucketAlreadyOwnedByYou()
+        self.buckets.add(Bucket)
+
+    def put_bucket_tagging(self, Bucket, Tagging):
+        self.calls.setdefault(Bucket, {})["tagging"] = Tagging
+
+    def put_bucket_encryption(self, Bucket, ServerSideEncryptionConfiguration):
+        self.calls.setdefault(Bucket, {})["encryption"] = ServerSideEncryptionConfiguration
+
+    def put_bucket_lifecycle_configuration(self, Bucket, LifecycleConfiguration):
+        self.calls.setdefault(Bucket, {})["lifecycle"] = LifecycleConfiguration
+
+
+def test_encryption_and_expiration_are_applied_to_existing_buckets_too():
+    s3 = FakeS3(existing={"demo-002"})
+
+    created = create_s3_buckets.create_buckets(["demo-001", "demo-002"], "demo", "us-west-2", 2,
+                                               encryption=True, expiration_days=14, s3=s3)
+
+    assert created == ["demo-001", "demo-002"]
+    for bucket in created:
+        rule = s3.calls[bucket]["encryption"]["Rules"][0]
+        assert rule["ApplyServerSideEncryptionByDefault"]["SSEAlgorithm"] == "AES256"
+        assert s3.calls[bucket]["lifecycle"]["Rules"][0]["Expiration"] == {"Days": 14}
+
+
+def test_buckets_are_left_unencrypted_and_unexpiring_by_default():
+    s3 = FakeS3()
+
+    assert create_s3_buckets.create_bucket("demo-001", "demo", "us-west-2", s3)
+    assert set(s3.calls["demo-001"]) == {"tagging"}
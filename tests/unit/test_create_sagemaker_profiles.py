@@ -0,0 +1,58 @@
+from botocore.exceptions import ClientError
+
+import create_sagemaker_profiles
+import throttling
+from create_sagemaker_profiles import create_user_profiles, wait_for_profiles_in_service
+
+
+class FakePaginator:
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, DomainIdEquals):
+        self.client.polls += 1
+        profiles = [{"UserProfileName": name, "Status": status}
+                    for name, status in self.client.statuses.items()]
+        return [{"UserProfiles": profiles[:2]}, {"UserProfiles": profiles[2:]}]
+
+
+class FakeSageMakerClient:
+    def __init__(self, throttles=0):
+        self.throttles = throttles
+        self.statuses = {}
+        self.polls = 0
+
+    def create_user_profile(self, DomainId, UserProfileName):
+        if self.throttles:
+            self.throttles -= 1
+            raise ClientError({"Error": {"Code": "ThrottlingException"}}, "CreateUserProfile")
+        self.statuses[UserProfileName] = "Pending"
+        return {"UserProfileArn": UserProfileName}
+
+    def get_paginator(self, name):
+        # Profiles move to InService one poll after they are listed as Pending
+        for username, status in self.statuses.items():
+            if status == "Pending" and self.polls:
+                self.statuses[username] = "InService"
+        return FakePaginator(self)
+
+
+def test_throttled_creates_are_retried(monkeypatch):
+    monkeypatch.setattr(throttling.time, "sleep", lambda seconds: None)
+    client = FakeSageMakerClient(throttles=3)
+
+    created = create_user_profiles(client, "us-west-2", "d-1", ["workshop-001", "workshop-002"], max_workers=1)
+
+    assert created == ["workshop-001", "workshop-002"]
+
+
+def test_wait_polls_domain_listing_until_in_service(monkeypatch):
+    monkeypatch.setattr(create_sagemaker_profiles.time, "sleep", lambda seconds: None)
+    client = FakeSageMakerClient()
+    usernames = [f"workshop-{i:03}" for i in range(1, 6)]
+    create_user_profiles(client, "us-west-2", "d-1", usernames)
+
+    statuses = wait_for_profiles_in_service(client, "d-1", usernames)
+
+    assert statuses == {username: "InService" for username in usernames}
+    assert client.polls == 2
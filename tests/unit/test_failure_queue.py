@@ -0,0 +1,60 @@
+import json
+
+import failure_queue
+import retry_failures
+from failure_queue import FailureQueue
+
+
+def test_failures_are_persisted_with_their_error_class(tmp_path):
+    path = str(tmp_path / "demo-failures.json")
+    queue = FailureQueue(path, "us-west-2")
+
+    queue.add("create_user_profile", {"domain_id": "d-1", "username": "workshop-001"}, TimeoutError("slow"))
+    queue.add("create_user_profile", {"domain_id": "d-1", "username": "workshop-001"}, ValueError("bad"))
+
+    with open(path) as f:
+        data = json.load(f)
+    assert data["region"] == "us-west-2"
+    assert [failure["error_class"] for failure in data["failures"]] == ["ValueError"]
+    assert len(FailureQueue(path)) == 1
+
+
+def test_held_users_are_released_once_their_failures_are_gone(tmp_path):
+    queue = FailureQueue(str(tmp_path / "demo-failures.json"), "us-west-2")
+    queue.add("create_bucket", {"bucket_name": "demo-001"}, TimeoutError())
+    queue.hold_user("workshop-001", "pw", ["demo-001"])
+
+    assert queue.release_ready_users() == []
+    queue.take()
+    assert queue.release_ready_users() == [("workshop-001", "pw")]
+
+
+def test_spare_seats_are_released_separately(tmp_path):
+    queue = FailureQueue(str(tmp_path / "demo-failures.json"), "us-west-2")
+    queue.hold_user("workshop-001", "pw1", [])
+    queue.hold_user("workshop-002", "pw2", [], spare=True)
+
+    assert queue.release_ready_users() == [("workshop-001", "pw1")]
+    assert queue.release_ready_users(spares=True) == [("workshop-002", "pw2")]
+
+
+def test_drain_retries_only_failed_items(tmp_path, monkeypatch):
+    monkeypatch.setattr(retry_failures.time, "sleep", lambda seconds: None)
+    attempts = []
+
+    def flaky_delete(region, bucket_name):
+        attempts.append(bucket_name)
+        if bucket_name == "demo-002" and attempts.count(bucket_name) < 2:
+            failure_queue.record("delete_bucket", {"bucket_name": bucket_name}, RuntimeError("busy"))
+
+    monkeypatch.setitem(retry_failures.OPERATIONS, "delete_bucket", flaky_delete)
+    path = tmp_path / "demo-failures.json"
+    queue = FailureQueue(str(path), "us-west-2")
+    queue.add("delete_bucket", {"bucket_name": "demo-001"}, RuntimeError("busy"))
+    queue.add("delete_bucket", {"bucket_name": "demo-002"}, RuntimeError("busy"))
+
+    assert retry_failures.drain(queue) == 0
+    failure_queue.stop()
+
+    assert sorted(attempts) == ["demo-001", "demo-002", "demo-002"]
+    assert not path.exists()
@@ -0,0 +1,42 @@
+import prewarm_spaces
+
+
+class FakeSageMaker:
+    """Spaces become InService on the first listing after they are created; apps on the listing after they start."""
+
+    def __init__(self):
+        self.spaces = {}
+        self.apps = {}
+
+    def create_space(self, DomainId, SpaceName, **kwargs):
+        self.spaces[SpaceName] = "Pending"
+
+    def create_app(self, DomainId, SpaceName, AppType, AppName, **kwargs):
+        assert self.spaces[SpaceName] == "InService"
+        self.apps[SpaceName] = "Pending"
+
+    def get_paginator(self, name):
+        fake = self
+
+        class Paginator:
+            def paginate(self, DomainIdEquals):
+                if name == "list_spaces":
+                    page = {"Spaces": [{"SpaceName": space, "Status": status} for space, status in fake.spaces.items()]}
+                    fake.spaces = {space: "InService" for space in fake.spaces}
+                else:
+                    page = {"Apps": [{"SpaceName": space, "AppType": "JupyterLab", "Status": status}
+                                     for space, status in fake.apps.items()]}
+                    fake.apps = {space: "InService" for space in fake.apps}
+                return [page]
+        return Paginator()
+
+
+def test_apps_start_once_spaces_are_ready(monkeypatch):
+    monkeypatch.setattr(prewarm_spaces, "READY_POLL_SECONDS", 0)
+    sm_client = FakeSageMaker()
+
+    results = prewarm_spaces.prewarm(sm_client, "d-1", ["workshop-001", "workshop-002"], max_workers=2)
+
+    assert results == {"workshop-001": "InService", "workshop-002": "InService"}
+    assert set(sm_client.apps) == {"workshop-001-space", "workshop-002-space"}
+    assert prewarm_spaces.report(results) == 2
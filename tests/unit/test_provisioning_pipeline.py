@@ -0,0 +1,54 @@
+import threading
+import time
+
+from provisioning_pipeline import run_pipeline
+
+
+def test_items_flow_through_every_stage():
+    stages = [
+        ("double", lambda x: x * 2, 3),
+        ("increment", lambda x: x + 1, 2),
+    ]
+
+    completed, failures = run_pipeline(range(50), stages, queue_size=4)
+
+    assert sorted(completed) == [x * 2 + 1 for x in range(50)]
+    assert failures == {"double": [], "increment": []}
+
+
+def test_failed_items_are_dropped_and_recorded():
+    def reject_odd(x):
+        if x % 2:
+            raise ValueError(x)
+        return x
+
+    stages = [
+        ("reject odd", reject_odd, 2),
+        ("skip four", lambda x: None if x == 4 else x, 2),
+    ]
+
+    completed, failures = run_pipeline(range(6), stages)
+
+    assert sorted(completed) == [0, 2]
+    assert sorted(failures["reject odd"]) == [1, 3, 5]
+    assert failures["skip four"] == [4]
+
+
+def test_first_items_complete_before_last_items_start():
+    started_last = threading.Event()
+    completed_before_last = []
+
+    def first_stage(x):
+        if x == 19:
+            started_last.set()
+        time.sleep(0.01)
+        return x
+
+    def on_complete(x):
+        if not started_last.is_set():
+            completed_before_last.append(x)
+
+    run_pipeline(range(20), [("first", first_stage, 1), ("second", lambda x: x, 1)],
+                 queue_size=2, on_complete=on_complete)
+
+    assert completed_before_last
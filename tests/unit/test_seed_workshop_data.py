@@ -0,0 +1,66 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from botocore.exceptions import ClientError
+
+import seed_workshop_data
+from seed_workshop_data import copy_object, parse_s3_uri
+
+
+class FakeS3Client:
+    def __init__(self, existing=None):
+        self.objects = dict(existing or {})
+        self.calls = []
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return self.objects[(Bucket, Key)]
+
+    def copy_object(self, Bucket, Key, CopySource, MetadataDirective, Metadata):
+        self.calls.append("copy_object")
+        self.objects[(Bucket, Key)] = {"ETag": '"copied"', "Metadata": Metadata}
+
+    def create_multipart_upload(self, Bucket, Key, Metadata):
+        self.calls.append("create_multipart_upload")
+        return {"UploadId": "upload"}
+
+    def upload_part_copy(self, Bucket, Key, UploadId, PartNumber, CopySource, CopySourceRange):
+        self.calls.append(CopySourceRange)
+        return {"CopyPartResult": {"ETag": f"part{PartNumber}"}}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        self.calls.append([part["PartNumber"] for part in MultipartUpload["Parts"]])
+
+
+def test_parse_s3_uri():
+    assert parse_s3_uri("s3://course-data/week1/") == ("course-data", "week1/")
+    assert parse_s3_uri("s3://course-data") == ("course-data", "")
+
+
+def test_matching_etag_is_skipped():
+    s3 = FakeS3Client({("dest", "data.csv"): {"ETag": '"abc"', "Metadata": {}}})
+
+    assert copy_object(s3, "src", "data.csv", 10, "abc", "dest", "data.csv", None) == "skipped"
+    assert s3.calls == []
+
+
+def test_previously_copied_object_is_skipped_by_source_etag():
+    s3 = FakeS3Client()
+
+    assert copy_object(s3, "src", "data.csv", 10, "abc", "dest", "data.csv", None) == "copied"
+    assert copy_object(s3, "src", "data.csv", 10, "abc", "dest", "data.csv", None) == "skipped"
+    assert s3.calls == ["copy_object"]
+
+
+def test_large_object_uses_ranged_part_copies(monkeypatch):
+    monkeypatch.setattr(seed_workshop_data, "MULTIPART_THRESHOLD", 10)
+    monkeypatch.setattr(seed_workshop_data, "PART_SIZE", 10)
+    s3 = FakeS3Client()
+
+    with ThreadPoolExecutor(max_workers=2) as part_executor:
+        result = copy_object(s3, "src", "big.bin", 25, "abc-3", "dest", "big.bin", part_executor)
+
+    assert result == "copied"
+    assert s3.calls[0] == "create_multipart_upload"
+    assert sorted(s3.calls[1:4]) == ["bytes=0-9", "bytes=10-19", "bytes=20-24"]
+    assert s3.calls[4] == [1, 2, 3]
@@ -0,0 +1,58 @@
+import io
+import json
+
+from botocore.exceptions import ClientError
+
+import shared_cache
+
+
+class FakeLambda:
+    """Each invocation copies at most two of the staged files."""
+
+    def __init__(self, staged):
+        self.staged = staged
+        self.invocations = 0
+
+    def invoke(self, FunctionName, Payload):
+        self.invocations += 1
+        copied = min(2, self.staged)
+        self.staged -= copied
+        result = {"copied": copied, "skipped": 0, "failed": 0, "remaining": self.staged}
+        return {"Payload": io.BytesIO(json.dumps(result).encode())}
+
+
+def test_fill_invokes_until_nothing_remains():
+    lambda_client = FakeLambda(5)
+
+    assert shared_cache.fill(lambda_client, "cache-fill") == {"copied": 5, "failed": 0}
+    assert lambda_client.invocations == 3
+
+
+class FakeEfs:
+    def describe_mount_targets(self, FileSystemId):
+        return {"MountTargets": [{"MountTargetId": "fsmt-1"}, {"MountTargetId": "fsmt-2"}]}
+
+    def describe_mount_target_security_groups(self, MountTargetId):
+        return {"SecurityGroups": ["sg-nfs"]}
+
+
+class FakeEc2:
+    def __init__(self):
+        self.rules = {("sg-nfs", "sg-fill")}
+        self.calls = []
+
+    def authorize_security_group_ingress(self, GroupId, IpPermissions):
+        self.calls.append(GroupId)
+        rule = (GroupId, IpPermissions[0]["UserIdGroupPairs"][0]["GroupId"])
+        if rule in self.rules:
+            raise ClientError({"Error": {"Code": "InvalidPermission.Duplicate"}}, "AuthorizeSecurityGroupIngress")
+        self.rules.add(rule)
+
+
+def test_nfs_access_is_granted_once_per_security_group():
+    ec2 = FakeEc2()
+
+    shared_cache.allow_nfs(FakeEfs(), ec2, "fs-1", "sg-fill")
+
+    assert ec2.calls == ["sg-nfs"]
+    assert ec2.rules == {("sg-nfs", "sg-fill")}
@@ -0,0 +1,21 @@
+import spare_seats
+from state_store import WorkshopStore
+from workshop_engine import WorkshopEngine
+
+
+def test_refilled_seats_get_the_course_data(tmp_path, monkeypatch):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo", spare_seats=2, seed_source="s3://course/demo/")
+    store.save_user("demo", "workshop-001", cognito_status="spare")
+    monkeypatch.setattr(spare_seats.state_store, "get_store", lambda: store)
+    monkeypatch.setattr(spare_seats.failure_queue, "start", lambda path, region=None: None)
+    monkeypatch.setattr(spare_seats, "retry_failed_operations", lambda engine: 0)
+    calls = []
+
+    def add_spare_seats(engine, workshop_name, count, seed_source=None):
+        calls.append((workshop_name, count, seed_source))
+        return {'spares': [("workshop-002", "pw")]}
+    monkeypatch.setattr(spare_seats, "add_spare_seats", add_spare_seats)
+
+    assert spare_seats.refill(WorkshopEngine("us-west-2"), "demo") == 1
+    assert calls == [("demo", 1, "s3://course/demo/")]
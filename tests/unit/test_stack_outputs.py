@@ -0,0 +1,21 @@
+import json
+
+import stack_outputs
+
+
+def test_outputs_are_read_from_the_cdk_outputs_file(tmp_path):
+    path = tmp_path / "demo-outputs.json"
+    path.write_text(json.dumps({"demo-WorkshopDeploymentStack": {
+        "CognitoUserPoolID": "us-west-2_abc",
+        "SageMakerDomainID": "d-123",
+        "HostedUIUrl": "https://demo.auth.us-west-2.amazoncognito.com/login",
+    }}))
+
+    outputs = stack_outputs.read_outputs_file(str(path), stack_outputs.stack_name("demo"))
+
+    assert stack_outputs.workshop_outputs(outputs) == (
+        "us-west-2_abc", "d-123", "https://demo.auth.us-west-2.amazoncognito.com/login", None)
+
+
+def test_missing_outputs_file_returns_none(tmp_path):
+    assert stack_outputs.read_outputs_file(str(tmp_path / "missing.json"), "demo-WorkshopDeploymentStack") is None
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import stat
+
+from state_store import WorkshopStore
+
+
+def test_workshop_and_users_round_trip(tmp_path):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo", region="us-west-2", user_pool_id="pool", sagemaker_domain_id="d-1",
+                        hosted_uri="https://example.com")
+    store.save_users("demo", [
+        {"username": "workshop-002", "password": "pw2", "bucket": "demo-abc-002"},
+        {"username": "workshop-001", "password": "pw1", "bucket": "demo-abc-001"},
+    ])
+    store.save_user("demo", "workshop-001", cognito_status="created")
+    store.save_workshop("demo", shared_bucket_name=None)
+
+    assert store.get_workshop("demo")["user_pool_id"] == "pool"
+    assert [user["username"] for user in store.users("demo")] == ["workshop-001", "workshop-002"]
+    assert [user["username"] for user in store.users("demo", cognito_status="created")] == ["workshop-001"]
+    assert store.bucket_names("demo") == ["demo-abc-001", "demo-abc-002"]
+    assert [workshop["name"] for workshop in store.list_workshops("us-west-2")] == ["demo"]
+
+
+def test_csv_export_and_import(tmp_path):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo", hosted_uri="https://example.com", user_pool_id="pool", sagemaker_domain_id="d-1")
+    store.save_user("demo", "workshop-001", password="pw1", cognito_status="created")
+    store.save_user("demo", "workshop-002", password="pw2")
+    csv_file = store.export_csv("demo", str(tmp_path / "demo-users.csv"))
+
+    other = WorkshopStore(str(tmp_path / "other.db"))
+    name = other.import_csv(csv_file, "us-west-2")
+
+    assert name == "demo"
+    assert other.get_workshop(name)["sagemaker_domain_id"] == "d-1"
+    assert [(user["username"], user["password"]) for user in other.users(name)] == [("workshop-001", "pw1")]
+
+
+def test_deleting_a_workshop_removes_its_users(tmp_path):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo")
+    store.save_user("demo", "workshop-001")
+
+    store.delete_workshop("demo")
+
+    assert store.get_workshop("demo") is None
+    assert store.users("demo") == []
+
+
+def test_spare_seats_are_claimed_once_and_kept_out_of_the_handout(tmp_path):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo", hosted_uri="https://example.com", user_pool_id="pool", sagemaker_domain_id="d-1",
+                        spare_seats=2)
+    store.save_user("demo", "workshop-001", password="pw1", cognito_status="created")
+    store.save_user("demo", "workshop-002", password="pw2", cognito_status="spare")
+
+    assert [user["username"] for user in store.users("demo", cognito_status="created")] == ["workshop-001"]
+    assert store.claim_spare("demo")["username"] == "workshop-002"
+    assert store.claim_spare("demo") is None
+    assert [user["username"] for user in store.users("demo", cognito_status="created")] == [
+        "workshop-001", "workshop-002"]
+
+
+def test_older_databases_gain_new_columns(tmp_path):
+    path = str(tmp_path / "workshops.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE workshops (name TEXT PRIMARY KEY, region TEXT, stack_name TEXT, user_pool_id TEXT, "
+                 "sagemaker_domain_id TEXT, hosted_uri TEXT, shared_bucket_name TEXT, import_role_arn TEXT, "
+                 "created_at TEXT NOT NULL, updated_at TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+
+    store = WorkshopStore(path)
+    store.save_workshop("demo", spare_seats=3)
+
+    assert store.get_workshop("demo")["spare_seats"] == 3
+
+
+def test_user_numbers_follow_the_highest_in_use(tmp_path):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo")
+    store.save_users("demo", [{"username": "workshop-010"}, {"username": "workshop-002"},
+                              {"username": "workshop-1000"}])
+
+    assert store.reserve_user_numbers("demo", 2) == range(1001, 1003)
+    assert store.reserve_user_numbers("demo", 1) == range(1003, 1004)
+    assert [user["username"] for user in store.users("demo")][-3:] == ["workshop-1001", "workshop-1002", "workshop-1003"]
+
+
+def test_unused_reservations_are_released(tmp_path):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo")
+    numbers = store.reserve_user_numbers("demo", 3)
+    # A concurrent add is still provisioning the next numbers
+    store.reserve_user_numbers("demo", 2)
+    store.save_user("demo", "workshop-001", cognito_status="created", bucket="demo-001")
+
+    assert store.release_reservations("demo", numbers, keep={"workshop-002"}) == 1
+    assert [(user["username"], user["cognito_status"]) for user in store.users("demo")] == [
+        ("workshop-001", "created"), ("workshop-002", "reserved"), ("workshop-004", "reserved"),
+        ("workshop-005", "reserved")]
+    assert store.reserve_user_numbers("demo", 1) == range(6, 7)
+
+
+def test_database_is_only_readable_by_its_owner(tmp_path):
+    path = tmp_path / "workshops.db"
+    WorkshopStore(str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+    path.chmod(0o644)
+    WorkshopStore(str(path))
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+
+
+def test_workshops_using_another_workshops_vpc_endpoints_are_found(tmp_path):
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("track-a", region="us-west-2", vpc_id="vpc-1", vpc_endpoints=True)
+    store.save_workshop("track-b", region="us-west-2", vpc_id="vpc-1", vpc_endpoints=False)
+    store.save_workshop("track-c", region="us-west-2", vpc_id="vpc-2", vpc_endpoints=False)
+
+    assert store.vpc_endpoint_dependents("track-a") == ["track-b"]
+    assert store.vpc_endpoint_dependents("track-b") == []
@@ -0,0 +1,36 @@
+import json
+
+import template_deploy
+
+
+def test_code_version_changes_with_the_sources(tmp_path):
+    source = tmp_path / "index.py"
+    source.write_text("print('v1')")
+    first = template_deploy.code_version([str(source)])
+    assert template_deploy.code_version([str(source)]) == first
+
+    source.write_text("print('v2')")
+    assert template_deploy.code_version([str(source)]) != first
+
+
+def test_template_url_resolves_the_bootstrap_bucket(tmp_path):
+    manifest = tmp_path / "WorkshopTemplate.assets.json"
+    manifest.write_text(json.dumps({"files": {
+        "abc": {"source": {"path": "asset.abc"},
+                "destinations": {"d": {"bucketName": "cdk-hnb659fds-assets-${AWS::AccountId}-${AWS::Region}",
+                                       "objectKey": "abc.zip"}}},
+        "def": {"source": {"path": "WorkshopTemplate.template.json"},
+                "destinations": {"d": {"bucketName": "cdk-hnb659fds-assets-${AWS::AccountId}-${AWS::Region}",
+                                       "objectKey": "def.json"}}},
+    }}))
+
+    url = template_deploy.template_url(str(manifest), "WorkshopTemplate", "123456789012", "us-west-2")
+    assert url == "https://cdk-hnb659fds-assets-123456789012-us-west-2.s3.us-west-2.amazonaws.com/def.json"
+
+
+def test_stack_parameters_include_the_shared_bucket():
+    params = {"AWSRegion": "us-west-2", "VPCID": "vpc-1", "SubnetIDs": ["subnet-a", "subnet-b"]}
+    parameters = {p["ParameterKey"]: p["ParameterValue"]
+                  for p in template_deploy.stack_parameters(params, "demo", "demo-shared")}
+    assert parameters == {"WorkshopName": "demo", "AWSRegion": "us-west-2", "VPCID": "vpc-1",
+                          "SubnetIDs": "subnet-a,subnet-b", "SharedBucket": "demo-shared"}
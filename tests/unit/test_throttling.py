@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+from botocore.exceptions import ClientError
+
+import throttling
+from throttling import AdaptiveLimit, ConcurrencyController
+
+
+def throttle_error():
+    return ClientError({"Error": {"Code": "ThrottlingException"}}, "CreateUserProfile")
+
+
+class FakeClient:
+    def __init__(self, throttles=0, capacity=None):
+        self.throttles = throttles
+        self.capacity = capacity
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def create_user_profile(self, **kwargs):
+        with self.lock:
+            if self.throttles:
+                self.throttles -= 1
+                raise throttle_error()
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            over_capacity = self.capacity is not None and self.in_flight > self.capacity
+        try:
+            if over_capacity:
+                raise throttle_error()
+            time.sleep(0.002)
+            return kwargs
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+    def delete_user_profile(self, **kwargs):
+        raise ClientError({"Error": {"Code": "ResourceNotFound"}}, "DeleteUserProfile")
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(throttling.time, "sleep", lambda seconds: None)
+
+
+def test_limit_grows_on_success_and_halves_on_throttle():
+    limit = AdaptiveLimit(initial=4, maximum=8)
+    for _ in range(40):
+        limit.acquire()
+        limit.release(throttled=False)
+    assert limit.limit == 8
+
+    limit.acquire()
+    limit.release(throttled=True)
+    assert limit.limit == 4
+
+    # A second throttle from the same burst does not halve it again
+    limit.acquire()
+    limit.release(throttled=True)
+    assert limit.limit == 4
+
+
+def test_throttled_calls_are_retried():
+    controller = ConcurrencyController()
+    client = FakeClient(throttles=3)
+
+    assert controller.call(client, "create_user_profile", UserProfileName="workshop-001") == {
+        "UserProfileName": "workshop-001"
+    }
+
+
+def test_other_errors_are_raised_without_retry():
+    controller = ConcurrencyController()
+
+    with pytest.raises(ClientError):
+        controller.call(FakeClient(), "delete_user_profile", UserProfileName="workshop-001")
+
+
+def test_in_flight_calls_never_exceed_limit():
+    controller = ConcurrencyController(initial_limit=2, max_limit=3)
+    client = FakeClient()
+
+    threads = [threading.Thread(target=controller.call, args=(client, "create_user_profile"))
+               for _ in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert client.peak <= 3
+
+
+def test_budgets_are_separate_per_service_and_api():
+    controller = ConcurrencyController()
+
+    assert controller.limit_for("sagemaker", "create_user_profile") is not controller.limit_for(
+        "sagemaker", "delete_user_profile")
+    assert controller.limit_for("s3", "create_bucket") is controller.limit_for("s3", "create_bucket")
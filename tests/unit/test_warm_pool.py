@@ -0,0 +1,106 @@
+from botocore.exceptions import ClientError
+
+import warm_pool
+
+
+class FakeCloudFormation:
+    def __init__(self, stacks, busy, stolen=()):
+        self.stacks = stacks
+        self.busy = busy
+        self.stolen = stolen
+        self.updates = []
+
+    def get_paginator(self, name):
+        stacks = self.stacks
+
+        class Paginator:
+            def paginate(self):
+                return [{"Stacks": stacks}]
+        return Paginator()
+
+    def update_stack(self, StackName, **kwargs):
+        if StackName in self.busy:
+            raise ClientError({"Error": {"Code": "ValidationError", "Message": "UPDATE_IN_PROGRESS"}}, "UpdateStack")
+        self.updates.append((StackName, kwargs["Tags"]))
+        tags = warm_pool.pool_tags(warm_pool.CLAIMED, "other") if StackName in self.stolen else kwargs["Tags"]
+        self.describe_stacks(StackName)["Stacks"][0]["Tags"] = tags
+
+    def describe_stacks(self, StackName):
+        return {"Stacks": [stack for stack in self.stacks if stack["StackName"] == StackName]}
+
+    def get_waiter(self, name):
+        class Waiter:
+            def wait(self, **kwargs):
+                pass
+        return Waiter()
+
+
+def pool_stack(name, state, status="CREATE_COMPLETE"):
+    return {"StackName": name, "StackStatus": status, "Parameters": [{"ParameterKey": "WorkshopName"}],
+            "Tags": [{"Key": warm_pool.POOL_TAG, "Value": state}]}
+
+
+def test_claim_skips_stacks_another_run_is_claiming(monkeypatch):
+    cloudformation = FakeCloudFormation([
+        pool_stack("WorkshopPool-aaaa", warm_pool.AVAILABLE),
+        pool_stack("WorkshopPool-bbbb", warm_pool.CLAIMED),
+        pool_stack("WorkshopPool-cccc", warm_pool.AVAILABLE),
+        pool_stack("demo-WorkshopDeploymentStack", warm_pool.AVAILABLE),
+    ], busy={"WorkshopPool-aaaa"})
+    monkeypatch.setattr(warm_pool.aws_clients, "get_client", lambda service, region=None: cloudformation)
+    monkeypatch.setattr(warm_pool.stack_outputs, "fetch_stack_outputs", lambda name, region=None: {"SageMakerDomainID": "d-1"})
+    recorded = []
+    monkeypatch.setattr(warm_pool.stack_outputs, "record_outputs",
+                        lambda workshop, region, outputs, name=None: recorded.append((workshop, name)))
+
+    name, outputs = warm_pool.claim_stack("demo", "us-west-2")
+
+    assert name == "WorkshopPool-cccc"
+    assert outputs == {"SageMakerDomainID": "d-1"}
+    assert {"Key": "workshop", "Value": "demo"} in cloudformation.updates[0][1]
+    assert recorded == [("demo", "WorkshopPool-cccc")]
+
+
+def test_claim_skips_stacks_retagged_by_a_later_claim(monkeypatch):
+    cloudformation = FakeCloudFormation([
+        pool_stack("WorkshopPool-aaaa", warm_pool.AVAILABLE),
+        pool_stack("WorkshopPool-bbbb", warm_pool.AVAILABLE),
+    ], busy=set(), stolen={"WorkshopPool-aaaa"})
+    monkeypatch.setattr(warm_pool.aws_clients, "get_client", lambda service, region=None: cloudformation)
+    monkeypatch.setattr(warm_pool.stack_outputs, "fetch_stack_outputs", lambda name, region=None: {})
+    monkeypatch.setattr(warm_pool.stack_outputs, "record_outputs", lambda workshop, region, outputs, name=None: None)
+
+    name, _ = warm_pool.claim_stack("demo", "us-west-2")
+
+    assert name == "WorkshopPool-bbbb"
+
+
+def test_fill_counts_pending_stacks(monkeypatch):
+    cloudformation = FakeCloudFormation([pool_stack("WorkshopPool-aaaa", warm_pool.AVAILABLE, "CREATE_IN_PROGRESS")],
+                                        busy=set())
+    monkeypatch.setattr(warm_pool.aws_clients, "get_client", lambda service, region=None: cloudformation)
+    created = []
+    monkeypatch.setattr(warm_pool.template_deploy, "create_workshop_stack",
+                        lambda params, workshop, **kwargs: created.append(kwargs["name"]) or "stack-id")
+
+    warm_pool.fill_pool({"AWSRegion": "us-west-2", "VPCID": "vpc-1", "SubnetIDs": ["subnet-a"]}, size=3)
+
+    assert len(created) == 2
+    assert all(name.startswith(warm_pool.POOL_PREFIX) for name in created)
+
+
+def test_claim_resets_optional_parameters_that_are_not_given():
+    stack = {"Parameters": [{"ParameterKey": "WorkshopName"}, {"ParameterKey": "LazyProvisioning"},
+                            {"ParameterKey": "UserBucketPrefix"}, {"ParameterKey": "VpcEndpoints"}]}
+
+    assert warm_pool.claim_parameters(stack, {"LazyProvisioning": "true", "UserBucketPrefix": "demo"}) == [
+        {"ParameterKey": "WorkshopName", "UsePreviousValue": True},
+        {"ParameterKey": "LazyProvisioning", "ParameterValue": "true"},
+        {"ParameterKey": "UserBucketPrefix", "ParameterValue": "demo"},
+        {"ParameterKey": "VpcEndpoints", "ParameterValue": "false"},
+    ]
+    assert warm_pool.claim_parameters(stack)[1:] == [
+        {"ParameterKey": "LazyProvisioning", "ParameterValue": "false"},
+        {"ParameterKey": "UserBucketPrefix", "ParameterValue": ""},
+        {"ParameterKey": "VpcEndpoints", "ParameterValue": "false"},
+    ]
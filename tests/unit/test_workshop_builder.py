@@ -0,0 +1,61 @@
+import workshop_builder
+
+
+class FakeEc2:
+    def __init__(self, subnets, endpoints=(), route_tables=None):
+        self.subnets = subnets
+        self.endpoints = list(endpoints)
+        # {subnet ID: explicitly associated route table ID}
+        self.route_tables = route_tables if route_tables is not None else {"subnet-a": "rtb-private"}
+
+    def describe_vpc_endpoints(self, Filters):
+        return {"VpcEndpoints": self.endpoints}
+
+    def describe_subnets(self, SubnetIds):
+        return {"Subnets": [subnet for subnet in self.subnets if subnet["SubnetId"] in SubnetIds]}
+
+    def describe_route_tables(self, Filters):
+        if Filters[0]["Name"] == "association.subnet-id":
+            route_table_ids = sorted(set(self.route_tables.values()))
+            return {"RouteTables": [
+                {"RouteTableId": route_table_id,
+                 "Associations": [{"SubnetId": subnet_id, "RouteTableId": route_table_id, "Main": False}
+                                  for subnet_id, table in self.route_tables.items() if table == route_table_id]}
+                for route_table_id in route_table_ids]}
+        return {"RouteTables": [{"RouteTableId": "rtb-main", "Associations": [{"Main": True}]}]}
+
+    def describe_vpcs(self, VpcIds):
+        return {"Vpcs": [{"VpcId": VpcIds[0], "CidrBlock": "10.0.0.0/16"}]}
+
+
+PARAMS = {"AWSRegion": "us-west-2", "VPCID": "vpc-1", "SubnetIDs": ["subnet-a", "subnet-b"]}
+
+
+def test_vpc_endpoints_cover_every_subnet_route_table(monkeypatch):
+    ec2 = FakeEc2([{"SubnetId": "subnet-a", "AvailabilityZone": "us-west-2a"},
+                   {"SubnetId": "subnet-b", "AvailabilityZone": "us-west-2b"}])
+    monkeypatch.setattr(workshop_builder.aws_clients, "get_client", lambda service, region=None: ec2)
+
+    assert workshop_builder.vpc_endpoint_parameters(PARAMS) == {
+        "VpcEndpoints": "true",
+        "VpcCidr": "10.0.0.0/16",
+        "RouteTableIDs": "rtb-main,rtb-private",
+    }
+
+
+def test_subnets_sharing_a_route_table_leave_the_main_table_alone(monkeypatch):
+    ec2 = FakeEc2([{"SubnetId": "subnet-a", "AvailabilityZone": "us-west-2a"},
+                   {"SubnetId": "subnet-b", "AvailabilityZone": "us-west-2b"}],
+                  route_tables={"subnet-a": "rtb-private", "subnet-b": "rtb-private"})
+    monkeypatch.setattr(workshop_builder.aws_clients, "get_client", lambda service, region=None: ec2)
+
+    assert workshop_builder.vpc_endpoint_parameters(PARAMS)["RouteTableIDs"] == "rtb-private"
+
+
+def test_vpc_endpoints_are_skipped_when_the_vpc_already_has_them(monkeypatch):
+    ec2 = FakeEc2([{"SubnetId": "subnet-a", "AvailabilityZone": "us-west-2a"},
+                   {"SubnetId": "subnet-b", "AvailabilityZone": "us-west-2b"}],
+                  endpoints=[{"ServiceName": "com.amazonaws.us-west-2.s3"}])
+    monkeypatch.setattr(workshop_builder.aws_clients, "get_client", lambda service, region=None: ec2)
+
+    assert workshop_builder.vpc_endpoint_parameters(PARAMS) == {}
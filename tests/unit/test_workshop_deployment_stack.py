@@ -1,7 +1,13 @@
+import os
+import shutil
+import subprocess
+import zipfile
+
 import aws_cdk as core
 import aws_cdk.assertions as assertions
+import pytest
 
-from workshop_deployment.workshop_deployment_stack import WorkshopDeploymentStack
+from workshop_deployment.workshop_deployment_stack import WorkshopDeploymentStack, lifecycle_script, read_package_manifest
 
 # example tests. To run these tests, uncomment this file along with the example
 # resource in workshop_deployment/workshop_deployment_stack.py
@@ -13,3 +19,80 @@ def test_sqs_queue_created():
 #     template.has_resource_properties("AWS::SQS::Queue", {
 #         "VisibilityTimeout": 300
 #     })
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def synth():
+    """Synthesize stacks, with a stand-in for the requests layer when it has not been built."""
+    layer_dir = os.path.join(REPO_ROOT, "lambda_layer")
+    created = not os.path.exists(layer_dir)
+    if created:
+        # Assets resolve against the CDK kernel's working directory, which is fixed when it starts
+        os.makedirs(layer_dir)
+        with zipfile.ZipFile(os.path.join(layer_dir, "requests_layer.zip"), "w") as layer:
+            layer.writestr("python/requests/__init__.py", "")
+
+    def template(**kwargs):
+        return assertions.Template.from_stack(WorkshopDeploymentStack(core.App(), "workshop-deployment", **kwargs))
+    yield template
+    if created:
+        shutil.rmtree(layer_dir)
+
+
+def test_sagemaker_can_set_the_source_identity_on_the_execution_role(synth):
+    template = synth(workshop_name="demo", shared_bucket_name="demo-shared")
+
+    template.has_resource_properties("AWS::IAM::Role", {
+        "AssumeRolePolicyDocument": {"Statement": assertions.Match.array_with([{
+            "Action": "sts:SetSourceIdentity",
+            "Effect": "Allow",
+            "Principal": {"Service": "sagemaker.amazonaws.com"},
+        }])}
+    })
+
+
+def test_lazy_provisioning_permissions_need_lazy_provisioning(synth):
+    template = synth(workshop_name="demo")
+
+    policies = template.find_resources("AWS::IAM::Policy", {
+        "Properties": {"PolicyDocument": {"Statement": assertions.Match.array_with([
+            assertions.Match.object_like({"Action": assertions.Match.array_with(["s3:CreateBucket"])})])}}
+    })
+    assert [policy.get("Condition") for policy in policies.values()] == ["LazyProvisioningEnabled"]
+
+
+def test_package_manifest_skips_comments_and_blank_lines(tmp_path):
+    manifest = tmp_path / "workshop-packages.txt"
+    manifest.write_text("# course packages\npandas==2.2.0\n\nxarray  # for the climate notebooks\n")
+
+    assert read_package_manifest(str(manifest)) == ["pandas==2.2.0", "xarray"]
+
+
+def test_lifecycle_script_quotes_package_specifiers():
+    script = lifecycle_script(["pandas==2.2.0", "numpy<2"])
+
+    assert script.startswith("#!/bin/bash\n")
+    assert "pip install --quiet --no-index pandas==2.2.0 'numpy<2' || pip install --quiet pandas==2.2.0 'numpy<2'" in script
+
+
+def test_failed_package_installs_do_not_stop_jupyterlab(tmp_path):
+    pip = tmp_path / "pip"
+    pip.write_text("#!/bin/sh\nexit 1\n")
+    pip.chmod(0o755)
+
+    result = subprocess.run(["bash", "-c", lifecycle_script(["pandas==2.2.0"])], capture_output=True, text=True,
+                            env={**os.environ, "PATH": f"{tmp_path}:{os.environ['PATH']}", "HOME": str(tmp_path)})
+
+    assert result.returncode == 0
+    assert "workshop package install failed" in result.stderr
+
+
+def test_lifecycle_script_uses_the_shared_cache_when_mounted():
+    script = lifecycle_script()
+
+    assert "/mnt/custom-file-systems/efs/*/.workshop-cache" in script
+    assert 'pip config --user set global.find-links "$CACHE/wheelhouse"' in script
+    assert "pip install" not in script
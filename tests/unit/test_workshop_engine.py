@@ -0,0 +1,88 @@
+import workshop_engine
+from state_store import WorkshopStore
+from workshop_engine import WorkshopEngine, created_status, plan_users
+
+
+def test_clients_are_shared_across_stages():
+    engine = WorkshopEngine("us-west-2")
+
+    assert engine.client("sagemaker") is engine.client("sagemaker")
+    assert engine.client("sagemaker").meta.region_name == "us-west-2"
+
+
+def test_stage_results_are_passed_back_as_objects():
+    engine = WorkshopEngine("us-west-2")
+
+    users = engine.run_stage("Creating users", lambda count: [f"workshop-{i:03}" for i in range(1, count + 1)], 2)
+
+    assert users == ["workshop-001", "workshop-002"]
+
+
+def test_failed_stage_returns_none():
+    engine = WorkshopEngine("us-west-2")
+
+    def fail():
+        raise RuntimeError("boom")
+
+    assert engine.run_stage("Failing", fail) is None
+
+
+def test_spare_seats_are_planned_after_the_attendees():
+    users = plan_users("demo", 2, num_spares=1)
+
+    assert [user["username"] for user in users] == ["workshop-001", "workshop-002", "workshop-003"]
+    assert [user.get("spare", False) for user in users] == [False, False, True]
+    assert [created_status(user) for user in users] == ["created", "created", "spare"]
+
+
+def test_lazy_workshops_only_create_cognito_accounts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(workshop_engine.create_cognito_users, "create_cognito_user",
+                        lambda client, username, password, pool, existing_ok=False: {"User": username})
+
+    def unexpected(*args, **kwargs):
+        raise AssertionError("profiles and buckets are created on first login")
+    monkeypatch.setattr(workshop_engine.create_sagemaker_profiles, "create_user_profile", unexpected)
+    monkeypatch.setattr(workshop_engine.create_s3_buckets, "create_bucket", unexpected)
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo", lazy_provisioning=True)
+    monkeypatch.setattr(workshop_engine.state_store, "get_store", lambda: store)
+
+    users = plan_users("demo", 2, bucket_prefix="demo-0101-abcdef")
+    results = workshop_engine.stream_workshop_users(WorkshopEngine("us-west-2"), "demo", users, "pool", "d-1",
+                                                    "https://example.com", lazy=True)
+
+    assert [username for username, _ in results["users"]] == ["workshop-001", "workshop-002"]
+    assert results["profiles"] == {"workshop-001": "lazy", "workshop-002": "lazy"}
+    assert [user["bucket"] for user in users] == ["demo-0101-abcdef-001", "demo-0101-abcdef-002"]
+    assert results["buckets"] == []
+
+
+def test_bulk_imports_use_the_checkpointed_users(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    store = WorkshopStore(str(tmp_path / "workshops.db"))
+    store.save_workshop("demo")
+    monkeypatch.setattr(workshop_engine.state_store, "get_store", lambda: store)
+    imported = []
+
+    def provision_users(client, num_users, pool, domain, uri, workshop, max_workers, import_role_arn, users):
+        imported.extend(users)
+        return users
+    monkeypatch.setattr(workshop_engine.create_cognito_users, "provision_users", provision_users)
+    monkeypatch.setattr(workshop_engine.create_sagemaker_profiles, "provision_profiles",
+                        lambda client, region, domain, usernames, max_workers: {u: "InService" for u in usernames})
+    monkeypatch.setattr(workshop_engine.create_s3_buckets, "create_buckets",
+                        lambda names, workshop, region, max_workers, encryption, expiration_days, s3: names)
+
+    progress = workshop_engine.checkpoint.Checkpoint(str(tmp_path / "demo-checkpoint.jsonl"))
+    planned = plan_users("demo", 2)
+    progress.start({}, planned)
+    results = workshop_engine.provision_workshop(WorkshopEngine("us-west-2"), "demo", 2, "pool", "d-1",
+                                                 "https://example.com", "arn:role", streaming=False,
+                                                 progress=progress)
+
+    assert imported == [(user["username"], user["password"]) for user in planned]
+    assert results["buckets"] == [user["bucket"] for user in planned]
+    assert all(progress.is_done(stage, user["username"]) for user in planned
+               for stage in ("Cognito user", "SageMaker profile", "S3 bucket"))
+    assert [user["bucket"] for user in store.users("demo")] == [user["bucket"] for user in planned]
@@ -0,0 +1,125 @@
+import logging
+import random
+import threading
+import time
+from botocore.exceptions import ClientError
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+THROTTLING_ERROR_CODES = (
+    'ThrottlingException',
+    'Throttling',
+    'TooManyRequestsException',
+    'RequestLimitExceeded',
+    'SlowDown',
+)
+INITIAL_LIMIT = 4
+MAX_LIMIT = 64
+MAX_THROTTLE_RETRIES = 8
+MAX_BACKOFF_SECONDS = 30
+# Throttles arriving within this window of a decrease belong to the same burst
+DECREASE_COOLDOWN_SECONDS = 1.0
+
+def error_code(error):
+    """Return the AWS error code of a ClientError, or None for any other exception."""
+    return error.response.get('Error', {}).get('Code') if isinstance(error, ClientError) else None
+
+def is_throttling_error(error):
+    return error_code(error) in THROTTLING_ERROR_CODES
+
+class AdaptiveLimit:
+    """
+    Additive-increase, multiplicative-decrease cap on in-flight calls for one API.
+
+    Each success raises the limit by 1/limit (about +1 per round of calls).
+    A throttle halves it, at most once per cooldown window, so one burst of
+    throttles does not collapse the limit to the minimum.
+    """
+
+    def __init__(self, initial=INITIAL_LIMIT, maximum=MAX_LIMIT):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.in_flight = 0
+        self.last_decrease = float('-inf')
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    def release(self, throttled):
+        with self.condition:
+            self.in_flight -= 1
+            if throttled:
+                now = time.monotonic()
+                if now - self.last_decrease >= DECREASE_COOLDOWN_SECONDS:
+                    self.limit = max(1.0, self.limit / 2)
+                    self.last_decrease = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self.condition.notify_all()
+
+class ConcurrencyController:
+    """
+    Shared adaptive concurrency budgets, one per (service, API) pair.
+
+    Calls made through call() wait for a free slot in their budget. Throttled
+    calls shrink the budget and are retried with jittered backoff, so
+    throughput finds its own ceiling for the account and region.
+    """
+
+    def __init__(self, initial_limit=INITIAL_LIMIT, max_limit=MAX_LIMIT, max_retries=MAX_THROTTLE_RETRIES):
+        self.initial_limit = initial_limit
+        self.max_limit = max_limit
+        self.max_retries = max_retries
+        self.limits = {}
+        self.lock = threading.Lock()
+
+    def limit_for(self, service_name, operation):
+        key = (service_name, operation)
+        with self.lock:
+            if key not in self.limits:
+                self.limits[key] = AdaptiveLimit(self.initial_limit, self.max_limit)
+            return self.limits[key]
+
+    def call(self, client, operation, **kwargs):
+        """Call client.<operation>(**kwargs) within the budget for that service and API."""
+        limit = self.limit_for(service_name(client), operation)
+        for attempt in range(self.max_retries + 1):
+            limit.acquire()
+            throttled = False
+            try:
+                return getattr(client, operation)(**kwargs)
+            except ClientError as e:
+                throttled = is_throttling_error(e)
+                if not throttled or attempt == self.max_retries:
+                    raise
+            finally:
+                limit.release(throttled)
+
+            # Full jitter keeps parallel workers from retrying in lockstep
+            delay = random.uniform(0, min(2 ** attempt, MAX_BACKOFF_SECONDS))
+            logging.warning(f"Throttled on {service_name(client)}.{operation}, retrying in {delay:.1f}s "
+                            f"(limit now {int(limit.limit)})")
+            time.sleep(delay)
+
+    def current_limits(self):
+        """Return {(service, operation): current in-flight limit} for reporting."""
+        with self.lock:
+            return {key: int(limit.limit) for key, limit in self.limits.items()}
+
+def service_name(client):
+    meta = getattr(client, 'meta', None)
+    if meta is not None and hasattr(meta, 'service_model'):
+        return meta.service_model.service_name
+    return type(client).__name__
+
+# Shared by every provisioning and teardown script in this process
+controller = ConcurrencyController()
+
+def call(client, operation, **kwargs):
+    """Call client.<operation>(**kwargs) through the shared controller."""
+    return controller.call(client, operation, **kwargs)
@@ -0,0 +1,153 @@
+import logging
+import sys
+import uuid
+from botocore.exceptions import ClientError
+import aws_clients
+import stack_outputs
+import template_deploy
+import throttling
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_POOL_SIZE = 2
+POOL_PREFIX = "WorkshopPool-"
+POOL_TAG = "workshop-pool"
+AVAILABLE = "available"
+CLAIMED = "claimed"
+READY_STATUSES = ('CREATE_COMPLETE', 'UPDATE_COMPLETE')
+PENDING_STATUSES = ('CREATE_IN_PROGRESS',)
+
+def pool_stacks(region=None):
+    """Return every warm pool stack in the region that is not being deleted, with its tags as a dict."""
+    cloudformation = aws_clients.get_client('cloudformation', region)
+    stacks = []
+    for page in cloudformation.get_paginator('describe_stacks').paginate():
+        for stack in page['Stacks']:
+            if not stack['StackName'].startswith(POOL_PREFIX):
+                continue
+            if stack['StackStatus'] not in READY_STATUSES + PENDING_STATUSES:
+                continue
+            stack['TagMap'] = {tag['Key']: tag['Value'] for tag in stack.get('Tags', [])}
+            stacks.append(stack)
+    return stacks
+
+def available_stacks(region=None, include_pending=False):
+    statuses = READY_STATUSES + (PENDING_STATUSES if include_pending else ())
+    return [stack for stack in pool_stacks(region)
+            if stack['TagMap'].get(POOL_TAG) == AVAILABLE and stack['StackStatus'] in statuses]
+
+def pool_tags(state, workshop_name=None):
+    tags = [{'Key': 'project', 'Value': 'cmt-workshop'}, {'Key': POOL_TAG, 'Value': state}]
+    if workshop_name:
+        tags.append({'Key': 'workshop', 'Value': workshop_name})
+    return tags
+
+def fill_pool(params, size=DEFAULT_POOL_SIZE):
+    """
+    Start creating pool stacks until the region has `size` available or
+    in-progress ones. Creates are not waited on. Returns the new stack names.
+    """
+    region = params['AWSRegion']
+    missing = size - len(available_stacks(region, include_pending=True))
+    created = []
+    for _ in range(max(missing, 0)):
+        name = f"{POOL_PREFIX}{uuid.uuid4().hex[:8]}"
+        # The slot name doubles as the SageMaker domain name, which cannot be renamed after a claim
+        if template_deploy.create_workshop_stack(params, name, wait=False, name=name,
+                                                 tags=pool_tags(AVAILABLE)):
+            created.append(name)
+    if created:
+        logging.info(f"Creating {len(created)} warm pool stacks in {region}: {', '.join(created)}")
+    return created
+
+def stack_tags(cloudformation, name):
+    """The stack's current tags as a dict."""
+    stack = cloudformation.describe_stacks(StackName=name)['Stacks'][0]
+    return {tag['Key']: tag['Value'] for tag in stack.get('Tags', [])}
+
+def claim_parameters(stack, overrides=None):
+    """
+    Keep the stack's network parameter values, and set every optional parameter
+    from `overrides` or its default, so no setting of an earlier claimant survives.
+    """
+    overrides = {**template_deploy.OPTIONAL_PARAMETERS, **(overrides or {})}
+    return [{'ParameterKey': p['ParameterKey'], 'ParameterValue': overrides[p['ParameterKey']]}
+            if p['ParameterKey'] in overrides else {'ParameterKey': p['ParameterKey'], 'UsePreviousValue': True}
+            for p in stack.get('Parameters', [])]
+
+def claim_stack(workshop_name, region=None, overrides=None):
+    """
+    Claim an idle pool stack for a workshop and return (stack name, outputs),
+    or (None, None) when the pool is empty. Parameters in `overrides` (such as
+    LazyProvisioning) are changed in the same update.
+
+    The claim retags the stack with a stack update. CloudFormation rejects an
+    update while another is in progress, and a claim that started after
+    ours finished would retag the stack again, so the workshop tag is read
+    back once the update completes; a claim that lost either way moves on
+    to the next stack.
+    """
+    cloudformation = aws_clients.get_client('cloudformation', region)
+    for stack in available_stacks(region):
+        name = stack['StackName']
+        try:
+            # The listing may be stale by now
+            if stack_tags(cloudformation, name).get(POOL_TAG) != AVAILABLE:
+                continue
+            cloudformation.update_stack(
+                StackName=name,
+                UsePreviousTemplate=True,
+                Parameters=claim_parameters(stack, overrides),
+                Capabilities=['CAPABILITY_IAM'],
+                Tags=pool_tags(CLAIMED, workshop_name)
+            )
+        except ClientError as e:
+            if throttling.error_code(e) == 'ValidationError':
+                logging.info(f"Pool stack {name} was claimed by another run, trying the next one")
+                continue
+            logging.error(f"Failed to claim pool stack {name}: {e}")
+            continue
+
+        try:
+            cloudformation.get_waiter('stack_update_complete').wait(StackName=name,
+                                                                   WaiterConfig={'Delay': 5, 'MaxAttempts': 120})
+        except Exception as e:
+            logging.error(f"Claimed pool stack {name} did not finish updating and is left tagged for {workshop_name}: "
+                          f"{e}. Delete it once its update settles.")
+            continue
+        if stack_tags(cloudformation, name).get('workshop') != workshop_name:
+            logging.info(f"Pool stack {name} was claimed by another run, trying the next one")
+            continue
+        outputs = stack_outputs.fetch_stack_outputs(name, region)
+        stack_outputs.record_outputs(workshop_name, region, outputs, name=name)
+        logging.info(f"Claimed pool stack {name} for workshop {workshop_name}")
+        return name, outputs
+    return None, None
+
+def drain_pool(region=None):
+    """Delete every idle pool stack in the region. Returns the number deleted."""
+    stacks = available_stacks(region, include_pending=True)
+    for stack in stacks:
+        template_deploy.delete_stack(stack['StackName'], region, wait=False)
+    return len(stacks)
+
+def main(command, region, vpc_id=None, subnet_ids=None, size=DEFAULT_POOL_SIZE):
+    if command == 'fill':
+        params = {'AWSRegion': region, 'VPCID': vpc_id, 'SubnetIDs': subnet_ids.split(',')}
+        fill_pool(params, size)
+    elif command == 'drain':
+        print(f"Deleting {drain_pool(region)} idle pool stacks")
+    for stack in pool_stacks(region):
+        print(f"{stack['StackName']}\t{stack['StackStatus']}\t{stack['TagMap'].get(POOL_TAG)}\t"
+              f"{stack['TagMap'].get('workshop', '')}")
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3 or sys.argv[1] not in ('fill', 'drain', 'list') or (sys.argv[1] == 'fill' and len(sys.argv) < 5):
+        print("Usage: python warm_pool.py fill <region> <vpc_id> <subnet_ids> [size] | drain <region> | list <region>")
+        sys.exit(1)
+
+    if sys.argv[1] == 'fill':
+        main('fill', sys.argv[2], sys.argv[3], sys.argv[4], int(sys.argv[5]) if len(sys.argv) > 5 else DEFAULT_POOL_SIZE)
+    else:
+        main(sys.argv[1], sys.argv[2])
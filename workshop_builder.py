@@ -7,9 +7,21 @@ import time
 import glob
 import pandas as pd
 import csv
-from tqdm import tqdm
 import sys
-from add_workshop_users import add_users
+from datetime import datetime
+import create_s3_buckets
+import prewarm_spaces
+import retry_failures
+import shared_cache
+import spare_seats
+import stack_outputs
+import state_store
+import template_deploy
+import warm_pool
+from checkpoint import Checkpoint
+from workshop_deployment.workshop_deployment_stack import INTERFACE_ENDPOINT_SERVICES
+from workshop_engine import DEFAULT_MAX_WORKERS, WorkshopEngine, create_workshop, resume_workshop, update_workshop, destroy_workshop, record_workshop
+import aws_clients
 
 VALID_AWS_REGIONS = [
     'us-east-1', 'us-east-2', 'us-west-1', 'us-west-2',
@@ -20,11 +32,15 @@ VALID_AWS_REGIONS = [
     'eu-north-1', 'eu-south-1', 'me-south-1', 'sa-east-1'
 ]
 
+# Cohorts at least this large are created with a Cognito user import job
+# instead of one AdminCreateUser call per user.
+BULK_IMPORT_MIN_USERS = 500
+
 def aws_sign_in():
     """Verify AWS CLI configuration and account."""
     print("Please ensure you have AWS CLI configured with 'aws configure'.")
     try:
-        sts_client = boto3.client('sts')
+        sts_client = aws_clients.get_client('sts')
         caller_identity = sts_client.get_caller_identity()
         account_id = caller_identity.get('Account')
         print(f"Signed into AWS account: {account_id}")
@@ -70,21 +86,21 @@ def set_aws_region():
         else:
             return current_region
 
-def get_available_vpcs():
+def get_available_vpcs(region=None):
     """Retrieve available VPCs in the selected region."""
-    ec2_client = boto3.client('ec2')
+    ec2_client = aws_clients.get_client('ec2', region)
     response = ec2_client.describe_vpcs()
     return response['Vpcs']
 
-def get_available_subnets(vpc_id):
+def get_available_subnets(vpc_id, region=None):
     """Retrieve available subnets for a given VPC."""
-    ec2_client = boto3.client('ec2')
+    ec2_client = aws_clients.get_client('ec2', region)
     response = ec2_client.describe_subnets(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}])
     return response['Subnets']
 
-def select_vpc():
+def select_vpc(region=None):
     """Allow user to select a VPC from available options."""
-    vpcs = get_available_vpcs()
+    vpcs = get_available_vpcs(region)
     print("Available VPCs:")
     for index, vpc in enumerate(vpcs, start=1):
         print(f"{index}. VPC ID: {vpc['VpcId']}")
@@ -94,9 +110,9 @@ def select_vpc():
 
 def gather_parameters(region):
     """Collect necessary parameters for deployment."""
-    vpc_id = select_vpc()
+    vpc_id = select_vpc(region)
     
-    subnets = get_available_subnets(vpc_id)
+    subnets = get_available_subnets(vpc_id, region)
     print(f"Available Subnets for VPC {vpc_id}:")
     for index, subnet in enumerate(subnets, start=1):
         print(f"{index}. Subnet ID: {subnet['SubnetId']} ({subnet['AvailabilityZone']})")
@@ -110,7 +126,14 @@ def gather_parameters(region):
         "SubnetIDs": subnet_ids
     }
 
-def deploy_cdk_stack(params, workshop_name):
+def deploy_cdk_stack(params, workshop_name, shared_bucket_name=None, output_dir=None):
+    """
+    Deploy the workshop stack and return its outputs, or None if the deploy failed.
+
+    cdk writes the outputs to <workshop>-outputs.json; if that file is missing
+    they are read from CloudFormation instead. Concurrent deploys each need
+    their own cdk `output_dir`.
+    """
     print("Deploying the CDK stack... Please wait")
 
     # Set environment variables for CDK deployment
@@ -123,25 +146,31 @@ def deploy_cdk_stack(params, workshop_name):
                  f"--parameters VPCID={params['VPCID']} " \
                  f"--parameters SubnetIDs={','.join(params['SubnetIDs'])} " \
                  f"--context workshop_name={workshop_name} " \
+                 f"--outputs-file {stack_outputs.outputs_file(workshop_name)} " \
                  f"--require-approval never"
+    if shared_bucket_name:
+        cdk_params += f" --context shared_bucket_name={shared_bucket_name}"
+    if output_dir:
+        cdk_params += f" --output {output_dir}"
+    for key in template_deploy.OPTIONAL_PARAMETERS:
+        if params.get(key):
+            cdk_params += f" --parameters {key}={params[key]}"
 
     command = f"cdk deploy {cdk_params}"
 
     try:
         process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, bufsize=1)
 
-        output = []
         for line in iter(process.stdout.readline, ''):
             print(line, end='')
             sys.stdout.flush()
-            output.append(line)
 
         process.stdout.close()
         return_code = process.wait()
 
         if return_code == 0:
             print("\nCDK stack deployed successfully.")
-            return ''.join(output)
+            return stack_outputs.get_stack_outputs(workshop_name, params['AWSRegion'])
         else:
             print("\nCDK stack deployment failed.")
             return None
@@ -164,65 +193,162 @@ def destroy_cdk_stack(stack_name, workshop_name):
 
         if return_code == 0:
             print(f"\nCDK stack {stack_name} destroyed successfully.")
-        else:
-            print(f"\nCDK stack {stack_name} destroy failed.")
+            return True
+        print(f"\nCDK stack {stack_name} destroy failed.")
 
     except subprocess.CalledProcessError as e:
         print(f"Error destroying CDK stack {stack_name}: {e}")
+    return False
 
-def extract_outputs(deploy_output):
-    """Extract important outputs from CDK deployment."""
-    cognito_domain_id = None
-    sagemaker_id = None
-    hosted_uri = None
-
-    cognito_regex = r"WorkshopDeploymentStack\.CognitoUserPoolID\s+=\s+(.*)"
-    sagemaker_regex = r"WorkshopDeploymentStack\.SageMakerDomainID\s+=\s+(.*)"
-    hosted_uri_regex = r"WorkshopDeploymentStack\.HostedUIUrl\s+=\s+(.*)"
-
-    cognito_match = re.search(cognito_regex, deploy_output)
-    sagemaker_match = re.search(sagemaker_regex, deploy_output)
-    hosted_uri_match = re.search(hosted_uri_regex, deploy_output)
-
-    if cognito_match:
-        cognito_domain_id = cognito_match.group(1).strip()
-    else:
-        print("Failed to find Cognito Domain ID in the CDK deploy output.")
-
-    if sagemaker_match:
-        sagemaker_id = sagemaker_match.group(1).strip()
-    else:
-        print("Failed to find SageMaker ID in the CDK deploy output.")
-
-    if hosted_uri_match:
-        hosted_uri = hosted_uri_match.group(1).strip()
-    else:
-        print("Failed to find Hosted URI in the CDK deploy output.")
+def vpc_endpoint_parameters(params):
+    """
+    Return the stack parameters that create S3, SageMaker API/runtime and STS
+    endpoints in the workshop VPC, or {} if the VPC cannot take them.
+    """
+    ec2_client = aws_clients.get_client('ec2', params['AWSRegion'])
+    vpc_id = params['VPCID']
+    services = [f"com.amazonaws.{params['AWSRegion']}.{service}"
+                for service in ['s3'] + list(INTERFACE_ENDPOINT_SERVICES.values())]
+    existing = ec2_client.describe_vpc_endpoints(Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]},
+                                                          {'Name': 'service-name', 'Values': services}])['VpcEndpoints']
+    if existing:
+        print(f"VPC {vpc_id} already has endpoints for {', '.join(sorted({e['ServiceName'] for e in existing}))}; "
+              "skipping VPC endpoints.")
+        return {}
+
+    subnets = ec2_client.describe_subnets(SubnetIds=params['SubnetIDs'])['Subnets']
+    if len({subnet['AvailabilityZone'] for subnet in subnets}) != len(subnets):
+        print("Interface endpoints take one subnet per availability zone; skipping VPC endpoints.")
+        return {}
+
+    route_table_ids = {}
+    for route_table in ec2_client.describe_route_tables(
+            Filters=[{'Name': 'association.subnet-id', 'Values': params['SubnetIDs']}])['RouteTables']:
+        for association in route_table.get('Associations', []):
+            if association.get('SubnetId') in params['SubnetIDs']:
+                route_table_ids[association['SubnetId']] = route_table['RouteTableId']
+    if len(route_table_ids) < len(subnets):
+        # Only subnets without an explicit association use the VPC's main route table
+        main = ec2_client.describe_route_tables(
+            Filters=[{'Name': 'vpc-id', 'Values': [vpc_id]}, {'Name': 'association.main', 'Values': ['true']}])['RouteTables']
+        for subnet in subnets:
+            route_table_ids.setdefault(subnet['SubnetId'], main[0]['RouteTableId'])
+    vpc = ec2_client.describe_vpcs(VpcIds=[vpc_id])['Vpcs'][0]
+    return {
+        'VpcEndpoints': 'true',
+        'VpcCidr': vpc['CidrBlock'],
+        'RouteTableIDs': ','.join(sorted(set(route_table_ids.values()))),
+    }
 
-    return cognito_domain_id, sagemaker_id, hosted_uri
+def extract_outputs(outputs):
+    """Extract important outputs from the stack's outputs."""
+    cognito_domain_id, sagemaker_id, hosted_uri, import_role_arn = stack_outputs.workshop_outputs(outputs)
 
-def execute_script(script_name, *args):
-    try:
-        # Convert all args to strings to avoid TypeError
-        str_args = [str(arg) for arg in args]
-        
-        with tqdm(total=0, desc=f"Running {script_name}", bar_format='{desc}: {elapsed}') as pbar:
-            result = subprocess.Popen([sys.executable, script_name, *str_args], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    if not cognito_domain_id:
+        print("Failed to find Cognito Domain ID in the stack outputs.")
+    if not sagemaker_id:
+        print("Failed to find SageMaker ID in the stack outputs.")
+    if not hosted_uri:
+        print("Failed to find Hosted URI in the stack outputs.")
 
-            while result.poll() is None:
-                pbar.update(1)
-                time.sleep(1)
+    return cognito_domain_id, sagemaker_id, hosted_uri, import_role_arn
 
-        stdout, stderr = result.communicate()
+def build_workshop(parameters, workshop_name, num_users, num_spares=0, storage_mode='bucket', seed_source=None,
+                   cache_source=None, deploy_method='cdk', lazy=False, max_workers=DEFAULT_MAX_WORKERS, output_dir=None,
+                   first_user_number=1, encryption=False, expiration_days=None):
+    """
+    Deploy a workshop's stack and provision its users, without prompting.
+    Usernames are numbered from `first_user_number`. Buckets are encrypted
+    with `encryption` and expire their objects after `expiration_days`.
 
-        if result.returncode == 0:
-            print(f"\n{script_name} completed successfully.")
-            print(stdout)
+    Returns a report dict with the workshop's status ('ready', 'deploy failed'
+    or 'provisioning failed'), stack name, deploy method and user counts.
+    """
+    region = parameters['AWSRegion']
+    report = {'workshop': workshop_name, 'region': region, 'status': 'deploy failed', 'stack_name': None,
+              'deploy_method': deploy_method, 'requested_users': num_users, 'users': 0, 'spares': 0}
+    shared_bucket_name = None
+    if storage_mode == 'shared':
+        shared_bucket_name = create_s3_buckets.generate_shared_bucket_name(workshop_name.lower())
+    user_bucket_prefix = None
+    if lazy:
+        parameters['LazyProvisioning'] = 'true'
+        if not shared_bucket_name:
+            # The login Lambda creates <prefix>-<user number> buckets, so the name is chosen now
+            user_bucket_prefix = create_s3_buckets.generate_bucket_prefix(workshop_name.lower())
+            parameters['UserBucketPrefix'] = user_bucket_prefix
+            parameters['BucketEncryption'] = 'true' if encryption else 'false'
+            parameters['BucketExpirationDays'] = str(expiration_days or 0)
+    packages = shared_cache.workshop_packages()
+    if packages or cache_source:
+        parameters['SharedCache'] = 'true'
+
+    stack_name = f"{workshop_name}-WorkshopDeploymentStack"
+    outputs = None
+    if deploy_method == 'pool' and shared_bucket_name:
+        print("Warm pool stacks use per-user buckets; deploying from the published template instead.")
+        deploy_method = 'template'
+    if deploy_method == 'pool':
+        overrides = {key: parameters[key] for key in template_deploy.OPTIONAL_PARAMETERS if key in parameters}
+        stack_name, outputs = warm_pool.claim_stack(workshop_name, region, overrides)
+        if outputs:
+            # Start replacing the claimed stack; the creates run in the background, without this workshop's settings
+            warm_pool.fill_pool({key: parameters[key] for key in template_deploy.BASE_PARAMETERS})
         else:
-            print(f"\n{script_name} execution failed.")
-            print(stderr)
-    except subprocess.CalledProcessError as e:
-        print(f"Script execution error: {e}")
+            print("No warm pool stack is available; deploying from the published template instead.")
+            deploy_method = 'template'
+    if deploy_method == 'template':
+        outputs = template_deploy.create_workshop_stack(parameters, workshop_name, shared_bucket_name)
+    elif deploy_method == 'cdk':
+        outputs = deploy_cdk_stack(parameters, workshop_name, shared_bucket_name, output_dir)
+    report.update(stack_name=stack_name, deploy_method=deploy_method)
+
+    if not outputs:
+        print("CDK deployment failed. Exiting.")
+        return report
+    cognito_domain_id, sagemaker_id, hosted_uri, import_role_arn = extract_outputs(outputs)
+    if not (cognito_domain_id and sagemaker_id and hosted_uri):
+        print("Failed to extract Cognito Domain ID and/or SageMaker ID from the stack outputs.")
+        return report
+    # Workshops sharing the VPC depend on the endpoints in this stack (see vpc_endpoint_dependents)
+    state_store.get_store().save_workshop(workshop_name, region=region, vpc_id=parameters['VPCID'],
+                                          vpc_endpoints=parameters.get('VpcEndpoints') == 'true')
+
+    if num_users < BULK_IMPORT_MIN_USERS:
+        import_role_arn = None
+    engine = WorkshopEngine(region, max_workers)
+    results = create_workshop(engine, workshop_name, num_users, cognito_domain_id, sagemaker_id, hosted_uri,
+                              import_role_arn, shared_bucket_name, seed_source, num_spares=num_spares,
+                              lazy=lazy, user_bucket_prefix=user_bucket_prefix, first_user_number=first_user_number,
+                              encryption=encryption, expiration_days=expiration_days)
+    if packages or cache_source:
+        engine.run_stage("Filling the shared cache", shared_cache.fill_workshop_cache, engine,
+                         workshop_name, packages, cache_source or None)
+    engine.log_metrics()
+    if shared_bucket_name:
+        print(f"Users store data under s3://{shared_bucket_name}/<username>/")
+    print(f'View {workshop_name}-users.csv file for sign in information')
+
+    report['users'] = len(results['users']) if results else 0
+    report['spares'] = len(results.get('spares') or []) if results else 0
+    report['status'] = 'ready' if report['users'] == num_users else 'provisioning failed'
+    return report
+
+def select_storage_mode():
+    """Ask whether users get their own bucket or a prefix in one shared bucket."""
+    while True:
+        mode = input("Storage mode: one bucket per user, or one shared bucket with a prefix per user? (bucket/shared) [bucket]: ").strip().lower()
+        if mode in ['bucket', 'shared', '']:
+            return mode or 'bucket'
+        print("Invalid storage mode. Please enter 'bucket' or 'shared'.")
+
+def select_deploy_method():
+    """Ask whether to deploy with cdk, create the stack from the published template, or claim a warm pool stack."""
+    while True:
+        method = input("Deploy method: cdk deploy, CloudFormation from the published template, or claim a warm pool stack? (cdk/template/pool) [cdk]: ").strip().lower()
+        if method in ['cdk', 'template', 'pool', '']:
+            return method or 'cdk'
+        print("Invalid deploy method. Please enter 'cdk', 'template' or 'pool'.")
 
 def select_csv_file(region):
     """Select a CSV file for an existing workshop in the given region."""
@@ -231,6 +357,7 @@ def select_csv_file(region):
         print("No existing workshops found.")
         return None
 
+    cognito = aws_clients.get_client('cognito-idp', region)
     valid_files = []
     for file in csv_files:
         try:
@@ -242,7 +369,6 @@ def select_csv_file(region):
                 user_pool_id = next(reader)[1]  # Extract User Pool ID from the second row
 
             # Check if the user pool ID exists in the current AWS account
-            cognito = boto3.client('cognito-idp', region_name=region)
             try:
                 cognito.describe_user_pool(UserPoolId=user_pool_id)
                 valid_files.append(file)
@@ -262,6 +388,34 @@ def select_csv_file(region):
     file_index = int(input("Choose a CSV file (enter number): ")) - 1
     return valid_files[file_index]
     
+def select_checkpoint_file():
+    """Select a workshop whose create was interrupted."""
+    checkpoint_files = sorted(glob.glob("*-checkpoint.jsonl"))
+    if not checkpoint_files:
+        print("No interrupted workshops to resume.")
+        return None
+
+    print("Workshops that can be resumed:")
+    for index, file in enumerate(checkpoint_files, start=1):
+        print(f"{index}. {file}")
+
+    file_index = int(input("Choose a checkpoint file (enter number): ")) - 1
+    return checkpoint_files[file_index]
+
+def select_failures_file():
+    """Select a workshop with failed operations waiting to be retried."""
+    failure_files = sorted(glob.glob("*-failures.json"))
+    if not failure_files:
+        print("No failed operations to retry.")
+        return None
+
+    print("Workshops with failed operations:")
+    for index, file in enumerate(failure_files, start=1):
+        print(f"{index}. {file}")
+
+    file_index = int(input("Choose a failures file (enter number): ")) - 1
+    return failure_files[file_index]
+
 def extract_stack_name_from_csv(csv_file):
     """Extract the stack name from the CSV file name."""
     stack_name = csv_file.split('-users.csv')[0]
@@ -275,9 +429,11 @@ def count_csv_rows(csv_file):
     return num_rows
 
 def get_existing_workshop_names():
-    """Get a list of existing workshop names from CSV files."""
+    """Get a list of existing workshop names from the state store and CSV files."""
     csv_files = glob.glob("*-users.csv")
-    return [os.path.splitext(file)[0].replace('-users', '') for file in csv_files]
+    names = {os.path.splitext(file)[0].replace('-users', '') for file in csv_files}
+    names.update(workshop['name'] for workshop in state_store.get_store().list_workshops())
+    return sorted(names)
 
 def is_valid_workshop_name(name):
     """
@@ -317,74 +473,120 @@ if __name__ == "__main__":
     region = set_aws_region()
 
     while True:
-        action = input("Would you like to create, update, or destroy a workshop? (create/update/destroy) [create]: ").strip().lower()
-        if action in ['create', 'update', 'destroy', '']:
+        action = input("Would you like to create, resume, update, destroy, retry or pre-warm a workshop, or hand out a spare seat? (create/resume/update/destroy/retry/prewarm/seat) [create]: ").strip().lower()
+        if action in ['create', 'resume', 'update', 'destroy', 'retry', 'prewarm', 'seat', '']:
             if action == '':
                 action = 'create'
             break
         else:
-            print("Invalid action. Please enter 'create', 'update', or 'destroy'.")
+            print("Invalid action. Please enter 'create', 'resume', 'update', 'destroy', 'retry', 'prewarm', or 'seat'.")
 
     if action == 'create':
         parameters = gather_parameters(region)
+        if input("Create VPC endpoints for S3, SageMaker and STS so notebook traffic skips NAT? (yes/no) [no]: ").strip().lower() in ['yes', 'y']:
+            parameters.update(vpc_endpoint_parameters(parameters))
         num_users = input("Enter the number of users to create: ").strip()
+        num_spares = int(input("Enter the number of spare seats to keep ready for late joiners [0]: ").strip() or 0)
+        storage_mode = select_storage_mode()
+        seed_source = input("Seed course data from an s3:// prefix or local directory (leave blank to skip): ").strip()
+        cache_source = input("Cache read-only datasets on the shared EFS from an s3:// prefix or local directory (leave blank to skip): ").strip()
+        deploy_method = select_deploy_method()
+        lazy = input("Create SageMaker profiles and buckets on each user's first login instead of up front? (yes/no) [no]: ").strip().lower() in ['yes', 'y']
+        encryption = input("Turn on default SSE-S3 encryption for the workshop buckets? (yes/no) [no]: ").strip().lower() in ['yes', 'y']
+        expiration_days = input("Delete bucket objects after how many days? (leave blank to keep them): ").strip()
         workshop_name = get_unique_workshop_name()
-        
-        stack_name = f"{workshop_name}-WorkshopDeploymentStack"
-        
-        if not is_valid_workshop_name(stack_name):
-            print(f"Error: The resulting stack name '{stack_name}' is invalid. Please choose a shorter workshop name.")
+
+        if not is_valid_workshop_name(f"{workshop_name}-WorkshopDeploymentStack"):
+            print(f"Error: The resulting stack name '{workshop_name}-WorkshopDeploymentStack' is invalid. Please choose a shorter workshop name.")
             exit(1)
-        
-        deploy_output = deploy_cdk_stack(parameters, workshop_name)
-
-        if deploy_output:
-            cognito_domain_id, sagemaker_id, hosted_uri = extract_outputs(deploy_output)
-            if cognito_domain_id and sagemaker_id and hosted_uri:
-                print("Creating Cognito users...")
-                execute_script('create_cognito_users.py', num_users, cognito_domain_id, sagemaker_id, hosted_uri, region, workshop_name)
-                print("Creating Sagemaker Profiles...")
-                execute_script('create_sagemaker_profiles.py', region, workshop_name)
-                print("Creating S3 buckets...")
-                execute_script('create_s3_buckets.py', region, workshop_name, num_users)
-                print(f'View {workshop_name}-users.csv file for sign in information')
-            else:
-                print("Failed to extract Cognito Domain ID and/or SageMaker ID from the CDK deploy output.")
-        else:
-            print("CDK deployment failed. Exiting.")
+
+        build_workshop(parameters, workshop_name, int(num_users), num_spares, storage_mode, seed_source, cache_source,
+                       deploy_method, lazy, encryption=encryption,
+                       expiration_days=int(expiration_days) if expiration_days else None)
+
+    elif action == 'resume':
+        checkpoint_file = select_checkpoint_file()
+        if checkpoint_file:
+            progress = Checkpoint(checkpoint_file)
+            engine = WorkshopEngine(progress.settings['region'] if progress.settings else region)
+            if resume_workshop(engine, progress):
+                print(f"View {progress.settings['workshop_name']}-users.csv file for sign in information")
+            engine.log_metrics()
 
     elif action == 'update':
         csv_file = select_csv_file(region)
         if csv_file:
             num_new_users = int(input("Enter the number of new users to add: ").strip())
-            print("Adding new users...")
-            add_users(csv_file, num_new_users, region)
-            print(f"Successfully added {num_new_users} users to the workshop")
+            engine = WorkshopEngine(region)
+            results = update_workshop(engine, csv_file, num_new_users)
+            engine.log_metrics()
+            print(f"Successfully added {len(results['users']) if results else 0} of {num_new_users} users to the workshop")
             print(f"Updated user information available in {csv_file}")
 
     elif action == 'destroy':
         csv_file = select_csv_file(region)
+        dependents = (state_store.get_store().vpc_endpoint_dependents(state_store.workshop_name_from_csv(csv_file))
+                      if csv_file else [])
+        if dependents:
+            print(f"This workshop's stack owns the VPC endpoints that {', '.join(dependents)} also use. "
+                  "Destroying it deletes them; destroy those workshops first.")
+            if input("Destroy it anyway? (yes/no) [no]: ").strip().lower() not in ['yes', 'y']:
+                csv_file = None
         if csv_file:
-            workshop_name = extract_stack_name_from_csv(csv_file)
-            num_rows = count_csv_rows(csv_file)
-            num_users = num_rows - 4
-
-            print('Deleting spaces...')
-            execute_script('delete_spaces.py', csv_file, region)
-            print('Deleting Sagemaker users...')
-            execute_script('delete_sagemaker_profiles.py', csv_file, region)
-            print('Deleting Cognito users...')
-            execute_script('delete_cognito_users.py', csv_file, region)
-            print('Deleting S3 buckets...')
-            execute_script('delete_s3_buckets.py', region, workshop_name, num_users)
+            engine = WorkshopEngine(region)
+            remaining = destroy_workshop(engine, csv_file)
+            engine.log_metrics()
+            if remaining:
+                print(f"{remaining} teardown operations failed. Run the retry action once the cause is fixed.")
 
             stack_name = extract_stack_name_from_csv(csv_file)
             workshop_name = stack_name.split('-WorkshopDeploymentStack')[0]
-            
-            destroy_cdk_stack(stack_name, workshop_name)
+            workshop = state_store.get_store().get_workshop(workshop_name) or {}
+            shared_cache.remove_cache_access(engine, workshop_name)
+
+            if (workshop.get('stack_name') or '').startswith(warm_pool.POOL_PREFIX):
+                destroyed = template_deploy.delete_stack(workshop['stack_name'], region)
+            else:
+                destroyed = destroy_cdk_stack(stack_name, workshop_name)
+            if destroyed and not remaining:
+                state_store.get_store().delete_workshop(workshop_name)
+                if os.path.exists(stack_outputs.outputs_file(workshop_name)):
+                    os.remove(stack_outputs.outputs_file(workshop_name))
 
             try:
                 os.remove(csv_file)
                 print(f"Deleted the file: {csv_file}")
             except Exception as e:
-                print(f"Failed to delete the file {csv_file}: {e}")
\ No newline at end of file
+                print(f"Failed to delete the file {csv_file}: {e}")
+
+    elif action == 'prewarm':
+        csv_file = select_csv_file(region)
+        if csv_file:
+            engine = WorkshopEngine(region)
+            workshop_name = record_workshop(engine, csv_file)
+            start_at = input("Start time to pre-warm at, e.g. 2024-05-01T08:30 (leave blank to start now): ").strip()
+            prewarm_spaces.main(workshop_name, region, datetime.fromisoformat(start_at) if start_at else None)
+            engine.log_metrics()
+
+    elif action == 'seat':
+        csv_file = select_csv_file(region)
+        if csv_file:
+            workshop_name = state_store.workshop_name_from_csv(csv_file)
+            engine = WorkshopEngine(region)
+            record_workshop(engine, csv_file)
+            seat = spare_seats.claim_seat(workshop_name)
+            if seat:
+                print(f"Username: {seat[0]}")
+                print(f"Password: {seat[1]}", flush=True)
+            print("Refilling spare seats in the background...", flush=True)
+            spare_seats.refill_in_background(engine, workshop_name).join()
+            engine.log_metrics()
+
+    elif action == 'retry':
+        failures_file = select_failures_file()
+        if failures_file:
+            remaining = retry_failures.main(failures_file)
+            if remaining:
+                print(f"{remaining} operations are still failing. Details are in {failures_file}")
+            else:
+                print("All failed operations succeeded.")
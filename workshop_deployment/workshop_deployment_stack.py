@@ -1,14 +1,18 @@
-import random
-import string
 from aws_cdk import (
     Stack,
+    Fn,
     aws_lambda as _lambda,
     aws_apigatewayv2 as apigatewayv2,
     aws_apigatewayv2_integrations as apigatewayv2_integrations,
     aws_cognito as cognito,
+    aws_ec2 as ec2,
+    aws_efs as efs,
     aws_iam as iam,
+    aws_s3 as s3,
     aws_sagemaker as sagemaker,
+    CfnCondition,
     CfnParameter,
+    CfnResource,
     CfnOutput,
     App,
     Duration,
@@ -17,17 +21,81 @@ from aws_cdk import (
 )
 from constructs import Construct
 from datetime import datetime
+import base64
+import shlex
+
+def read_package_manifest(path):
+    """Read a requirements-style package manifest, skipping blank lines and comments."""
+    with open(path, 'r') as f:
+        lines = [line.split('#', 1)[0].strip() for line in f]
+    return [line for line in lines if line]
+
+# Interface endpoints created with VpcEndpoints=true, alongside the S3 gateway endpoint
+INTERFACE_ENDPOINT_SERVICES = {
+    "SageMakerApiEndpoint": "sagemaker.api",
+    "SageMakerRuntimeEndpoint": "sagemaker.runtime",
+    "StsEndpoint": "sts",
+}
+
+# The shared cache lives in this directory of the domain's home EFS, and is
+# mounted in JupyterLab apps under /mnt/custom-file-systems/efs/<file system ID>
+CACHE_DIRECTORY = "/workshop-cache"
+CACHE_MARKER = ".workshop-cache"
+
+def lifecycle_script(packages=None):
+    """
+    The JupyterLab lifecycle script run when an app starts. It points pip and
+    ~/datasets at the shared cache when one is mounted, then installs the
+    workshop packages, from the cache's wheelhouse if it has them. A failed
+    install is only reported, since a failing script stops JupyterLab from starting.
+    """
+    lines = [
+        "#!/bin/bash",
+        "set -eux",
+        f"MARKER=$(ls /mnt/custom-file-systems/efs/*/{CACHE_MARKER} 2>/dev/null | head -n 1 || true)",
+        'if [ -n "$MARKER" ]; then',
+        '    CACHE=$(dirname "$MARKER")',
+        '    pip config --user set global.find-links "$CACHE/wheelhouse"',
+        '    ln -sfn "$CACHE/datasets" "$HOME/datasets"',
+        "fi",
+    ]
+    if packages:
+        quoted = ' '.join(shlex.quote(package) for package in packages)
+        lines.append(f"pip install --quiet --no-index {quoted} || pip install --quiet {quoted} "
+                     "|| echo 'workshop package install failed' >&2")
+    return "\n".join(lines + [""])
 
 class WorkshopDeploymentStack(Stack):
 
-    def __init__(self, scope: Construct, id: str, workshop_name: str, **kwargs) -> None:
+    def __init__(self, scope: Construct, id: str, workshop_name: str = None, shared_bucket_name: str = None,
+                 shared_storage: bool = False, packages: list = None, **kwargs) -> None:
+        """
+        Without a workshop_name the stack is a reusable template: the workshop
+        name (and, with shared_storage, the shared bucket name) become
+        CloudFormation parameters, and tags are applied by create_stack.
+
+        `packages` (from a workshop package manifest) are installed by a
+        domain-default JupyterLab lifecycle configuration, built once at deploy time.
+        The same lifecycle configuration wires up the shared cache that
+        shared_cache.py fills through the CacheFill Lambda, which is only
+        created with SharedCache=true.
+        """
         super().__init__(scope, id, **kwargs)
 
-        # Get the current date
-        creation_date = datetime.now().strftime("%Y-%m-%d")
-        # Add the workshop name as a tag to all resources in this stack
-        Tags.of(self).add("workshop", workshop_name)
-        Tags.of(self).add("creation-date", creation_date)
+        if workshop_name is None:
+            workshop_name = CfnParameter(self, "WorkshopName",
+                                         type="String",
+                                         description="The workshop name, used as the SageMaker domain name").value_as_string
+            if shared_storage:
+                shared_bucket_name = CfnParameter(self, "SharedBucket",
+                                                  type="String",
+                                                  description="The shared workshop bucket").value_as_string
+        else:
+            # Get the current date
+            creation_date = datetime.now().strftime("%Y-%m-%d")
+            # Add the workshop name as a tag to all resources in this stack
+            Tags.of(self).add("workshop", workshop_name)
+            Tags.of(self).add("creation-date", creation_date)
 
         # Parameters
         region_param = CfnParameter(self, "AWSRegion",
@@ -39,6 +107,68 @@ class WorkshopDeploymentStack(Stack):
         subnet_ids_param = CfnParameter(self, "SubnetIDs",
                                         type="List<String>",
                                         description="The Subnet IDs for the SageMaker Domain")
+        lazy_provisioning_param = CfnParameter(self, "LazyProvisioning",
+                                               type="String",
+                                               allowed_values=["true", "false"],
+                                               default="false",
+                                               description="Create user profiles and buckets on first login")
+        user_bucket_prefix_param = CfnParameter(self, "UserBucketPrefix",
+                                                type="String",
+                                                default="",
+                                                description="With lazy provisioning, create <prefix>-<user number> buckets on first login")
+        bucket_encryption_param = CfnParameter(self, "BucketEncryption",
+                                               type="String",
+                                               allowed_values=["true", "false"],
+                                               default="false",
+                                               description="With lazy provisioning, turn on SSE-S3 default encryption for new user buckets")
+        bucket_expiration_days_param = CfnParameter(self, "BucketExpirationDays",
+                                                    type="Number",
+                                                    default=0,
+                                                    description="With lazy provisioning, expire objects in new user buckets after this many days (0 keeps them)")
+        vpc_endpoints_param = CfnParameter(self, "VpcEndpoints",
+                                           type="String",
+                                           allowed_values=["true", "false"],
+                                           default="false",
+                                           description="Create S3, SageMaker API/runtime and STS endpoints in the VPC")
+        vpc_cidr_param = CfnParameter(self, "VpcCidr",
+                                      type="String",
+                                      default="",
+                                      description="With VPC endpoints, the VPC CIDR allowed to reach the interface endpoints")
+        route_table_ids_param = CfnParameter(self, "RouteTableIDs",
+                                             type="CommaDelimitedList",
+                                             default="",
+                                             description="With VPC endpoints, the route tables of the subnets, for the S3 gateway endpoint")
+        shared_cache_param = CfnParameter(self, "SharedCache",
+                                          type="String",
+                                          allowed_values=["true", "false"],
+                                          default="false",
+                                          description="Create the Lambda, access point and staging bucket that fill the shared cache")
+
+        # VPC endpoints, so notebook traffic to S3 and SageMaker does not go through NAT
+        vpc_endpoints = CfnCondition(self, "CreateVpcEndpoints",
+                                     expression=Fn.condition_equals(vpc_endpoints_param.value_as_string, "true"))
+        s3_endpoint = ec2.CfnVPCEndpoint(self, "S3GatewayEndpoint",
+                                         vpc_id=vpc_id_param.value_as_string,
+                                         service_name=f"com.amazonaws.{self.region}.s3",
+                                         vpc_endpoint_type="Gateway",
+                                         route_table_ids=route_table_ids_param.value_as_list)
+        s3_endpoint.cfn_options.condition = vpc_endpoints
+        endpoint_security_group = ec2.CfnSecurityGroup(self, "VpcEndpointSecurityGroup",
+                                                       group_description="HTTPS from the workshop VPC to its endpoints",
+                                                       vpc_id=vpc_id_param.value_as_string,
+                                                       security_group_ingress=[ec2.CfnSecurityGroup.IngressProperty(
+                                                           ip_protocol="tcp", from_port=443, to_port=443,
+                                                           cidr_ip=vpc_cidr_param.value_as_string)])
+        endpoint_security_group.cfn_options.condition = vpc_endpoints
+        for endpoint_id, service in INTERFACE_ENDPOINT_SERVICES.items():
+            endpoint = ec2.CfnVPCEndpoint(self, endpoint_id,
+                                          vpc_id=vpc_id_param.value_as_string,
+                                          service_name=f"com.amazonaws.{self.region}.{service}",
+                                          vpc_endpoint_type="Interface",
+                                          subnet_ids=subnet_ids_param.value_as_list,
+                                          security_group_ids=[endpoint_security_group.attr_group_id],
+                                          private_dns_enabled=True)
+            endpoint.cfn_options.condition = vpc_endpoints
 
         # Lambda Layer
         requests_layer = _lambda.LayerVersion(self, "RequestsLayer",
@@ -56,9 +186,9 @@ class WorkshopDeploymentStack(Stack):
                                      sign_in_aliases=cognito.SignInAliases(username=True))
         user_pool.apply_removal_policy(RemovalPolicy.DESTROY)
 
-        # Generate a random string for the domain prefix
-        random_string = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
-        user_pool_domain_prefix = f"workshop-domain-{random_string}"
+        # Derive a unique domain prefix from the stack's ID, so one template serves every workshop
+        stack_uuid = Fn.select(2, Fn.split("/", self.stack_id))
+        user_pool_domain_prefix = f"workshop-{stack_uuid}"
 
         # Cognito User Pool Domain
         user_pool_domain = cognito.UserPoolDomain(self, "UserPoolDomain",
@@ -79,6 +209,20 @@ class WorkshopDeploymentStack(Stack):
                                                       callback_urls=[f"{api.url}invoke"]
                                                   ))
 
+        # Role Cognito assumes to write logs for bulk user import jobs
+        user_import_role = iam.Role(self, "CognitoUserImportRole",
+                                    assumed_by=iam.ServicePrincipal("cognito-idp.amazonaws.com"))
+        user_import_role.add_to_policy(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=[
+                "logs:CreateLogGroup",
+                "logs:CreateLogStream",
+                "logs:DescribeLogStreams",
+                "logs:PutLogEvents"
+            ],
+            resources=[f"arn:aws:logs:{self.region}:{self.account}:log-group:/aws/cognito/*"]
+        ))
+
         # Identity Pool
         identity_pool = cognito.CfnIdentityPool(self, "IdentityPool",
                                                 allow_unauthenticated_identities=False,
@@ -103,6 +247,12 @@ class WorkshopDeploymentStack(Stack):
                 iam.ServicePrincipal("sagemaker.amazonaws.com")
             )
         )
+        # SageMaker sets the user profile name as the source identity when it assumes the role
+        authenticated_role.assume_role_policy.add_statements(iam.PolicyStatement(
+            effect=iam.Effect.ALLOW,
+            actions=["sts:SetSourceIdentity"],
+            principals=[iam.ServicePrincipal("sagemaker.amazonaws.com")]
+        ))
 
         # Attach policies to the role
         authenticated_role.add_managed_policy(iam.ManagedPolicy.from_aws_managed_policy_name('AmazonSageMakerFullAccess'))
@@ -114,11 +264,44 @@ class WorkshopDeploymentStack(Stack):
             resources=["*"]
         ))
 
+        # Shared storage mode: one workshop bucket, each user limited to their own prefix.
+        # SageMaker sets the source identity to the user profile name (see domain settings below).
+        if shared_bucket_name:
+            authenticated_role.add_to_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["s3:ListBucket"],
+                resources=[f"arn:aws:s3:::{shared_bucket_name}"],
+                conditions={
+                    "StringLike": {
+                        "s3:prefix": ["${aws:SourceIdentity}", "${aws:SourceIdentity}/*"]
+                    }
+                }
+            ))
+            authenticated_role.add_to_policy(iam.PolicyStatement(
+                effect=iam.Effect.ALLOW,
+                actions=["s3:GetObject", "s3:PutObject", "s3:DeleteObject"],
+                resources=[f"arn:aws:s3:::{shared_bucket_name}/${{aws:SourceIdentity}}/*"]
+            ))
+
         # Attach the role to the Identity Pool
         cognito.CfnIdentityPoolRoleAttachment(self, "IdentityPoolRoleAttachment",
                                               identity_pool_id=identity_pool.ref,
                                               roles={"authenticated": authenticated_role.role_arn})
 
+        # Shared cache setup and workshop packages, run by default whenever a JupyterLab app starts
+        lifecycle_config = sagemaker.CfnStudioLifecycleConfig(
+            self, "JupyterLabLifecycleConfig",
+            studio_lifecycle_config_app_type="JupyterLab",
+            studio_lifecycle_config_content=base64.b64encode(lifecycle_script(packages).encode()).decode(),
+            studio_lifecycle_config_name=Fn.join("-", ["workshop-setup", Fn.select(0, Fn.split("-", stack_uuid))])
+        )
+        jupyter_lab_app_settings = sagemaker.CfnDomain.JupyterLabAppSettingsProperty(
+            default_resource_spec=sagemaker.CfnDomain.ResourceSpecProperty(
+                lifecycle_config_arn=lifecycle_config.attr_studio_lifecycle_config_arn
+            ),
+            lifecycle_config_arns=[lifecycle_config.attr_studio_lifecycle_config_arn]
+        )
+
         # SageMaker Domain
         sagemaker_domain = sagemaker.CfnDomain(self, "SageMakerWorkshop",
                                                auth_mode="IAM",
@@ -126,7 +309,15 @@ class WorkshopDeploymentStack(Stack):
                                                    execution_role=authenticated_role.role_arn,
                                                    studio_web_portal="ENABLED",
                                                    default_landing_uri="studio::",
+                                                   jupyter_lab_app_settings=jupyter_lab_app_settings,
+                                               ),
+                                               default_space_settings=sagemaker.CfnDomain.DefaultSpaceSettingsProperty(
+                                                   execution_role=authenticated_role.role_arn,
+                                                   jupyter_lab_app_settings=jupyter_lab_app_settings,
                                                ),
+                                               domain_settings=sagemaker.CfnDomain.DomainSettingsProperty(
+                                                   execution_role_identity_config="USER_PROFILE_NAME"
+                                               ) if shared_bucket_name else None,
                                                domain_name=workshop_name,
                                                subnet_ids=subnet_ids_param.value_as_list,
                                                vpc_id=vpc_id_param.value_as_string)
@@ -137,7 +328,8 @@ class WorkshopDeploymentStack(Stack):
                                            handler="index.lambda_handler",
                                            code=_lambda.Code.from_asset("lambda"),
                                            layers=[requests_layer],
-                                           timeout=Duration.seconds(10),
+                                           # Lazy provisioning waits for new profiles, up to API Gateway's 30s limit
+                                           timeout=Duration.seconds(29),
                                            environment={
                                                'CLIENT_ID': user_pool_client.user_pool_client_id,
                                                'COGNITO_DOMAIN': f"{user_pool_domain_prefix}.auth.{region_param.value_as_string}.amazoncognito.com",
@@ -146,6 +338,11 @@ class WorkshopDeploymentStack(Stack):
                                                'STUDIO_DOMAIN_ID': sagemaker_domain.attr_domain_id,
                                                'USER_POOL_ID': user_pool.user_pool_id,
                                                'REDIRECT_URI': f"{api.url}invoke",
+                                               'LAZY_PROVISIONING': lazy_provisioning_param.value_as_string,
+                                               'USER_BUCKET_PREFIX': user_bucket_prefix_param.value_as_string,
+                                               'BUCKET_ENCRYPTION': bucket_encryption_param.value_as_string,
+                                               'BUCKET_EXPIRATION_DAYS': bucket_expiration_days_param.value_as_string,
+                                               'WORKSHOP_NAME': workshop_name,
                                            })
 
         # Add necessary IAM policy statement to the Lambda role
@@ -154,9 +351,90 @@ class WorkshopDeploymentStack(Stack):
             resources=["*"]
         ))
 
+        # Lazy provisioning: profiles in this domain, and buckets under the user bucket prefix.
+        # Only granted when the stack is deployed with LazyProvisioning=true.
+        lazy_provisioning = CfnCondition(self, "LazyProvisioningEnabled",
+                                         expression=Fn.condition_equals(lazy_provisioning_param.value_as_string, "true"))
+        lazy_provisioning_policy = iam.Policy(self, "LazyProvisioningPolicy",
+                                              roles=[lambda_redirect.role],
+                                              statements=[
+                                                  iam.PolicyStatement(
+                                                      actions=["sagemaker:CreateUserProfile",
+                                                               "sagemaker:DescribeUserProfile", "sagemaker:AddTags"],
+                                                      resources=[f"arn:aws:sagemaker:{self.region}:{self.account}:user-profile/{sagemaker_domain.attr_domain_id}/*"]
+                                                  ),
+                                                  iam.PolicyStatement(
+                                                      actions=["s3:CreateBucket", "s3:PutBucketTagging",
+                                                               "s3:PutEncryptionConfiguration",
+                                                               "s3:PutLifecycleConfiguration"],
+                                                      resources=[f"arn:aws:s3:::{user_bucket_prefix_param.value_as_string}-*"]
+                                                  ),
+                                              ])
+        lazy_provisioning_policy.node.default_child.cfn_options.condition = lazy_provisioning
+
         # Output the Lambda function ARN
         CfnOutput(self, "LambdaFunctionArn", value=lambda_redirect.function_arn)
 
+        # Shared cache: files staged in S3 are copied once into a root-owned,
+        # read-only directory of the domain's home EFS by a Lambda in the workshop VPC.
+        # Its network interfaces slow down stack deletes, so it is only created when asked for.
+        shared_cache = CfnCondition(self, "CreateSharedCache",
+                                    expression=Fn.condition_equals(shared_cache_param.value_as_string, "true"))
+        cache_staging_bucket = s3.Bucket(self, "CacheStagingBucket",
+                                         removal_policy=RemovalPolicy.DESTROY,
+                                         auto_delete_objects=True,
+                                         block_public_access=s3.BlockPublicAccess.BLOCK_ALL)
+        cache_access_point = efs.CfnAccessPoint(self, "CacheAccessPoint",
+                                                file_system_id=sagemaker_domain.attr_home_efs_file_system_id,
+                                                posix_user=efs.CfnAccessPoint.PosixUserProperty(uid="0", gid="0"),
+                                                root_directory=efs.CfnAccessPoint.RootDirectoryProperty(
+                                                    path=CACHE_DIRECTORY,
+                                                    creation_info=efs.CfnAccessPoint.CreationInfoProperty(
+                                                        owner_uid="0", owner_gid="0", permissions="755")
+                                                ))
+        # shared_cache.py allows NFS from this group on the domain's EFS mount targets
+        cache_fill_security_group = ec2.CfnSecurityGroup(self, "CacheFillSecurityGroup",
+                                                         group_description="Workshop shared cache fill Lambda",
+                                                         vpc_id=vpc_id_param.value_as_string)
+        cache_fill = _lambda.Function(self, "CacheFill",
+                                      runtime=_lambda.Runtime.PYTHON_3_12,
+                                      handler="index.lambda_handler",
+                                      code=_lambda.Code.from_asset("cache_lambda"),
+                                      timeout=Duration.minutes(15),
+                                      memory_size=1769,
+                                      environment={
+                                          'STAGING_BUCKET': cache_staging_bucket.bucket_name,
+                                          'CACHE_MOUNT_PATH': "/mnt/cache",
+                                          'CACHE_MARKER': CACHE_MARKER,
+                                      })
+        # The subnets are a list parameter, so the VPC and EFS settings are set on the CloudFormation resource
+        cfn_cache_fill = cache_fill.node.default_child
+        cfn_cache_fill.add_property_override("VpcConfig", {
+            "SubnetIds": subnet_ids_param.value_as_list,
+            "SecurityGroupIds": [cache_fill_security_group.attr_group_id],
+        })
+        cfn_cache_fill.add_property_override("FileSystemConfigs", [{
+            "Arn": cache_access_point.attr_arn,
+            "LocalMountPath": "/mnt/cache",
+        }])
+        cache_fill.role.add_managed_policy(
+            iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSLambdaVPCAccessExecutionRole"))
+        cache_fill.add_to_role_policy(iam.PolicyStatement(
+            actions=["elasticfilesystem:ClientMount", "elasticfilesystem:ClientWrite", "elasticfilesystem:ClientRootAccess"],
+            resources=[f"arn:aws:elasticfilesystem:{self.region}:{self.account}:file-system/{sagemaker_domain.attr_home_efs_file_system_id}"]
+        ))
+        cache_staging_bucket.grant_read(cache_fill)
+        # The bucket's auto-delete provider is a stack-level singleton, used only by this bucket
+        auto_delete_provider = self.node.find_child("Custom::S3AutoDeleteObjectsCustomResourceProvider")
+        for construct in (cache_staging_bucket, auto_delete_provider, cache_access_point, cache_fill_security_group,
+                          cache_fill):
+            for child in construct.node.find_all():
+                if isinstance(child, CfnResource):
+                    child.cfn_options.condition = shared_cache
+
+        CfnOutput(self, "CacheFillFunctionName", value=cache_fill.function_name, condition=shared_cache)
+        CfnOutput(self, "CacheStagingBucketName", value=cache_staging_bucket.bucket_name, condition=shared_cache)
+
         # Integration of API Gateway with Lambda function
         lambda_integration = apigatewayv2_integrations.HttpLambdaIntegration("LambdaIntegration", lambda_redirect)
 
@@ -181,3 +459,10 @@ class WorkshopDeploymentStack(Stack):
 
         # Output the Cognito User Pool ID
         CfnOutput(self, "CognitoUserPoolID", value=user_pool.user_pool_id)
+
+        if shared_bucket_name:
+            # Output the shared workshop bucket name
+            CfnOutput(self, "SharedBucketName", value=shared_bucket_name)
+
+        # Output the role used by bulk Cognito user import jobs
+        CfnOutput(self, "CognitoImportRoleArn", value=user_import_role.role_arn)
@@ -0,0 +1,497 @@
+import csv
+import logging
+import threading
+import time
+
+import aws_clients
+import checkpoint
+import failure_queue
+import retry_failures
+import state_store
+import create_cognito_users
+import create_sagemaker_profiles
+import create_s3_buckets
+import seed_workshop_data
+import delete_spaces
+import delete_sagemaker_profiles
+import delete_cognito_users
+import delete_s3_buckets
+from provisioning_pipeline import run_pipeline
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+DEFAULT_MAX_WORKERS = 8
+
+class WorkshopEngine:
+    """
+    Run workshop stages in-process with the shared client factory for the region.
+
+    Stages are plain functions. Each stage's return value is passed to the
+    next stage as a Python object instead of being re-read from disk.
+    """
+
+    def __init__(self, region, max_workers=DEFAULT_MAX_WORKERS):
+        self.region = region
+        self.max_workers = max_workers
+        self.clients = aws_clients.get_factory(region, max(max_workers * 2, 10))
+
+    def client(self, service_name):
+        return self.clients.client(service_name)
+
+    def log_metrics(self):
+        """Log per-API call, retry, error and latency counts for this process."""
+        self.clients.metrics.log_summary()
+
+    def run_stage(self, description, func, *args, **kwargs):
+        """Run one stage, returning its result, or None if it raised."""
+        print(f"{description}...")
+        start_time = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            logging.error(f"{description} failed: {e}")
+            return None
+        print(f"{description} completed in {time.monotonic() - start_time:.1f}s")
+        return result
+
+def read_workshop_info(csv_file):
+    """Read existing workshop information from the state store, or from the CSV for older workshops."""
+    store = state_store.get_store()
+    workshop = store.get_workshop(state_store.workshop_name_from_csv(csv_file))
+    if workshop:
+        usernames = [user['username'] for user in store.users(workshop['name'])]
+        return workshop['hosted_uri'], workshop['user_pool_id'], workshop['sagemaker_domain_id'], usernames
+
+    with open(csv_file, 'r') as file:
+        reader = csv.reader(file)
+        hosted_uri = next(reader)[1]
+        user_pool_id = next(reader)[1]
+        sagemaker_domain_id = next(reader)[1]
+        next(reader)  # Skip header row
+        existing_users = [row[0] for row in reader]
+    return hosted_uri, user_pool_id, sagemaker_domain_id, existing_users
+
+def plan_users(workshop_name, num_users, shared_bucket_name=None, num_spares=0, first_number=1,
+               bucket_prefix=None):
+    """
+    Choose every user's name, password and bucket up front, so a resumed run reuses them.
+
+    The last `num_spares` users are spare seats, kept out of the handout until claimed.
+    Buckets are named `<bucket_prefix>-<user number>`, with a new unique prefix
+    unless one is given (lazy workshops share theirs with the login Lambda).
+    """
+    total = num_users + num_spares
+    bucket_prefix = bucket_prefix or create_s3_buckets.generate_bucket_prefix(workshop_name.lower())
+    users = []
+    for index in range(total):
+        user = {'username': f"workshop-{first_number + index:03}",
+                'password': create_cognito_users.generate_safe_password(),
+                'bucket': shared_bucket_name or create_s3_buckets.user_bucket_name(bucket_prefix, first_number + index)}
+        if index >= num_users:
+            user['spare'] = True
+        users.append(user)
+    return users
+
+def created_status(user):
+    """The cognito_status recorded for a provisioned user: spare seats stay 'spare' until claimed."""
+    return 'spare' if user.get('spare') else 'created'
+
+def stream_workshop_users(engine, workshop_name, users, user_pool_id, sagemaker_domain_id, hosted_uri,
+                          shared_bucket_name=None, progress=None, handout=True, append=False, lazy=False,
+                          encryption=False, expiration_days=None):
+    """
+    Provision each user end to end as soon as the previous stage finishes for them.
+
+    Users move through the Cognito, SageMaker profile and bucket stages over
+    bounded queues, and are appended to the users CSV as they become ready, so
+    the first attendees can sign in while later ones are still being created.
+    Spare seats are provisioned the same way but left out of the CSV, as is
+    everyone when `handout` is False. With `append`, users are added to an
+    existing CSV instead of starting a new one. With a `progress` checkpoint, each
+    finished stage is recorded and stages already recorded are skipped.
+    With `lazy`, only Cognito accounts are created; the login Lambda creates
+    each profile and bucket on the user's first sign-in. Buckets get default
+    encryption and an expiration rule when `encryption` and `expiration_days` are set.
+    Returns the same results dict as create_workshop, plus the ready spares.
+    """
+    cognito_client = engine.client('cognito-idp')
+    sm_client = engine.client('sagemaker')
+    s3 = engine.client('s3')
+    limiter = create_cognito_users.RateLimiter(create_cognito_users.DEFAULT_USERS_PER_SECOND)
+    store = state_store.get_store()
+    store.save_users(workshop_name, [{'username': user['username'], 'password': user['password'],
+                                      'bucket': user['bucket']} for user in users])
+    # Accounts and profiles found during a resume were created by the interrupted run
+    resuming = progress is not None and progress.resumed
+
+    def create_user(user):
+        limiter.wait()
+        return create_cognito_users.create_cognito_user(cognito_client, user['username'], user['password'],
+                                                        user_pool_id, existing_ok=resuming)
+
+    def create_profile(user):
+        return create_sagemaker_profiles.create_user_profile(sm_client, engine.region, sagemaker_domain_id,
+                                                             user['username'], existing_ok=resuming)
+
+    def create_bucket(user):
+        return shared_bucket_name or create_s3_buckets.create_bucket(user['bucket'], workshop_name, engine.region, s3,
+                                                                     encryption, expiration_days)
+
+    def checkpointed(stage_name, func, status_column=None):
+        def run(user):
+            if progress is not None and progress.is_done(stage_name, user['username']):
+                return user
+            if func(user):
+                if progress is not None:
+                    progress.mark(stage_name, user['username'])
+                if status_column:
+                    status = created_status(user) if status_column == 'cognito_status' else 'created'
+                    store.save_user(workshop_name, user['username'], **{status_column: status})
+                return user
+        return run
+
+    stages = [
+        ("Cognito user", checkpointed("Cognito user", create_user, 'cognito_status'), engine.max_workers),
+        ("SageMaker profile", checkpointed("SageMaker profile", create_profile, 'profile_status'), engine.max_workers),
+        ("S3 bucket", checkpointed("S3 bucket", create_bucket), engine.max_workers),
+    ]
+    if lazy:
+        stages = stages[:1]
+
+    if handout and not append:
+        create_cognito_users.write_users_csv(workshop_name, hosted_uri, user_pool_id, sagemaker_domain_id, [])
+    csv_lock = threading.Lock()
+
+    def user_ready(user):
+        if not handout or user.get('spare'):
+            logging.info(f"{user['username']} is ready")
+            return
+        with csv_lock, open(f"{workshop_name}-users.csv", mode='a', newline='') as file:
+            csv.writer(file).writerow([user['username'], user['password']])
+        logging.info(f"{user['username']} is ready")
+
+    if shared_bucket_name:
+        engine.run_stage("Creating shared S3 bucket", create_s3_buckets.create_shared_bucket,
+                         shared_bucket_name, workshop_name, engine.region, encryption, expiration_days, s3=s3)
+
+    start_time = time.monotonic()
+    ready, failures = run_pipeline(users, stages, on_complete=user_ready)
+    print(f"Provisioned {len(ready)} of {len(users)} users in {time.monotonic() - start_time:.1f}s")
+
+    # Later stages never ran for a dropped user, so queue them next to the failure that stopped them
+    skipped_args = {
+        'create_user_profile': lambda user: {'domain_id': sagemaker_domain_id, 'username': user['username']},
+        'create_bucket': lambda user: {'bucket_name': user['bucket'], 'project_tag': workshop_name,
+                                       'encryption': encryption, 'expiration_days': expiration_days},
+    }
+    bucket_operations = [] if shared_bucket_name else ['create_bucket']
+    later_operations = {
+        "Cognito user": [] if lazy else ['create_user_profile'] + bucket_operations,
+        "SageMaker profile": bucket_operations,
+        "S3 bucket": [],
+    }
+    for stage_name, failed in failures.items():
+        if failed:
+            logging.error(f"{stage_name} failed for: {', '.join(user['username'] for user in failed)}")
+        for user in failed:
+            resources = [] if shared_bucket_name else [user['bucket']]
+            if failure_queue.hold_user(user['username'], user['password'], resources, user.get('spare', False)):
+                for operation in later_operations[stage_name]:
+                    failure_queue.record(operation, skipped_args[operation](user),
+                                         failure_queue.SkippedAfterFailure(stage_name))
+
+    queue = failure_queue.active
+    if queue is not None:
+        retry_failures.drain(queue, engine.region, max_workers=engine.max_workers)
+        users_by_name = {user['username']: user for user in users}
+        released = [users_by_name[username]
+                     for username, _ in queue.release_ready_users() + queue.release_ready_users(spares=True)]
+        store.save_users(workshop_name, [{'username': user['username'], 'cognito_status': created_status(user),
+                                          'profile_status': 'created'} for user in released])
+        ready.extend(released)
+        if append:
+            for user in released:
+                user_ready(user)
+
+    # Rewrite the handout in user order now that everyone is done
+    ready.sort(key=lambda user: user['username'])
+    attendees = [(user['username'], user['password']) for user in ready if not user.get('spare')]
+    if handout and not append:
+        create_cognito_users.write_users_csv(workshop_name, hosted_uri, user_pool_id, sagemaker_domain_id, attendees)
+
+    usernames = [user['username'] for user in ready]
+    if lazy:
+        profiles = {username: 'lazy' for username in usernames}
+    else:
+        profiles = engine.run_stage("Waiting for SageMaker profiles",
+                                    create_sagemaker_profiles.wait_for_profiles_in_service,
+                                    sm_client, sagemaker_domain_id, usernames)
+    store.save_users(workshop_name, [{'username': username, 'profile_status': status}
+                                     for username, status in (profiles or {}).items()])
+    return {
+        'users': attendees,
+        'spares': [(user['username'], user['password']) for user in ready if user.get('spare')],
+        'profiles': profiles,
+        # Lazily created per-user buckets do not exist yet
+        'buckets': sorted({user['bucket'] for user in ready if shared_bucket_name or not lazy}),
+    }
+
+def retry_failed_operations(engine):
+    """
+    Retry everything in the active failure queue, then add users it was holding back to the handout.
+
+    Whatever still fails stays in `<workshop>-failures.json` for retry_failures.py.
+    """
+    queue = failure_queue.active
+    if queue is None:
+        return 0
+    remaining = engine.run_stage("Retrying failed operations", retry_failures.drain, queue, engine.region,
+                                 max_workers=engine.max_workers)
+    retry_failures.append_released_users(queue)
+    failure_queue.stop()
+    return remaining
+
+def create_workshop(engine, workshop_name, num_users, user_pool_id, sagemaker_domain_id, hosted_uri,
+                    import_role_arn=None, shared_bucket_name=None, seed_source=None, streaming=True, progress=None,
+                    num_spares=0, lazy=False, user_bucket_prefix=None, first_user_number=1, encryption=False,
+                    expiration_days=None):
+    """
+    Provision users, profiles and storage for a deployed workshop stack.
+
+    By default users are streamed through every stage one by one (see
+    stream_workshop_users). Bulk Cognito imports need the whole cohort at once,
+    so they run each stage for all users before starting the next. Failed
+    operations are retried at the end (see retry_failed_operations).
+
+    Progress is checkpointed to `<workshop>-checkpoint.jsonl` until the create
+    finishes, so an interrupted run can be picked up with resume_workshop.
+    `num_spares` extra seats are fully provisioned but kept out of the handout
+    for late joiners (see spare_seats.py). With `lazy`, the stack was deployed
+    with LazyProvisioning, so only Cognito accounts are created here; per-user
+    buckets are named from `user_bucket_prefix`, which the stack was given too.
+    User numbers start at `first_user_number`, so the regions of a multi-region
+    workshop hand out distinct usernames. Buckets get SSE-S3 default encryption
+    with `encryption`, and expire their objects after `expiration_days`.
+    Returns a dict of each stage's results, or None if no users were created.
+    """
+    progress = progress or checkpoint.Checkpoint(checkpoint.checkpoint_file(workshop_name))
+    if not progress.users:
+        settings = {
+            'region': engine.region,
+            'workshop_name': workshop_name,
+            'num_users': num_users,
+            'user_pool_id': user_pool_id,
+            'sagemaker_domain_id': sagemaker_domain_id,
+            'hosted_uri': hosted_uri,
+            'shared_bucket_name': shared_bucket_name,
+            'seed_source': seed_source,
+            'num_spares': num_spares,
+            'lazy': lazy,
+            'user_bucket_prefix': user_bucket_prefix,
+            'first_user_number': first_user_number,
+            'encryption': encryption,
+            'expiration_days': expiration_days,
+        }
+        progress.start(settings, plan_users(workshop_name, num_users, shared_bucket_name, num_spares,
+                                            first_user_number, user_bucket_prefix))
+
+    store = state_store.get_store()
+    # Keep a stack name recorded earlier, e.g. a claimed warm pool stack
+    stack_name = (store.get_workshop(workshop_name) or {}).get('stack_name') or f"{workshop_name}-WorkshopDeploymentStack"
+    store.save_workshop(workshop_name, region=engine.region, stack_name=stack_name,
+                        user_pool_id=user_pool_id, sagemaker_domain_id=sagemaker_domain_id, hosted_uri=hosted_uri,
+                        shared_bucket_name=shared_bucket_name, import_role_arn=import_role_arn,
+                        spare_seats=num_spares, lazy_provisioning=lazy, user_bucket_prefix=user_bucket_prefix,
+                        bucket_encryption=encryption, bucket_expiration_days=expiration_days, seed_source=seed_source)
+
+    failure_queue.start(failure_queue.failures_file(workshop_name), engine.region)
+    results = provision_workshop(engine, workshop_name, num_users, user_pool_id, sagemaker_domain_id, hosted_uri,
+                                 import_role_arn, shared_bucket_name, seed_source, streaming, progress, num_spares,
+                                 lazy, user_bucket_prefix, first_user_number, encryption, expiration_days)
+    retry_failed_operations(engine)
+    progress.remove()
+    return results
+
+def resume_workshop(engine, progress):
+    """
+    Finish a create that was interrupted, skipping every stage its checkpoint records as done.
+
+    Resumed creates always stream users, whichever mode the original run used.
+    """
+    if not progress.settings:
+        logging.error(f"Checkpoint '{progress.path}' has no workshop settings to resume from.")
+        return None
+    settings = {key: value for key, value in progress.settings.items() if key != 'region'}
+    return create_workshop(engine, **settings, progress=progress)
+
+def provision_workshop(engine, workshop_name, num_users, user_pool_id, sagemaker_domain_id, hosted_uri,
+                       import_role_arn=None, shared_bucket_name=None, seed_source=None, streaming=True,
+                       progress=None, num_spares=0, lazy=False, user_bucket_prefix=None, first_user_number=1,
+                       encryption=False, expiration_days=None):
+    """Run the create stages for create_workshop, without retrying failures."""
+    if lazy or (streaming and not import_role_arn):
+        users = progress.users if progress else plan_users(workshop_name, num_users, shared_bucket_name, num_spares,
+                                                           first_user_number, user_bucket_prefix)
+        results = stream_workshop_users(engine, workshop_name, users, user_pool_id, sagemaker_domain_id,
+                                        hosted_uri, shared_bucket_name, progress, lazy=lazy, encryption=encryption,
+                                        expiration_days=expiration_days)
+        if seed_source and results['buckets']:
+            usernames = [username for username, _ in results['users'] + results['spares']]
+            engine.run_stage("Seeding course data", seed_workshop_data.seed, engine.client('s3'), seed_source,
+                             seed_workshop_data.build_seed_targets(usernames, results['buckets']),
+                             engine.max_workers)
+        return results if results['users'] else None
+
+    # Import the planned users, so an interrupted run resumes with the same passwords and buckets
+    planned = progress.users if progress else plan_users(workshop_name, num_users, shared_bucket_name, num_spares,
+                                                         first_user_number, user_bucket_prefix)
+    attendees = [user for user in planned if not user.get('spare')]
+    store = state_store.get_store()
+    store.save_users(workshop_name, [{'username': user['username'], 'password': user['password'],
+                                      'bucket': user['bucket']} for user in attendees])
+
+    def mark(stage_name, usernames):
+        if progress is not None:
+            for username in usernames:
+                progress.mark(stage_name, username)
+
+    users = engine.run_stage("Creating Cognito users", create_cognito_users.provision_users,
+                             engine.client('cognito-idp'), num_users, user_pool_id, sagemaker_domain_id,
+                             hosted_uri, workshop_name, engine.max_workers, import_role_arn,
+                             [(user['username'], user['password']) for user in attendees])
+    if not users:
+        logging.error("No Cognito users were created.")
+        return None
+    usernames = [username for username, _ in users]
+    mark("Cognito user", usernames)
+    store.save_users(workshop_name, [{'username': username, 'cognito_status': 'created'} for username in usernames])
+
+    profiles = engine.run_stage("Creating SageMaker profiles", create_sagemaker_profiles.provision_profiles,
+                                engine.client('sagemaker'), engine.region, sagemaker_domain_id, usernames,
+                                engine.max_workers)
+    mark("SageMaker profile", [username for username, status in (profiles or {}).items() if status])
+    store.save_users(workshop_name, [{'username': username, 'profile_status': status}
+                                     for username, status in (profiles or {}).items()])
+
+    s3 = engine.client('s3')
+    buckets_by_user = {user['username']: user['bucket'] for user in attendees}
+    if shared_bucket_name:
+        buckets = engine.run_stage("Creating shared S3 bucket", create_s3_buckets.create_shared_bucket,
+                                   shared_bucket_name, workshop_name, engine.region, encryption, expiration_days,
+                                   s3=s3)
+    else:
+        buckets = engine.run_stage("Creating S3 buckets", create_s3_buckets.create_buckets,
+                                   [buckets_by_user[username] for username in usernames], workshop_name,
+                                   engine.region, engine.max_workers, encryption, expiration_days, s3=s3)
+    mark("S3 bucket", [username for username in usernames if buckets_by_user[username] in (buckets or [])])
+
+    if seed_source and buckets:
+        engine.run_stage("Seeding course data", seed_workshop_data.seed, s3, seed_source,
+                         seed_workshop_data.build_seed_targets(usernames, buckets), engine.max_workers)
+
+    # Bulk imports need the whole cohort at once, so the planned spare seats are streamed in afterwards
+    spare_users = [user for user in planned if user.get('spare')]
+    spares = []
+    if spare_users:
+        results = stream_workshop_users(engine, workshop_name, spare_users, user_pool_id, sagemaker_domain_id,
+                                        hosted_uri, shared_bucket_name, progress, handout=False,
+                                        encryption=encryption, expiration_days=expiration_days)
+        spares = results['spares']
+        if seed_source and results['buckets']:
+            engine.run_stage("Seeding spare seats", seed_workshop_data.seed, s3, seed_source,
+                             seed_workshop_data.build_seed_targets([username for username, _ in spares],
+                                                                   results['buckets']),
+                             engine.max_workers)
+    return {'users': users, 'spares': spares, 'profiles': profiles, 'buckets': buckets}
+
+def add_spare_seats(engine, workshop_name, count, seed_source=None):
+    """
+    Provision `count` more spare seats for a recorded workshop without touching the handout.
+
+    Returns the stream_workshop_users results, or None if the workshop is unknown.
+    """
+    store = state_store.get_store()
+    workshop = store.get_workshop(workshop_name)
+    if not workshop or count <= 0:
+        return None
+    numbers = store.reserve_user_numbers(workshop_name, count)
+    users = plan_users(workshop_name, 0, workshop['shared_bucket_name'], count, numbers.start,
+                       workshop['user_bucket_prefix'])
+    try:
+        results = stream_workshop_users(engine, workshop_name, users, workshop['user_pool_id'],
+                                        workshop['sagemaker_domain_id'], workshop['hosted_uri'],
+                                        workshop['shared_bucket_name'], handout=False,
+                                        lazy=bool(workshop['lazy_provisioning']),
+                                        encryption=bool(workshop['bucket_encryption']),
+                                        expiration_days=workshop['bucket_expiration_days'])
+    finally:
+        release_unused_reservations(workshop_name, numbers)
+    if seed_source and results['buckets']:
+        engine.run_stage("Seeding spare seats", seed_workshop_data.seed, engine.client('s3'), seed_source,
+                         seed_workshop_data.build_seed_targets([username for username, _ in results['spares']],
+                                                               results['buckets']),
+                         engine.max_workers)
+    return results
+
+def record_workshop(engine, csv_file):
+    """Return the workshop's name, first copying it into the state store if it only exists as a CSV."""
+    store = state_store.get_store()
+    workshop_name = state_store.workshop_name_from_csv(csv_file)
+    if not store.get_workshop(workshop_name):
+        store.import_csv(csv_file, engine.region)
+    return workshop_name
+
+def release_unused_reservations(workshop_name, numbers):
+    """Drop the user numbers from an add's reservation that it did not use. Users held for a retry keep theirs."""
+    held = failure_queue.active.held_users if failure_queue.active is not None else {}
+    released = state_store.get_store().release_reservations(workshop_name, numbers, keep=held)
+    if released:
+        logging.info(f"Released {released} unused user numbers")
+
+def add_workshop_users(engine, workshop_name, num_new_users):
+    """
+    Provision a batch of new users for a recorded workshop and append them to its users CSV.
+
+    User numbers are reserved in the state store, then the batch is streamed
+    through the same concurrent pipeline and pooled clients as a create.
+    """
+    store = state_store.get_store()
+    workshop = store.get_workshop(workshop_name)
+    numbers = store.reserve_user_numbers(workshop_name, num_new_users)
+    users = plan_users(workshop_name, num_new_users, workshop['shared_bucket_name'], first_number=numbers.start,
+                       bucket_prefix=workshop['user_bucket_prefix'])
+    try:
+        return stream_workshop_users(engine, workshop_name, users, workshop['user_pool_id'],
+                                     workshop['sagemaker_domain_id'], workshop['hosted_uri'],
+                                     workshop['shared_bucket_name'], append=True,
+                                     lazy=bool(workshop['lazy_provisioning']),
+                                     encryption=bool(workshop['bucket_encryption']),
+                                     expiration_days=workshop['bucket_expiration_days'])
+    finally:
+        release_unused_reservations(workshop_name, numbers)
+
+def update_workshop(engine, csv_file, num_new_users):
+    """Add users to an existing workshop with the engine's shared clients. Returns the stage results."""
+    workshop_name = record_workshop(engine, csv_file)
+    failure_queue.start(failure_queue.failures_file(workshop_name), engine.region)
+    results = engine.run_stage("Adding new users", add_workshop_users, engine, workshop_name, num_new_users)
+    retry_failed_operations(engine)
+    return results
+
+def destroy_workshop(engine, csv_file):
+    """Delete a workshop's spaces, profiles, users and buckets (the stack is left to the caller)."""
+    workshop_name = record_workshop(engine, csv_file)
+    _, user_pool_id, sagemaker_domain_id, usernames = read_workshop_info(csv_file)
+    sm_client = engine.client('sagemaker')
+    failure_queue.start(failure_queue.failures_file(workshop_name), engine.region)
+
+    engine.run_stage("Deleting spaces", delete_spaces.delete_domain_spaces, sm_client, sagemaker_domain_id)
+    engine.run_stage("Deleting SageMaker users", delete_sagemaker_profiles.delete_user_profiles,
+                     sm_client, sagemaker_domain_id)
+    engine.run_stage("Deleting Cognito users", delete_cognito_users.delete_cognito_users,
+                     engine.client('cognito-idp'), user_pool_id, usernames, engine.region)
+    bucket_names = delete_s3_buckets.find_workshop_buckets(csv_file, engine.region)
+    engine.run_stage("Deleting S3 buckets", delete_s3_buckets.delete_buckets,
+                     bucket_names, engine.region, engine.client('s3'), engine.max_workers)
+    return retry_failed_operations(engine)